@@ -1,5 +1,14 @@
+import os
+import sys
+
 import pyglet
-from math import atan2, degrees
+from math import atan2, ceil, degrees
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.resources import center_anchor, get_cache
 
 
 class Arrow(pyglet.sprite.Sprite):
@@ -23,63 +32,122 @@ class Arrow(pyglet.sprite.Sprite):
         self.rotation = angle
 
 
+def grid_line(start, stop, spacing):
+    """
+    The points from start up to (not including) stop, spacing apart, which
+    may be a fraction: the same ones np.arange gives an ArrowField's grid.
+    """
+    return [start + k * spacing for k in range(max(0, ceil((stop - start) / spacing)))]
+
+
 class ResourceImporter():
     """
     ResourceImporter is meant to simplify the importation of resources, such as
-    sprite graphics.
+    sprite graphics. Images come from a shared cache for the folder (see
+    common/resources.py), so importing the same one twice is free, small ones
+    are packed into a shared texture atlas, and the global pyglet.resource
+    path is left alone.
     """
     def __init__(self, resource_path: str) -> 'ResourceImporter':
-        pyglet.resource.path = [resource_path]
-        pyglet.resource.reindex()
+        self.cache = get_cache(resource_path)
 
     def import_image(self, file_name: str) -> 'Image object':
         """Return a reference to a graphics file."""
-        return pyglet.resource.image(file_name)
+        return self.cache.image(file_name)
 
     def anchor_center(self, img: 'Image object') -> 'Image object':
-        """Sets the image's center of rotation to the geometric center of the
-        image itself."""
-        img.anchor_x = img.width / 2
-        img.anchor_y = img.height / 2
-        return img
+        """Returns a copy of the image whose center of rotation is the
+        geometric center of the image itself. The cached image is left as it
+        was, since other importers may be sharing it."""
+        return center_anchor(img)
+
+    def preload(self, file_names: list):
+        """Start decoding images in the background (see ResourceCache.preload)."""
+        return self.cache.preload(file_names)
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Arrows following the mouse.")
+    parser.add_argument("--engine", choices=("sprite", "field"), default="sprite",
+                        help="'sprite' turns each Arrow sprite itself, 'field' turns "
+                             "them all at once in an ArrowField.")
+    parser.add_argument("--spacing", type=float, default=30,
+                        help="distance between the arrows in the grid")
+    from common.profiler import FrameProfiler
+    from common.scheduler import FrameScheduler
+    FrameProfiler.add_arguments(parser)
+    FrameScheduler.add_arguments(parser)
+    args = parser.parse_args()
+    if args.spacing <= 0:
+        parser.error("--spacing must be more than 0")
+    profiler = FrameProfiler.from_args(args)
+    scheduler = FrameScheduler.from_args(args, profiler)
+
     window = pyglet.window.Window(500, 500)
     #window = pyglet.window.Window(fullscreen=True)
     main_batch = pyglet.graphics.Batch()
     fps_display = pyglet.window.FPSDisplay(window)
 
 
-    @window.event
+    @profiler.event(window)
     def on_draw():
         window.clear()
-        main_batch.draw()
-        fps_display.draw()
+        scheduler.draw()
 
 
-    @window.event
+    @profiler.event(window)
     def on_mouse_motion(x, y, button, modifiers):
         """
-        Send the current mouse x and y coords to each arrow to update itself.
+        Only remember where the mouse is. The arrows are turned towards it
+        once a tick, however many times the mouse moved in between.
         """
+        global pointer
+        pointer = (x, y)
+
+
+    def aim(dt):
+        """Send the latest mouse x and y coords to each arrow to update itself."""
+        global aimed_at
+        if pointer is None or pointer == aimed_at:
+            return
+        aimed_at = pointer
+        if field is not None:
+            field.point_at(*pointer)
+            return
         for arrow in arrow_list:
-            arrow.update_rotation(x, y)
-
-
-    def update(dt):
-        pass
+            arrow.update_rotation(*pointer)
 
     # Use a ResourceImporter instance to import the arrow image.
     res_imp = ResourceImporter('./img')
-    arrow_img = res_imp.anchor_center(res_imp.import_image('arrow.gif'))
+    arrow_img = res_imp.cache.image('arrow.gif', centered=True)
     # create and arrow list that we can loop through to update them.
     arrow_list = []
-    arrow_list.append(Arrow(arrow_img, window.width/2, window.height/2, (0, 0, 153), 8.0, main_batch))
-    for i in range(0, window.width+1, 30):
-        for j in range(0, window.height+1, 30):
-            arrow_list.append(Arrow(arrow_img, i, j, (255, 153, 0), 0.5, main_batch))
-
-
-    pyglet.clock.schedule_interval(update, 1/120)
+    field = None
+    if args.engine == "field":
+        from arrow_field import ArrowField
+        field = ArrowField(arrow_img, main_batch)
+        field.add_arrow(window.width/2, window.height/2, (0, 0, 153), 8.0)
+        field.add_grid(0, 0, window.width, window.height, args.spacing, (255, 153, 0), 0.5)
+    else:
+        arrow_list.append(Arrow(arrow_img, window.width/2, window.height/2, (0, 0, 153), 8.0, main_batch))
+        for i in grid_line(0, window.width+1, args.spacing):
+            for j in grid_line(0, window.height+1, args.spacing):
+                arrow_list.append(Arrow(arrow_img, i, j, (255, 153, 0), 0.5, main_batch))
+
+
+    # Aim the arrows at the mouse, then (for an ArrowField) turn them all
+    # at once and send them to the batch, every tick.
+    pointer = None
+    aimed_at = None
+    scheduler.add(aim, "input", name="aim")
+    if field is not None:
+        scheduler.add(field.update, "sync", name="turn")
+    scheduler.add(main_batch.draw, "draw", name="draw")
+    scheduler.add(fps_display.draw, "draw", name="fps")
+
+    scheduler.start(120)
     pyglet.app.run()
+    profiler.close()
+    scheduler.close()
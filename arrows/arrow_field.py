@@ -0,0 +1,143 @@
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.quads import QuadBatch
+
+
+class ArrowField():
+    """
+    ArrowField points a whole field of arrows at one spot, such as the mouse.
+    Where each Arrow sprite works out its own angle and sets its own rotation,
+    ArrowField keeps every arrow's position, scale and rotation in NumPy
+    arrays, finds all the angles with one vectorized atan2, and writes all the
+    rotated quads into a single vertex list in one go.
+
+    The mouse can move several times between frames, and only the last
+    position is ever seen, so point_at just remembers where to point. The
+    arrows are turned when update is called, once per frame, and only if the
+    target has actually moved since last time.
+    """
+    FIELDS = ("x", "y", "scale", "rotation")
+
+    def __init__(self, image, batch=None, capacity: int = 1024):
+        self.image = image
+        self.count = 0
+        self.capacity = 0
+        self.data = {}
+        self.color = np.zeros((0, 3), dtype=np.uint8)
+        self.target = None
+        self.dirty = False          # the arrows need turning
+        self.colors_dirty = False   # the colors need writing too
+        self.grow(capacity)
+
+        self.quads = None
+        if batch is not None:
+            self.quads = QuadBatch(image, batch, self.capacity)
+
+
+    def __len__(self):
+        return self.count
+
+
+    def grow(self, capacity):
+        """Make room for at least capacity arrows."""
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        for name in self.FIELDS:
+            new_array = np.zeros(capacity, dtype=np.float32)
+            if name in self.data:
+                new_array[:self.count] = self.data[name][:self.count]
+            self.data[name] = new_array
+        new_color = np.zeros((capacity, 3), dtype=np.uint8)
+        new_color[:self.count] = self.color[:self.count]
+        self.color = new_color
+        self.capacity = capacity
+
+
+    def live(self, name):
+        """Return a view of one property for the arrows in the field."""
+        return self.data[name][:self.count]
+
+
+    def add_arrows(self, x, y, color=(255, 255, 255), scale=1.0):
+        """
+        Add arrows from arrays (or single values) of positions, colors and
+        scales. New arrows point at the current target, if there is one.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=np.float32))
+        n = len(x)
+        self.grow(self.count + n)
+        new = slice(self.count, self.count + n)
+        self.data["x"][new] = x
+        self.data["y"][new] = y
+        self.data["scale"][new] = scale
+        self.data["rotation"][new] = 0
+        self.color[new] = np.asarray(color, dtype=np.uint8).reshape(-1, 3)
+        self.count += n
+        self.dirty = True
+        self.colors_dirty = True
+
+
+    def add_arrow(self, loc_x, loc_y, color, scale):
+        """Add one arrow, with the same arguments as an Arrow (less image and batch)."""
+        self.add_arrows(loc_x, loc_y, color, scale)
+
+
+    def add_grid(self, left, bottom, right, top, spacing, color=(255, 255, 255), scale=1.0):
+        """Add a grid of arrows, spacing apart, covering a rectangle."""
+        grid_x, grid_y = np.meshgrid(np.arange(left, right + 1, spacing),
+                                     np.arange(bottom, top + 1, spacing), indexing="ij")
+        self.add_arrows(grid_x.ravel(), grid_y.ravel(), color, scale)
+
+
+    def point_at(self, x, y):
+        """
+        Set the spot for the arrows to point at. Nothing is worked out until
+        the next update, so this is cheap to call on every mouse event.
+        """
+        if self.target != (x, y):
+            self.target = (x, y)
+            self.dirty = True
+
+
+    def update(self, dt=None):
+        """
+        Turn every arrow towards the target and draw them, if anything has
+        changed since the last update. Takes a dt so it can be scheduled on
+        the clock directly.
+        """
+        if not self.dirty:
+            return
+        if self.target is not None:
+            target_x, target_y = self.target
+            # The same angle Arrow.update_rotation works out, all at once.
+            rotation = self.live("rotation")
+            np.arctan2(self.live("y") - target_y, target_x - self.live("x"), out=rotation)
+            np.degrees(rotation, out=rotation)
+        self.sync()
+        self.dirty = False
+
+
+    def sync(self):
+        """Write the arrows into the shared vertex list, if there is one."""
+        if self.quads is None:
+            return
+        color = self.color[:self.count] if self.colors_dirty else None
+        self.quads.update(self.live("x"), self.live("y"), self.live("scale"),
+                          self.live("rotation"), color)
+        self.colors_dirty = False
+
+
+    def delete(self):
+        """Remove the arrows and their vertex list from the batch."""
+        self.count = 0
+        if self.quads is not None:
+            self.quads.delete()
+            self.quads = None
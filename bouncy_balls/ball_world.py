@@ -0,0 +1,634 @@
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.quads import QuadBatch
+
+
+# The neighbouring cells to check from each cell. Together with the cell
+# itself, these cover every neighbour exactly once between any two cells.
+NEIGHBOUR_CELLS = ((1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def grid_pairs(x, y, cell_size, width, height):
+    """
+    Broad phase for ball collisions: find the pairs of balls that are close
+    enough that they might be touching. The world is cut into a uniform grid
+    of square cells, and only balls in the same or neighbouring cells are
+    paired up. With cells at least as wide as the biggest ball, no touching
+    pair is missed, and the work grows with the number of balls rather than
+    with its square.
+
+    Everything is done with array operations: the balls are sorted by cell,
+    then for each ball the run of balls in each neighbouring cell is found
+    with a binary search and expanded into pairs. Returns two index arrays,
+    with i[k] and j[k] the kth candidate pair.
+    """
+    n = len(x)
+    columns = int(width // cell_size) + 1
+    rows = int(height // cell_size) + 1
+    # Multiplying and truncating is much quicker than floor division, and
+    # the few balls just past a wall land in the edge cells either way.
+    inv_cell = 1.0 / cell_size
+    cell_x = np.clip((x * inv_cell).astype(np.int64), 0, columns - 1)
+    cell_y = np.clip((y * inv_cell).astype(np.int64), 0, rows - 1)
+    keys = cell_x * rows + cell_y
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    cell_x = cell_x[order]
+    cell_y = cell_y[order]
+    ball = np.arange(n)
+
+    # Where each cell's run of balls starts in the sorted order. A table with
+    # an entry per cell makes every lookup a plain index, but if the grid is
+    # very fine for the number of balls, a binary search is used instead.
+    if columns * rows <= 4 * n:
+        cell_starts = np.zeros(columns * rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sorted_keys, minlength=columns * rows), out=cell_starts[1:])
+        find_run = lambda cell_keys: (cell_starts[cell_keys], cell_starts[cell_keys + 1])
+    else:
+        find_run = lambda cell_keys: (np.searchsorted(sorted_keys, cell_keys, side="left"),
+                                      np.searchsorted(sorted_keys, cell_keys, side="right"))
+
+    pairs_i = []
+    pairs_j = []
+    # Balls in the same cell: pair each with the ones after it in sorted order.
+    starts = ball + 1
+    ends = find_run(sorted_keys)[1]
+    for offset_x, offset_y in ((0, 0),) + NEIGHBOUR_CELLS:
+        if (offset_x, offset_y) != (0, 0):
+            other_x = cell_x + offset_x
+            other_y = cell_y + offset_y
+            inside = (other_x < columns) & (other_y >= 0) & (other_y < rows)
+            other_keys = np.where(inside, other_x * rows + other_y, 0)
+            starts, ends = find_run(other_keys)
+            ends = np.where(inside, ends, starts)
+        counts = np.maximum(ends - starts, 0)
+        total = int(counts.sum())
+        if total == 0:
+            continue
+        firsts = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        pairs_i.append(np.repeat(ball, counts))
+        pairs_j.append(firsts + np.arange(total))
+
+    if not pairs_i:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    return order[np.concatenate(pairs_i)], order[np.concatenate(pairs_j)]
+
+
+def swept_pairs(x, y, dx, dy, radius, dt, width, height, cell_size=None):
+    """
+    Broad phase for continuous collisions: find the pairs of balls whose paths
+    over the next dt might bring them into contact. Every point of a path is
+    within half the path's length of its middle, so two balls can only meet if
+    the middles of their paths are closer than their radii plus half of both
+    paths, and the middles are paired up with grid_pairs.
+
+    The grid cells have to be wide enough for the longest path, so one very
+    fast ball would make them huge and pair everything with everything.
+    Instead, the cells are sized for half of a typical path (or the biggest
+    ball, if that is wider), and a path longer than that is cut into pieces
+    that fit, each put into the grid on its own. Balls meeting piece to piece
+    then turn up more than once, and the repeats are dropped. A path is never
+    taken to be longer than the world, which it couldn't cross without
+    bouncing anyway.
+    """
+    n = len(x)
+    speed = np.hypot(dx, dy)
+    span = np.minimum(dt, (width + height) / np.maximum(speed, 1e-9))
+    half_path = speed * (span / 2)
+    max_radius = float(radius.max())
+    longest = max(0.5 * float(np.median(half_path)), max_radius)
+    pieces = np.maximum(np.ceil(half_path / longest), 1).astype(np.int64)
+    ball = np.repeat(np.arange(n), pieces)
+    # Where along its path each piece's middle is, as a fraction of the path.
+    first_piece = np.cumsum(pieces) - pieces
+    along = (np.arange(len(ball)) - first_piece[ball] + 0.5) / pieces[ball]
+    mid_x = x[ball] + dx[ball] * (along * span[ball])
+    mid_y = y[ball] + dy[ball] * (along * span[ball])
+    piece_half = half_path[ball] / pieces[ball]
+
+    cell_size = max(cell_size or 0.0, 2 * max_radius + 2 * float(piece_half.max()), 1.0)
+    i, j = grid_pairs(mid_x, mid_y, cell_size, width, height)
+    reach = radius[ball[i]] + radius[ball[j]] + piece_half[i] + piece_half[j]
+    gap_x = mid_x[j] - mid_x[i]
+    gap_y = mid_y[j] - mid_y[i]
+    close = gap_x * gap_x + gap_y * gap_y <= reach * reach
+    i = ball[i[close]]
+    j = ball[j[close]]
+    if len(ball) > n:
+        # Only pairs with a ball in pieces can have turned up more than once.
+        cut = (pieces[i] > 1) | (pieces[j] > 1)
+        cut_i = i[cut]
+        cut_j = j[cut]
+        different = cut_i != cut_j
+        low = np.minimum(cut_i[different], cut_j[different])
+        high = np.maximum(cut_i[different], cut_j[different])
+        keys = np.unique(low * n + high)
+        i = np.concatenate((i[~cut], keys // n))
+        j = np.concatenate((j[~cut], keys % n))
+    return i, j
+
+
+class BallWorld():
+    """
+    BallWorld moves a whole crowd of bouncing balls at once. Where each Ball
+    sprite moves itself and checks the window borders on its own, BallWorld
+    keeps every ball's position, velocity and radius in NumPy arrays and
+    bounces them all off the walls in one vectorized step.
+
+    The walls are given explicitly as a width and height, rather than read
+    from the window, so a BallWorld works fine with no window at all. Give it
+    an image and a batch, and it draws the balls as quads in one shared vertex
+    list; or use sync_sprites to move a list of Ball sprites to match.
+
+    With collisions turned on, balls also bounce off each other, elastically,
+    with each ball's mass following its area. Candidate pairs come from a
+    uniform grid (see grid_pairs), whose cell_size defaults to the diameter of
+    the biggest ball. candidate_pairs and contacts count the pairs tested and
+    the pairs actually touching on the last step, to help tune the cell size
+    for a scene. unresolved counts the contacts the solver ran out of rounds
+    for on the last step (see solver_rounds): pairs still heading into each
+    other in discrete mode, impacts still due in continuous mode. Anything
+    above zero means the scene needs more rounds.
+
+    Stepped discretely (the default), a ball is moved the whole step and then
+    pushed back out of whatever it has overlapped, so with a long step a fast
+    or small ball can bounce from the wrong place, or pass right through
+    another. With continuous=True the world instead works out the time of
+    impact of every contact within the step, and bounces each ball from the
+    exact point where it first touched the wall or another ball, so much
+    longer steps still behave correctly. See sweep_walls and sweep for how.
+
+    The world also remembers where every ball was before the last step, so
+    when it is stepped at a fixed rate (see common/timestep.py) it can be
+    drawn part way between the last two steps, keeping the motion smooth when
+    the screen is drawn more often than the physics runs.
+    """
+    FIELDS = ("x", "y", "dx", "dy", "scale", "radius", "prev_x", "prev_y")
+
+    def __init__(self,
+                 width: float,
+                 height: float,
+                 image=None,
+                 batch=None,
+                 capacity: int = 128,
+                 collisions: bool = False,
+                 cell_size: float = None,
+                 solver_rounds: int = 16,
+                 continuous: bool = False):
+        """
+        solver_rounds is how many rounds of bounces are worked out per step:
+        in discrete mode, the rounds of elastic impulses between touching
+        pairs; in continuous mode, the rounds of impacts (each round settles
+        every ball's next impact, so it is also the most bounces a ball can
+        have in one step). Whatever is left when they run out is counted in
+        unresolved.
+        """
+        self.width = width
+        self.height = height
+        self.image = image
+        self.collisions = collisions
+        self.continuous = continuous
+        self.cell_size = cell_size
+        self.solver_rounds = solver_rounds
+        self.candidate_pairs = 0
+        self.contacts = 0
+        self.unresolved = 0
+        self.count = 0
+        self.capacity = 0
+        self.data = {}
+        self.color = np.zeros((0, 3), dtype=np.uint8)
+        self.grow(capacity)
+
+        self.quads = None
+        if image is not None and batch is not None:
+            self.quads = QuadBatch(image, batch, self.capacity)
+
+
+    def __len__(self):
+        return self.count
+
+
+    def grow(self, capacity):
+        """Make room for at least capacity balls."""
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        for name in self.FIELDS:
+            new_array = np.zeros(capacity, dtype=np.float64)
+            if name in self.data:
+                new_array[:self.count] = self.data[name][:self.count]
+            self.data[name] = new_array
+        new_color = np.zeros((capacity, 3), dtype=np.uint8)
+        new_color[:self.count] = self.color[:self.count]
+        self.color = new_color
+        self.capacity = capacity
+
+
+    def live(self, name):
+        """Return a view of one property for the balls in the world."""
+        return self.data[name][:self.count]
+
+
+    def add_balls(self, x, y, dx, dy, scale, color=(255, 255, 255), image_width=None):
+        """
+        Add balls from arrays (or single values) of positions, velocities and
+        scales, the same things a Ball is built from. A ball's radius is half
+        its drawn width, which is the image's width times its scale.
+        """
+        x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+        n = len(x)
+        self.grow(self.count + n)
+        new = slice(self.count, self.count + n)
+        if image_width is None:
+            image_width = self.image.width
+        data = self.data
+        data["x"][new] = x
+        data["y"][new] = y
+        data["prev_x"][new] = x
+        data["prev_y"][new] = y
+        data["dx"][new] = dx
+        data["dy"][new] = dy
+        data["scale"][new] = scale
+        data["radius"][new] = data["scale"][new] * image_width / 2
+        self.color[new] = np.asarray(color, dtype=np.uint8).reshape(-1, 3)
+        self.count += n
+
+
+    def add_ball(self, lx, ly, dx, dy, size, hue=(255, 255, 255)):
+        """Add one ball, with the same arguments as a Ball (less image and batch)."""
+        self.add_balls(lx, ly, dx, dy, size, hue)
+
+
+    def step(self, dt):
+        """Simulate one step of dt seconds, then draw the result."""
+        self.simulate(dt)
+        self.sync()
+
+
+    def simulate(self, dt):
+        """
+        Move every ball by its velocity, then bounce the ones that have gone
+        past a wall: each is put back against the wall and its velocity along
+        that axis is pointed away from it. Ball to ball collisions, if they are
+        turned on, are sorted out before the walls, so a ball pushed by
+        another still ends up inside the world.
+
+        In continuous mode the balls are swept through the step instead.
+        """
+        n = self.count
+        data = self.data
+        data["prev_x"][:n] = data["x"][:n]
+        data["prev_y"][:n] = data["y"][:n]
+        if self.continuous:
+            if self.collisions:
+                self.sweep(dt)
+            else:
+                self.sweep_walls(data["x"][:n], data["dx"][:n], data["radius"][:n], self.width, dt)
+                self.sweep_walls(data["y"][:n], data["dy"][:n], data["radius"][:n], self.height, dt)
+            return
+        x = data["x"][:n]
+        y = data["y"][:n]
+        dx = data["dx"][:n]
+        dy = data["dy"][:n]
+        radius = data["radius"][:n]
+        x += dx * dt
+        y += dy * dt
+        if self.collisions:
+            self.collide()
+        self.bounce_walls(x, dx, radius, self.width)
+        self.bounce_walls(y, dy, radius, self.height)
+
+
+    @staticmethod
+    def bounce_walls(pos, vel, radius, limit):
+        """Bounce balls off the walls at 0 and limit along one axis."""
+        low = pos < radius
+        pos[low] = radius[low]
+        vel[low] = np.abs(vel[low])
+        high = pos > limit - radius
+        pos[high] = limit - radius[high]
+        vel[high] = -np.abs(vel[high])
+
+
+    @staticmethod
+    def sweep_walls(pos, vel, radius, limit, dt):
+        """
+        Move balls dt along one axis, bouncing them off the walls at 0 and
+        limit at the exact moment they reach them, however many times that
+        happens in the step. Bouncing between two walls is the same as moving
+        in a straight line through a row of mirror images of the gap between
+        them, so each ball is moved in a straight line, and then folded back
+        into the gap: an odd number of reflections leaves it heading the
+        other way.
+        """
+        low = radius
+        span = np.maximum(limit - 2 * radius, 1e-9)
+        travelled = np.mod(pos + vel * dt - low, 2 * span)
+        reflected = travelled > span
+        pos[:] = low + np.where(reflected, 2 * span - travelled, travelled)
+        np.negative(vel, out=vel, where=reflected)
+
+
+    def collide(self):
+        """
+        Find the pairs of balls that overlap and bounce them apart. Each pair
+        is pushed apart along the line between their centers until they just
+        touch, and if they are moving towards each other they get the equal
+        and opposite impulses of an elastic collision. A ball touching several
+        others gets the sum of all its pushes and impulses.
+        """
+        n = self.count
+        data = self.data
+        x = data["x"][:n]
+        y = data["y"][:n]
+        dx = data["dx"][:n]
+        dy = data["dy"][:n]
+        radius = data["radius"][:n]
+        self.unresolved = 0
+        if n < 2:
+            self.candidate_pairs = 0
+            self.contacts = 0
+            return
+        cell_size = self.cell_size or max(2 * float(radius.max()), 1.0)
+
+        # Broad phase, then narrow phase: which candidates really touch?
+        i, j = grid_pairs(x, y, cell_size, self.width, self.height)
+        self.candidate_pairs = len(i)
+        normal_x = x[j] - x[i]
+        normal_y = y[j] - y[i]
+        dist_sq = normal_x * normal_x + normal_y * normal_y
+        reach = radius[i] + radius[j]
+        touching = dist_sq < reach * reach
+        i = i[touching]
+        j = j[touching]
+        self.contacts = len(i)
+        if not self.contacts:
+            return
+        normal_x = normal_x[touching]
+        normal_y = normal_y[touching]
+        reach = reach[touching]
+        dist = np.sqrt(dist_sq[touching])
+        # Two balls exactly on top of each other get pushed apart sideways.
+        stacked = dist == 0
+        normal_x[stacked] = 1.0
+        dist[stacked] = 1.0
+        normal_x /= dist
+        normal_y /= dist
+        dist[stacked] = 0.0
+
+        # Heavier (bigger) balls get pushed less.
+        inv_mass = 1.0 / np.maximum(radius * radius, 1e-9)
+        inv_i = inv_mass[i]
+        inv_j = inv_mass[j]
+        inv_total = inv_i + inv_j
+
+        # A ball touching several others at once has each of its contacts
+        # scaled down, otherwise the pushes all pile up on it together. Both
+        # balls in a pair use the same scale, so momentum is conserved.
+        def share(in_contact):
+            contact_count = np.bincount(i, in_contact, n) + np.bincount(j, in_contact, n)
+            return 1.0 / np.maximum(np.maximum(contact_count[i], contact_count[j]), 1)
+
+        push = (reach - dist) / inv_total * share(np.ones(len(i)))
+        x -= np.bincount(i, push * inv_i * normal_x, n) - np.bincount(j, push * inv_j * normal_x, n)
+        y -= np.bincount(i, push * inv_i * normal_y, n) - np.bincount(j, push * inv_j * normal_y, n)
+
+        # Bounces are worked out in rounds. Each round takes the pairs that
+        # don't share a ball with an earlier pair still waiting, and gives
+        # every one of them a proper elastic bounce all at once. Later rounds
+        # see the velocities the earlier ones left behind, just as if the
+        # bounces had been done one after another.
+        waiting = np.arange(len(i))
+        for round_number in range(self.solver_rounds):
+            if not len(waiting):
+                break
+            pair_i = i[waiting]
+            pair_j = j[waiting]
+            order = np.arange(len(waiting))
+            first_pair = np.full(n, len(waiting))
+            np.minimum.at(first_pair, pair_i, order)
+            np.minimum.at(first_pair, pair_j, order)
+            ready = (first_pair[pair_i] == order) & (first_pair[pair_j] == order)
+
+            bounce = waiting[ready]
+            pair_i = pair_i[ready]
+            pair_j = pair_j[ready]
+            waiting = waiting[~ready]
+            closing = ((dx[pair_j] - dx[pair_i]) * normal_x[bounce]
+                       + (dy[pair_j] - dy[pair_i]) * normal_y[bounce])
+            impulse = np.where(closing < 0, -2.0 * closing / inv_total[bounce], 0.0)
+            dx[pair_i] -= impulse * inv_i[bounce] * normal_x[bounce]
+            dy[pair_i] -= impulse * inv_i[bounce] * normal_y[bounce]
+            dx[pair_j] += impulse * inv_j[bounce] * normal_x[bounce]
+            dy[pair_j] += impulse * inv_j[bounce] * normal_y[bounce]
+
+        # Pairs still waiting when the rounds run out keep the velocities
+        # they have. The ones moving apart don't need a bounce anyway.
+        if len(waiting):
+            closing = ((dx[j[waiting]] - dx[i[waiting]]) * normal_x[waiting]
+                       + (dy[j[waiting]] - dy[i[waiting]]) * normal_y[waiting])
+            self.unresolved = int((closing < 0).sum())
+
+
+    def sweep(self, dt):
+        """
+        Move the balls through a step of dt with continuous collisions. Each
+        ball's path is a straight line, p(t) = origin + velocity * t, until it
+        hits something. For each possible pair, the time they first touch
+        comes from solving |p_j(t) - p_i(t)| = r_i + r_j, and for each ball,
+        the times it reaches the walls come straight from its line.
+
+        The impacts are then settled in rounds. In each round, every ball
+        whose earliest impact is also the earliest for whatever it hits (the
+        other ball, or a wall) bounces, from the point where they touch, at
+        the moment they touch, and gets a new line from there. Only the times
+        involving balls that bounced have to be worked out again for the next
+        round. At the end, every ball is moved along its line to the end of
+        the step.
+        """
+        n = self.count
+        data = self.data
+        x = data["x"][:n]
+        y = data["y"][:n]
+        dx = data["dx"][:n]
+        dy = data["dy"][:n]
+        radius = data["radius"][:n]
+        self.candidate_pairs = 0
+        self.contacts = 0
+        self.unresolved = 0
+        if n == 0:
+            return
+
+        # Where each line starts (at the start of the step), and the time of
+        # the last bounce on it, before which nothing can happen.
+        origin_x = x.copy()
+        origin_y = y.copy()
+        last = np.zeros(n)
+
+        if n > 1:
+            i, j = swept_pairs(x, y, dx, dy, radius, dt, self.width, self.height, self.cell_size)
+        else:
+            i = j = np.zeros(0, dtype=np.int64)
+        self.candidate_pairs = len(i)
+        contact = radius[i] + radius[j]
+        inv_mass = 1.0 / np.maximum(radius * radius, 1e-9)
+
+        def pair_times(pairs):
+            """When each of these pairs next touches, or inf if not this step."""
+            a_ball = i[pairs]
+            b_ball = j[pairs]
+            start = np.maximum(last[a_ball], last[b_ball])
+            gap_x = origin_x[b_ball] - origin_x[a_ball]
+            gap_y = origin_y[b_ball] - origin_y[a_ball]
+            closing_x = dx[b_ball] - dx[a_ball]
+            closing_y = dy[b_ball] - dy[a_ball]
+            a = closing_x * closing_x + closing_y * closing_y
+            half_b = gap_x * closing_x + gap_y * closing_y
+            c = gap_x * gap_x + gap_y * gap_y - contact[pairs] * contact[pairs]
+            disc = half_b * half_b - a * c
+            hits = (a > 0) & (disc > 0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = np.where(hits, (-half_b - np.sqrt(np.where(hits, disc, 0.0))) / a, np.inf)
+            # Already overlapping and still closing when the later of the two
+            # lines started: they bounce straight away.
+            overlap = hits & (t < start) & (half_b + a * start < 0)
+            t = np.where(overlap, start, t)
+            return np.where((t >= start) & (t <= dt), t, np.inf)
+
+        def wall_times(balls, origin, vel, limit):
+            """When each of these balls next reaches a wall on one axis."""
+            v = vel[balls]
+            target = np.where(v > 0, limit - radius[balls], radius[balls])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = np.where(v != 0, (target - origin[balls]) / v, np.inf)
+            # A ball already past the wall and heading out bounces at once.
+            t = np.maximum(t, last[balls])
+            return np.where(t <= dt, t, np.inf)
+
+        every_pair = np.arange(len(i))
+        every_ball = np.arange(n)
+        pair_time = pair_times(every_pair)
+        wall_x_time = wall_times(every_ball, origin_x, dx, self.width)
+        wall_y_time = wall_times(every_ball, origin_y, dy, self.height)
+
+        for round_number in range(self.solver_rounds):
+            # Most pairs never meet; only the ones that do this step matter.
+            pending = np.flatnonzero(pair_time < np.inf)
+            pending_time = pair_time[pending]
+            ball_time = np.minimum(wall_x_time, wall_y_time)
+            np.minimum.at(ball_time, i[pending], pending_time)
+            np.minimum.at(ball_time, j[pending], pending_time)
+            if not np.isfinite(ball_time).any():
+                break
+
+            # Pairs whose impact comes first for both balls. If a ball has
+            # two impacts at exactly the same moment, the first pair wins.
+            due = pending[(pending_time == ball_time[i[pending]])
+                          & (pending_time == ball_time[j[pending]])]
+            first_pair = np.full(n, len(i))
+            np.minimum.at(first_pair, i[due], due)
+            np.minimum.at(first_pair, j[due], due)
+            due = due[(first_pair[i[due]] == due) & (first_pair[j[due]] == due)]
+            moved = np.zeros(n, dtype=bool)
+
+            if len(due):
+                a_ball = i[due]
+                b_ball = j[due]
+                t = pair_time[due]
+                ax = origin_x[a_ball] + dx[a_ball] * t
+                ay = origin_y[a_ball] + dy[a_ball] * t
+                bx = origin_x[b_ball] + dx[b_ball] * t
+                by = origin_y[b_ball] + dy[b_ball] * t
+                normal_x = bx - ax
+                normal_y = by - ay
+                dist = np.maximum(np.hypot(normal_x, normal_y), 1e-12)
+                normal_x /= dist
+                normal_y /= dist
+                inv_a = inv_mass[a_ball]
+                inv_b = inv_mass[b_ball]
+                closing = ((dx[b_ball] - dx[a_ball]) * normal_x
+                           + (dy[b_ball] - dy[a_ball]) * normal_y)
+                impulse = np.where(closing < 0, -2.0 * closing / (inv_a + inv_b), 0.0)
+                dx[a_ball] -= impulse * inv_a * normal_x
+                dy[a_ball] -= impulse * inv_a * normal_y
+                dx[b_ball] += impulse * inv_b * normal_x
+                dy[b_ball] += impulse * inv_b * normal_y
+                for ball, px, py in ((a_ball, ax, ay), (b_ball, bx, by)):
+                    origin_x[ball] = px - dx[ball] * t
+                    origin_y[ball] = py - dy[ball] * t
+                    last[ball] = t
+                    moved[ball] = True
+                self.contacts += len(due)
+
+            # Balls whose first impact is a wall (and that aren't busy with a
+            # pair at the same moment) bounce off it.
+            for wall_time, origin, vel in ((wall_x_time, origin_x, dx), (wall_y_time, origin_y, dy)):
+                ball = np.flatnonzero(np.isfinite(wall_time) & (wall_time == ball_time) & ~moved)
+                if not len(ball):
+                    continue
+                t = wall_time[ball]
+                pos = origin[ball] + vel[ball] * t
+                vel[ball] = -vel[ball]
+                origin[ball] = pos - vel[ball] * t
+                last[ball] = t
+                moved[ball] = True
+
+            # Only the times involving a ball that bounced have changed.
+            changed = np.flatnonzero(moved[i] | moved[j])
+            pair_time[changed] = pair_times(changed)
+            ball = np.flatnonzero(moved)
+            wall_x_time[ball] = wall_times(ball, origin_x, dx, self.width)
+            wall_y_time[ball] = wall_times(ball, origin_y, dy, self.height)
+
+        # Impacts between balls still due once the rounds run out are missed
+        # this step, so those balls may run into each other.
+        self.unresolved = int(np.isfinite(pair_time).sum())
+        x[:] = origin_x + dx * dt
+        y[:] = origin_y + dy * dt
+        # Wall impacts still left over are caught by the plain wall check,
+        # so no ball can leave the world.
+        self.bounce_walls(x, dx, radius, self.width)
+        self.bounce_walls(y, dy, radius, self.height)
+
+
+    def positions(self, alpha=1.0):
+        """
+        Where to draw the balls: alpha of the way from where they were before
+        the last step (0.0) to where they are now (1.0).
+        """
+        if alpha >= 1.0:
+            return self.live("x"), self.live("y")
+        prev_x = self.live("prev_x")
+        prev_y = self.live("prev_y")
+        return (prev_x + (self.live("x") - prev_x) * alpha,
+                prev_y + (self.live("y") - prev_y) * alpha)
+
+
+    def sync(self, alpha=1.0):
+        """Write the balls into the shared vertex list, if there is one."""
+        if self.quads is not None:
+            x, y = self.positions(alpha)
+            self.quads.update(x, y, self.live("scale"), None, self.color[:self.count])
+
+
+    def sync_sprites(self, sprites, alpha=1.0):
+        """Move a list of sprites (one per ball, in order) to match the world."""
+        x, y = self.positions(alpha)
+        for sprite, sprite_x, sprite_y in zip(sprites, x.tolist(), y.tolist()):
+            sprite.position = (sprite_x, sprite_y)
+
+
+    def delete(self):
+        """Remove the balls and their vertex list from the batch."""
+        self.count = 0
+        if self.quads is not None:
+            self.quads.delete()
+            self.quads = None
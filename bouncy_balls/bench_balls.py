@@ -0,0 +1,205 @@
+"""
+Headless scaling benchmark for the bouncing balls. For every engine it builds
+worlds of more and more balls, made just the way bouncy.py makes them (random
+positions in the window, velocities in -600 to 600, scales in 0 to 1), steps
+them for a fixed stretch of simulated time, and reports as JSON:
+
+    step_ms                           step time: its mean, p50, p95, p99
+                                      and max (see common/stats.py)
+    balls_per_sec                     ball updates per second of wall time
+    bytes_per_ball                    peak memory traced while building and
+                                      stepping the world, per ball
+    wall_bounces_per_step             how often balls hit the walls
+    candidate_pairs / contacts        per step, for the colliding engines
+    unresolved                        per step, the contacts the solver ran
+                                      out of rounds for (see BallWorld)
+
+The engines are:
+
+    sprite      a Ball sprite per ball, each moved with Ball.move
+    world       a BallWorld, drawn as one vertex list
+    collide     a BallWorld with ball to ball collisions
+    continuous  the same, with continuous collisions
+
+The sprites need an OpenGL context, which comes from pyglet's headless (EGL)
+mode; without one only the BallWorld engines are run, with no drawing. With
+the full sized balls the window gets very crowded, so the colliding engines
+stop at a smaller count. Run it from this folder:
+
+    python bench_balls.py --out results.json
+    python bench_balls.py --engines sprite world --counts 100 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pyglet
+pyglet.options['headless'] = True
+pyglet.options['shadow_window'] = False
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.bench import add_output_argument, open_gl_context, peak_memory, write_results
+from common.stats import spread
+from ball_world import BallWorld
+from bouncy import Ball
+
+
+ENGINES = ("sprite", "world", "collide", "continuous")
+WIDTH = 1000
+HEIGHT = 1000
+BALL_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "img", "ball2.gif")
+
+
+def random_balls(count, seed=1):
+    """The arguments bouncy.py gives each ball, as arrays."""
+    rng = np.random.default_rng(seed)
+    return {"lx": rng.integers(0, WIDTH, count, endpoint=True),
+            "ly": rng.integers(0, HEIGHT, count, endpoint=True),
+            "dx": rng.integers(-600, 600, count, endpoint=True),
+            "dy": rng.integers(-600, 600, count, endpoint=True),
+            "size": rng.random(count),
+            "hue": rng.integers(0, 256, (count, 3))}
+
+
+def build(engine, count, image, batch):
+    balls = random_balls(count)
+    if engine == "sprite":
+        return [Ball(image, lx, ly, dx, dy, size, tuple(hue), batch)
+                for lx, ly, dx, dy, size, hue in zip(*(balls[name].tolist() for name in
+                                                       ("lx", "ly", "dx", "dy", "size", "hue")))]
+    world = BallWorld(WIDTH, HEIGHT, image, batch, capacity=count,
+                      collisions=engine != "world", continuous=engine == "continuous")
+    world.add_balls(balls["lx"], balls["ly"], balls["dx"], balls["dy"], balls["size"], balls["hue"])
+    return world
+
+
+def step(engine, balls, dt):
+    if engine == "sprite":
+        for ball in balls:
+            ball.move(dt, WIDTH, HEIGHT)
+    else:
+        balls.step(dt)
+
+
+def velocity_signs(engine, balls):
+    """Which way every ball is heading, to count the bounces between steps."""
+    if engine == "sprite":
+        return np.array([(ball.dx > 0, ball.dy > 0) for ball in balls])
+    return np.stack((balls.live("dx") > 0, balls.live("dy") > 0), axis=1)
+
+
+def delete(engine, balls):
+    if engine == "sprite":
+        for ball in balls:
+            ball.delete()
+    else:
+        balls.delete()
+
+
+def run_case(engine, count, duration, dt, image, batch):
+    balls = build(engine, count, image, batch)
+    step(engine, balls, dt)
+
+    steps = max(1, round(duration / dt))
+    step_times = []
+    candidate_pairs = 0
+    contacts = 0
+    unresolved = 0
+    # Collisions flip velocities too, so bounces are only counted off walls
+    # when there are no collisions to muddle them.
+    wall_bounces = 0
+    signs = velocity_signs(engine, balls) if engine in ("sprite", "world") else None
+    for i in range(steps):
+        start = time.perf_counter()
+        step(engine, balls, dt)
+        step_times.append(time.perf_counter() - start)
+        if signs is not None:
+            new_signs = velocity_signs(engine, balls)
+            wall_bounces += int((new_signs != signs).sum())
+            signs = new_signs
+        if engine in ("collide", "continuous"):
+            candidate_pairs += balls.candidate_pairs
+            contacts += balls.contacts
+            unresolved += balls.unresolved
+    delete(engine, balls)
+
+    # Memory is measured in a separate pass, since tracing slows things down.
+    del balls
+    def build_and_step():
+        balls = build(engine, count, image, batch)
+        for i in range(min(steps, 10)):
+            step(engine, balls, dt)
+        return balls
+    balls, peak = peak_memory(build_and_step)
+    delete(engine, balls)
+
+    result = {"engine": engine,
+              "count": count,
+              "steps": steps,
+              "dt": dt,
+              "step_ms": spread([step_time * 1000 for step_time in step_times]),
+              "balls_per_sec": count * steps / sum(step_times),
+              "bytes_per_ball": peak / count,
+              "wall_bounces_per_step": wall_bounces / steps if signs is not None else None}
+    if engine in ("collide", "continuous"):
+        result["candidate_pairs"] = candidate_pairs / steps
+        result["contacts"] = contacts / steps
+        result["unresolved"] = unresolved / steps
+    return result
+
+
+def run(engines, counts, duration, dt=1/120, max_sprites=20000, max_collide=2000, draw=True):
+    window = None
+    if draw or "sprite" in engines:
+        window = open_gl_context("sprite engine skipped")
+    image = pyglet.image.load(BALL_IMAGE)
+    image.anchor_x = image.width // 2
+    image.anchor_y = image.height // 2
+    batch = None
+    if window is not None:
+        batch = pyglet.graphics.Batch()
+    else:
+        engines = [engine for engine in engines if engine != "sprite"]
+
+    results = []
+    for engine in engines:
+        for count in counts:
+            if engine == "sprite" and count > max_sprites:
+                continue
+            if engine in ("collide", "continuous") and count > max_collide:
+                continue
+            engine_batch = batch if draw or engine == "sprite" else None
+            results.append(run_case(engine, count, duration, dt, image, engine_batch))
+            print("{engine:>10} {count:>7} balls: {mean:8.3f} ms/step, "
+                  "p99 {p99:8.3f} ms".format(engine=engine, count=count, **results[-1]["step_ms"]),
+                  file=sys.stderr)
+    if window is not None:
+        window.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless bouncing ball benchmark.")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--counts", nargs="+", type=int, default=[100, 1000, 10000, 100000])
+    parser.add_argument("--duration", type=float, default=2.0,
+                        help="simulated seconds to step each world for")
+    parser.add_argument("--dt", type=float, default=1/120, help="seconds per step")
+    parser.add_argument("--max-sprites", type=int, default=20000,
+                        help="largest count to try with the sprite engine")
+    parser.add_argument("--max-collide", type=int, default=2000,
+                        help="largest count to try with the colliding engines")
+    parser.add_argument("--no-draw", action="store_true",
+                        help="run the BallWorld engines without writing vertices")
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    results = run(args.engines, args.counts, args.duration, args.dt,
+                  max_sprites=args.max_sprites, max_collide=args.max_collide,
+                  draw=not args.no_draw)
+    write_results(results, args.out)
@@ -0,0 +1,201 @@
+"""
+Compares BallWorld's discrete and continuous collision modes, for accuracy
+and CPU time, over a range of step lengths. No window is needed. Run it from
+this folder:
+
+    python bench_ccd.py --balls 2000 --steps 1/240,1/120,1/60,1/30,1/15
+
+Three scenes are run at each step length:
+
+    walls   balls bouncing off the walls only. The error is how far, on
+            average and at worst, each ball ends up from where it really
+            should be. With nothing but the walls in the way, that can be
+            worked out exactly from where each ball started, without
+            stepping the world at all (see exact_walls).
+    tunnel  pairs of small, fast balls fired at each other along separate
+            lanes. The error is the share of pairs that went through each
+            other instead of bouncing.
+    crowd   balls bouncing off each other and the walls. The errors are how
+            far the total kinetic energy drifted, and how many pairs are left
+            overlapping at the end (the balls are scattered at random, so
+            some start out overlapping too). Contacts the solver ran out of
+            rounds for on the last step are counted as well.
+"""
+import argparse
+import json
+import os
+import time
+from fractions import Fraction
+
+import numpy as np
+import pyglet
+pyglet.options['shadow_window'] = False
+
+from ball_world import BallWorld, grid_pairs
+
+
+WIDTH = 1000
+HEIGHT = 1000
+# bouncy.py's balls are drawn from this image, so their radii are its width
+# times their scale, over two.
+IMAGE_WIDTH = pyglet.image.load(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                             "img", "ball2.gif")).width
+
+
+def random_balls(count, seed, max_scale=1.0):
+    """The same kind of balls bouncy.py makes, as arrays."""
+    rng = np.random.default_rng(seed)
+    return (rng.uniform(0, WIDTH, count),
+            rng.uniform(0, HEIGHT, count),
+            rng.uniform(-600, 600, count),
+            rng.uniform(-600, 600, count),
+            rng.uniform(0, max_scale, count))
+
+
+def make_world(balls, collisions, continuous):
+    x, y, dx, dy, scale = balls
+    world = BallWorld(WIDTH, HEIGHT, capacity=len(x), collisions=collisions, continuous=continuous)
+    world.add_balls(x, y, dx, dy, scale, image_width=IMAGE_WIDTH)
+    return world
+
+
+def run_world(world, dt, duration):
+    """Step the world for duration seconds, returning the ms per step."""
+    steps = max(1, round(duration / dt))
+    start = time.perf_counter()
+    for i in range(steps):
+        world.simulate(dt)
+    return (time.perf_counter() - start) * 1000 / steps
+
+
+def kinetic_energy(world):
+    mass = world.live("radius") ** 2
+    return float((mass * (world.live("dx") ** 2 + world.live("dy") ** 2)).sum())
+
+
+def overlapping_pairs(world, tolerance=0.01):
+    """Pairs still overlapping by more than tolerance of their radii."""
+    x = world.live("x")
+    y = world.live("y")
+    radius = world.live("radius")
+    i, j = grid_pairs(x, y, max(2 * float(radius.max()), 1.0), WIDTH, HEIGHT)
+    reach = (radius[i] + radius[j]) * (1 - tolerance)
+    return int(((x[j] - x[i]) ** 2 + (y[j] - y[i]) ** 2 < reach * reach).sum())
+
+
+def exact_walls(start, speed, radius, limit, duration):
+    """
+    Where balls bouncing between walls at 0 and limit really are after
+    duration, along one axis. Between bounces a ball's center runs back and
+    forth over a track from radius to limit - radius. Counting from the low
+    end of the track, the distance it would have gone in a straight line
+    covers some number of whole lengths of the track, then a bit more: after
+    an even number of lengths it's that bit along from the low end, and after
+    an odd number, that bit back from the high end.
+    """
+    track = limit - 2 * radius
+    distance = start - radius + speed * duration
+    lengths = np.floor(distance / track)
+    remainder = distance - lengths * track
+    backwards = lengths % 2 == 1
+    return radius + np.where(backwards, track - remainder, remainder)
+
+
+def bench_walls(count, dt, duration, continuous):
+    x, y, dx, dy, scale = random_balls(count, seed=1)
+    radius = scale * IMAGE_WIDTH / 2
+    # The answer is only exact for balls that start out between the walls.
+    x = np.clip(x, radius, WIDTH - radius)
+    y = np.clip(y, radius, HEIGHT - radius)
+    # run_world takes whole steps, which may not add up to duration exactly.
+    stepped = max(1, round(duration / dt)) * dt
+    exact_x = exact_walls(x, dx, radius, WIDTH, stepped)
+    exact_y = exact_walls(y, dy, radius, HEIGHT, stepped)
+    world = make_world((x, y, dx, dy, scale), False, continuous)
+    ms = run_world(world, dt, duration)
+    error = np.hypot(world.live("x") - exact_x, world.live("y") - exact_y)
+    return {"ms_per_step": ms,
+            "mean_error_px": float(error.mean()),
+            "max_error_px": float(error.max())}
+
+
+def bench_tunnel(count, dt, duration, continuous):
+    lanes = max(1, min(count // 2, int(HEIGHT // 5) - 1))
+    rng = np.random.default_rng(2)
+    speed = rng.uniform(600, 3000, lanes)
+    gap = rng.uniform(20, 200, lanes)
+    lane_y = (np.arange(lanes) + 1) * (HEIGHT / (lanes + 1))
+    x = np.concatenate((WIDTH / 2 - gap / 2, WIDTH / 2 + gap / 2))
+    y = np.concatenate((lane_y, lane_y))
+    dx = np.concatenate((speed, -speed))
+    dy = np.zeros(2 * lanes)
+    # Tiny balls, 2 px across, small enough that neighbouring lanes never touch.
+    scale = np.full(2 * lanes, 2 / IMAGE_WIDTH)
+    world = make_world((x, y, dx, dy, scale), True, continuous)
+    # Just long enough for every pair to meet once, but not reach the walls.
+    duration = min(duration, float((WIDTH / 2 - 100) / speed.max() + (gap / (2 * speed)).max()))
+    ms = run_world(world, dt, duration)
+    left = world.live("x")[:lanes]
+    right = world.live("x")[lanes:]
+    return {"ms_per_step": ms,
+            "tunnelled": float((left > right).mean())}
+
+
+def bench_crowd(count, dt, duration, continuous):
+    # Balls up to 20 px across, so the crowd isn't packed solid.
+    world = make_world(random_balls(count, seed=3, max_scale=20 / IMAGE_WIDTH), True, continuous)
+    energy = kinetic_energy(world)
+    ms = run_world(world, dt, duration)
+    return {"ms_per_step": ms,
+            "energy_drift": abs(kinetic_energy(world) / energy - 1),
+            "overlapping": overlapping_pairs(world),
+            "contacts_last_step": world.contacts,
+            "unresolved_last_step": world.unresolved}
+
+
+SCENES = {"walls": bench_walls, "tunnel": bench_tunnel, "crowd": bench_crowd}
+
+
+def run(count, steps, duration, scenes=tuple(SCENES)):
+    results = []
+    for scene in scenes:
+        for dt in steps:
+            for mode in ("discrete", "continuous"):
+                result = SCENES[scene](count, dt, duration, mode == "continuous")
+                result.update({"scene": scene, "mode": mode, "dt": dt,
+                               "ms_per_sim_second": result["ms_per_step"] / dt})
+                results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Discrete vs continuous collision benchmark.")
+    parser.add_argument("--balls", type=int, default=2000)
+    parser.add_argument("--steps", default="1/240,1/120,1/60,1/30,1/15",
+                        help="comma separated step lengths, in seconds")
+    parser.add_argument("--duration", type=float, default=2.0,
+                        help="simulated seconds per run")
+    parser.add_argument("--scenes", default=",".join(SCENES))
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    steps = [float(Fraction(step)) for step in args.steps.split(",")]
+    results = run(args.balls, steps, args.duration, args.scenes.split(","))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print("{} balls, {} simulated seconds".format(args.balls, args.duration))
+        print("{:>7}{:>12}{:>9}{:>10}{:>12}  {}".format("scene", "mode", "dt", "ms/step",
+                                                       "ms/sim sec", "error"))
+        for result in results:
+            if result["scene"] == "walls":
+                error = "mean {:.3f} px, max {:.3f} px".format(result["mean_error_px"],
+                                                              result["max_error_px"])
+            elif result["scene"] == "tunnel":
+                error = "{:.1%} tunnelled".format(result["tunnelled"])
+            else:
+                error = "energy drift {:.2e}, {} overlapping, {} unresolved".format(
+                    result["energy_drift"], result["overlapping"], result["unresolved_last_step"])
+            print("{:>7}{:>12}{:>9.4f}{:>10.2f}{:>12.1f}  {}".format(
+                result["scene"], result["mode"], result["dt"], result["ms_per_step"],
+                result["ms_per_sim_second"], error))
@@ -1,7 +1,14 @@
+import os
+import sys
+
 import pyglet
 import math
 import random
 
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
 
 class Ball(pyglet.sprite.Sprite):
     """
@@ -21,68 +28,142 @@ class Ball(pyglet.sprite.Sprite):
         self.dy = dy
         self.scale = size
         self.color = hue
+        # Where the last two fixed physics steps left the ball (see step).
+        self.prev_x = self.next_x = self.x
+        self.prev_y = self.next_y = self.y
 
-    def move(self, dt):
+    def move(self, dt, width=None, height=None):
         """
         Moves ball according to pyglet's main loop's dt variable and ball's own
         dx and dy properties. Then checks for collisions with window borders.
         """
         self.x += self.dx*dt
         self.y += self.dy*dt
-        self.check_bounds()
+        self.check_bounds(width, height)
 
-    def check_bounds(self):
+    def check_bounds(self, width=None, height=None):
         """
         Checks if the ball has collided with the window border. Collision with
         top or bottom results in reversing dy. With left or right reverses dx.
+        The borders are the window's, unless a width and height are given.
         """
-        if self.x + self.width / 2 > window.width:
-            self.x = window.width - self.width / 2
+        if width is None:
+            width = window.width
+        if height is None:
+            height = window.height
+        half_width = self.width / 2
+        half_height = self.height / 2
+
+        if self.x + half_width > width:
+            self.x = width - half_width
             self.dx *= -1
-        elif self.x - self.width / 2 < 0:
-            self.x = self.width / 2
+        elif self.x - half_width < 0:
+            self.x = half_width
             self.dx *= -1
 
-        if self.y + self.height / 2 > window.height:
-            self.y = window.height - self.height / 2
+        if self.y + half_height > height:
+            self.y = height - half_height
             self.dy *= -1
-        elif self.y - self.height / 2 < 0:
-            self.y = self.height / 2
+        elif self.y - half_height < 0:
+            self.y = half_height
             self.dy *= -1
 
+    def step(self, dt, width=None, height=None):
+        """
+        Moves the ball one fixed physics step. Between steps the sprite may
+        have been drawn part way along (see interpolate), so it is put back
+        where the last step left it first, and where this one leaves it is
+        remembered.
+        """
+        self.position = (self.next_x, self.next_y)
+        self.prev_x, self.prev_y = self.next_x, self.next_y
+        self.move(dt, width, height)
+        self.next_x, self.next_y = self.x, self.y
+
+    def interpolate(self, alpha=1.0):
+        """
+        Draws the ball alpha of the way from where it was before the last
+        physics step (0.0) to where it is now (1.0).
+        """
+        self.position = (self.prev_x + (self.next_x - self.prev_x) * alpha,
+                         self.prev_y + (self.next_y - self.prev_y) * alpha)
+
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bouncing balls demo.")
+    parser.add_argument("--engine", choices=("sprite", "world"), default="sprite",
+                        help="'sprite' moves each Ball sprite itself, 'world' moves "
+                             "them all at once in a BallWorld.")
+    parser.add_argument("--balls", type=int, default=100)
+    parser.add_argument("--collide", action="store_true",
+                        help="with the 'world' engine, bounce balls off each other too")
+    parser.add_argument("--continuous", action="store_true",
+                        help="with the 'world' engine, find the exact moment of each "
+                             "bounce within a step, so long steps don't tunnel")
+    parser.add_argument("--physics-rate", type=float, default=None,
+                        help="step the physics at this fixed rate (e.g. 60) instead of "
+                             "once per clock tick, drawing the balls part way "
+                             "between steps")
+    parser.add_argument("--max-steps", type=int, default=5,
+                        help="with --physics-rate, the most physics steps to catch up "
+                             "on in one frame")
+    from common.profiler import FrameProfiler
+    from common.scheduler import FrameScheduler
+    FrameProfiler.add_arguments(parser)
+    FrameScheduler.add_arguments(parser)
+    args = parser.parse_args()
+    profiler = FrameProfiler.from_args(args)
+    scheduler = FrameScheduler.from_args(args, profiler)
+
     window = pyglet.window.Window(width=1000, height=1000, caption="Bouncy!")
     #window = pyglet.window.Window(fullscreen=True)
     fps_display = pyglet.window.FPSDisplay(window)
 
 
-    # setting up the resource path so we can easily import the sprite graphic and bg
-    pyglet.resource.path = ['./img']
-    pyglet.resource.reindex()
+    # load the sprite graphic and bg from the img folder
+    from common.resources import get_cache
+    resources = get_cache('./img')
 
-    bg_image = pyglet.resource.image('bg.gif')
+    bg_image = resources.image('bg.gif')
 
-    ball_image = pyglet.resource.image('ball2.gif')
-    ball_image.anchor_x = ball_image.width/2
-    ball_image.anchor_y = ball_image.height/2
+    ball_image = resources.image('ball2.gif', centered=True)
 
 
-    @window.event
+    @profiler.event(window)
     def on_draw():
         """
         On draw runs every time through the main loop supplied by pyglet.
         """
         window.clear()
-        bg_sprite.draw()
-        main_batch.draw()
-        fps_display.draw()
+        scheduler.draw()
 
-    def update(dt):
+    def simulate(dt):
         """
-        Updates all the balls in ball list, in preparation for drawing them.
+        Moves all the balls on by dt seconds.
         """
-        for ball in ball_list:
-            ball.move(dt)
+        if world is not None:
+            world.simulate(dt)
+        elif timestep is not None:
+            for ball in ball_list:
+                ball.step(dt)
+        else:
+            for ball in ball_list:
+                ball.move(dt)
+
+    def sync(dt):
+        """
+        Sends the world engine's balls to the batch, in preparation for
+        drawing them. With a fixed physics rate, they (or the sprite
+        engine's balls) are drawn the leftover fraction of the way on to the
+        next step.
+        """
+        alpha = 1.0 if timestep is None else timestep.alpha
+        if world is not None:
+            world.sync(alpha)
+        else:
+            for ball in ball_list:
+                ball.interpolate(alpha)
 
     def get_random_color(alpha=False):
         """
@@ -107,7 +188,20 @@ if __name__ == "__main__":
     """
     main_batch = pyglet.graphics.Batch()
     ball_list = []
-    for i in range(100):
+    world = None
+    if args.engine == "world":
+        from ball_world import BallWorld
+        world = BallWorld(window.width, window.height, ball_image, main_batch, args.balls,
+                          collisions=args.collide, continuous=args.continuous)
+    for i in range(args.balls):
+        if world is not None:
+            world.add_ball(random.randint(0, window.width),
+                           random.randint(0, window.height),
+                           random.randint(-600, 600),
+                           random.randint(-600, 600),
+                           random.random() * 1.0,
+                           get_random_color())
+            continue
         the_ball = Ball(ball_image,
                         random.randint(0, window.width),
                         random.randint(0, window.height),
@@ -122,6 +216,23 @@ if __name__ == "__main__":
         ball_list.append(the_ball)
 
 
-    # Set the clock and run the app!
-    pyglet.clock.schedule_interval(update, 1/120)
+    # Set the clock and run the app! With a fixed physics rate, the
+    # scheduler ticks once a frame and the timestep decides how many physics
+    # steps that is.
+    timestep = None
+    if args.physics_rate:
+        from common.timestep import FixedTimestep
+        timestep = FixedTimestep(profiler.wrap("simulate", simulate), args.physics_rate, args.max_steps)
+        scheduler.add(timestep.advance, "simulate", name="physics")
+    else:
+        scheduler.add(simulate, "simulate")
+    if world is not None or timestep is not None:
+        scheduler.add(sync, "sync")
+    scheduler.add(bg_sprite.draw, "draw", name="background")
+    scheduler.add(main_batch.draw, "draw", name="draw")
+    scheduler.add(fps_display.draw, "draw", name="fps")
+
+    scheduler.start(None if args.physics_rate else 120)
     pyglet.app.run()
+    profiler.close()
+    scheduler.close()
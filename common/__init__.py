@@ -0,0 +1,5 @@
+"""
+Shared helpers for the pyglet demo projects. Each demo adds the repository
+root to sys.path before importing from here, so the demos can still be run
+directly from their own folders.
+"""
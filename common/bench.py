@@ -0,0 +1,51 @@
+"""
+What the headless benchmarks (bench_particles, bench_balls, bench_bursts)
+share: getting an OpenGL context with no display, measuring peak memory in a
+pass of its own, and writing out the results.
+"""
+import json
+import sys
+import tracemalloc
+
+import pyglet
+
+
+def open_gl_context(skipped: str = "drawing skipped"):
+    """
+    Try to get an OpenGL context from a hidden headless window. Returns the
+    window, or None if there is no way to get one here, saying what is
+    skipped without it.
+    """
+    try:
+        return pyglet.window.Window(width=64, height=64, visible=False)
+    except Exception as error:
+        print("No OpenGL context ({}), {}.".format(error, skipped), file=sys.stderr)
+        return None
+
+
+def peak_memory(func):
+    """
+    Call func with tracemalloc on, and return what it returns along with the
+    peak bytes traced while it ran. Tracing slows everything down, so this
+    should be a pass of its own, apart from the one that's timed.
+    """
+    tracemalloc.start()
+    try:
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def add_output_argument(parser):
+    parser.add_argument("--out", help="write the JSON here instead of to stdout")
+
+
+def write_results(results, path=None):
+    """Write the results as JSON to path, or to stdout without one."""
+    if path:
+        with open(path, "w") as out_file:
+            json.dump(results, out_file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
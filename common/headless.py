@@ -0,0 +1,112 @@
+"""
+What common.offscreen and common.replay share for running a demo with no
+display: setting pyglet up to draw offscreen, an event loop that runs a set
+number of frames as fast as it can instead of waiting for them to be due,
+and running the demo itself as if it had been run on its own.
+"""
+import os
+import random
+import runpy
+import sys
+import time
+
+import pyglet
+
+
+def use_headless():
+    """
+    Have pyglet draw into an offscreen buffer through EGL, which Mesa can
+    render on the CPU with llvmpipe, so no display or GPU is needed. This has
+    to be called before anything imports pyglet.window.
+
+    The FPS counters are frozen too, since they go by the real time, so they
+    would draw differently in every run.
+    """
+    pyglet.options['headless'] = True
+    pyglet.options['shadow_window'] = False
+    pyglet.options['debug_gl'] = False
+    from pyglet.window import FPSDisplay
+    FPSDisplay.update_period = float("inf")
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    try:
+        import numpy
+        numpy.random.seed(seed % 2 ** 32)
+    except ImportError:
+        pass
+
+
+def run_script(script, script_args):
+    """Run a demo as if it had been run itself, so it finds its images and the modules next to it."""
+    script = os.path.abspath(script)
+    sys.path.insert(0, os.path.dirname(script))
+    sys.argv = [script] + list(script_args)
+    runpy.run_path(script, run_name="__main__")
+
+
+class HeadlessLoop(pyglet.app.EventLoop):
+    """
+    An event loop that runs frames back to back, with no waiting in between,
+    until frames have been run or the demo exits. Set it as
+    pyglet.app.event_loop, and the demo's own pyglet.app.run() runs it.
+
+    A frame is what the normal loop does each time round (everything
+    scheduled on the clock, then drawing whichever windows need it), then
+    finish(), which waits for the renderer to really have drawn everything
+    it was handed. Subclasses can change what a frame is in run_frame, and
+    set up the windows in prepare.
+    """
+    def __init__(self, frames: int):
+        super(HeadlessLoop, self).__init__()
+        self.frames = frames
+        self.seconds = 0.0
+
+
+    def run(self):
+        self.has_exit = False
+        self._legacy_setup()
+        windows = list(pyglet.app.windows)
+        self.prepare(windows)
+        self.dispatch_event('on_enter')
+        self.is_running = True
+        clock = time.perf_counter
+
+        start = clock()
+        for frame in range(self.frames):
+            if self.has_exit:
+                break
+            self.run_frame(frame, windows)
+        self.seconds = clock() - start
+
+        self.is_running = False
+        self.dispatch_event('on_exit')
+
+
+    def prepare(self, windows):
+        pass
+
+
+    def run_frame(self, frame, windows):
+        self.idle()
+        self.finish()
+
+
+    def idle(self):
+        # The same as the normal idle, but there's no point working out how
+        # long to sleep for.
+        dt = self.clock.update_time()
+        redraw_all = self.clock.call_scheduled_functions(dt)
+        for window in pyglet.app.windows:
+            if redraw_all or (window._legacy_invalid and window.invalid):
+                window.switch_to()
+                window.dispatch_event('on_draw')
+                window.flip()
+                window._legacy_invalid = False
+
+
+    @staticmethod
+    def finish():
+        from pyglet.gl import glFinish
+        glFinish()
@@ -0,0 +1,195 @@
+"""
+Runs any of the demos with no display and no GPU, drawing into an offscreen
+buffer through pyglet's headless (EGL) path, which Mesa can render on the CPU
+with llvmpipe. The demo runs for a fixed number of frames on a fixed timestep,
+with time faked so every run sees exactly the same dts, and each frame's draw
+is timed. So draw costs can be measured on a build box, and frames can be
+dumped as PNGs, or compared against an earlier run's, to catch rendering
+changes. From the top of the repository:
+
+    python -m common.offscreen --frames 300 particles/particle00.py --engine array
+    python -m common.offscreen --png-dir /tmp/frames arrows/arrow.py
+    python -m common.offscreen --compare /tmp/frames --out draw.json arrows/arrow.py
+
+Anything after the demo's path is passed on to the demo, so its own options
+(--profile-out and so on) still work.
+
+Each frame is:
+
+    update      the clock is moved on by exactly 1/fps, and everything
+                scheduled on it runs
+    draw        on_draw is dispatched to each window
+    finish      glFinish, so the renderer has really done the drawing, not
+                just been handed it
+
+The FPS counters are frozen, since they go by the real time, so they would
+be different in every run and useless off a faked clock anyway. Numbers from
+a software renderer are for comparing one change against another on the
+same machine, not for guessing how fast a real GPU would be.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import pyglet
+
+from common.headless import HeadlessLoop, run_script, seed_everything, use_headless
+from common.stats import spread
+
+
+class OffscreenLoop(HeadlessLoop):
+    """
+    A HeadlessLoop that draws every window every frame, moving its clock on
+    by dt before each, and times the update, the draw and the finish apart.
+    """
+    def __init__(self, frames: int = 300, dt: float = 1 / 60, warmup: int = 10,
+                 png_dir: str = None, compare_dir: str = None, tolerance: int = 0):
+        self.time = 0.0
+        pyglet.clock.set_default(pyglet.clock.Clock(time_function=lambda: self.time))
+        super(OffscreenLoop, self).__init__(frames)
+        self.dt = dt
+        self.warmup = warmup
+        self.png_dir = png_dir
+        self.compare_dir = compare_dir
+        self.tolerance = tolerance
+        self.records = []       # one dict per frame
+        self.mismatches = []    # frames that didn't match compare_dir
+        self.missing = 0        # frames compare_dir had no image for
+        if png_dir:
+            os.makedirs(png_dir, exist_ok=True)
+
+
+    def prepare(self, windows):
+        for window in windows:
+            # A real window is told its size when it's first shown, which
+            # is when the demos set up their projection.
+            window.switch_to()
+            window.dispatch_event('on_resize', window.width, window.height)
+
+
+    def run_frame(self, frame, windows):
+        clock = time.perf_counter
+        self.time += self.dt
+        start = clock()
+        self.clock.tick()
+        update = clock() - start
+        for number, window in enumerate(windows):
+            window.switch_to()
+            start = clock()
+            window.dispatch_event('on_draw')
+            drawn = clock()
+            self.finish()
+            finished = clock()
+            self.records.append({"frame": frame,
+                                 "window": number,
+                                 "update_ms": update * 1000,
+                                 "draw_ms": (drawn - start) * 1000,
+                                 "finish_ms": (finished - drawn) * 1000})
+            if self.png_dir or self.compare_dir:
+                self.check_frame(frame, number, len(windows))
+            window.flip()
+
+
+    def check_frame(self, frame, number, windows):
+        """Save the frame just drawn, and compare it with the reference one, as asked."""
+        name = "frame{:05d}.png".format(frame)
+        if windows > 1:
+            name = "window{}_{}".format(number, name)
+        image = pyglet.image.get_buffer_manager().get_color_buffer().get_image_data()
+        if self.png_dir:
+            image.save(os.path.join(self.png_dir, name))
+        if self.compare_dir:
+            path = os.path.join(self.compare_dir, name)
+            if not os.path.exists(path):
+                self.missing += 1
+                return
+            import numpy as np
+            reference = pyglet.image.load(path).get_image_data()
+            if (reference.width, reference.height) != (image.width, image.height):
+                self.mismatches.append({"frame": frame, "window": number, "size_changed": True})
+                return
+            pitch = image.width * 4
+            new = np.frombuffer(image.get_data("RGBA", pitch), dtype=np.uint8).astype(np.int16)
+            old = np.frombuffer(reference.get_data("RGBA", pitch), dtype=np.uint8).astype(np.int16)
+            difference = np.abs(new - old).reshape(-1, 4).max(axis=1)
+            changed = int((difference > self.tolerance).sum())
+            if changed:
+                self.mismatches.append({"frame": frame, "window": number,
+                                        "pixels_changed": changed,
+                                        "largest_difference": int(difference.max())})
+
+
+    def report(self) -> dict:
+        """The timings of the frames after the warmup, with every frame's own."""
+        from pyglet.gl import gl_info
+        timed = [record for record in self.records if record["frame"] >= self.warmup]
+        report = {"renderer": gl_info.get_renderer(),
+                  "vendor": gl_info.get_vendor(),
+                  "gl_version": gl_info.get_version(),
+                  "frames": len({record["frame"] for record in self.records}),
+                  "warmup": self.warmup,
+                  "dt": self.dt}
+        for name in ("update_ms", "draw_ms", "finish_ms", "render_ms"):
+            if name == "render_ms":
+                values = sorted(record["draw_ms"] + record["finish_ms"] for record in timed)
+            else:
+                values = sorted(record[name] for record in timed)
+            if values:
+                report[name] = spread(values)
+        if self.compare_dir:
+            report["compare"] = {"reference": self.compare_dir,
+                                 "tolerance": self.tolerance,
+                                 "missing": self.missing,
+                                 "mismatches": self.mismatches}
+        report["per_frame"] = self.records
+        return report
+
+
+if __name__ == "__main__":
+    use_headless()
+    parser = argparse.ArgumentParser(description="Run a demo offscreen for a fixed number of "
+                                                 "frames, timing each frame's draw.")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--fps", type=float, default=60,
+                        help="the fixed timestep is 1/fps seconds")
+    parser.add_argument("--warmup", type=int, default=10,
+                        help="frames left out of the timings, while textures and "
+                             "buffers are first being set up")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for random (and NumPy's random), so every run draws the same")
+    parser.add_argument("--png-dir", help="save every frame here as a PNG")
+    parser.add_argument("--compare", metavar="DIR",
+                        help="compare every frame with the PNGs saved in DIR by an earlier "
+                             "run, and exit with status 1 if any differ")
+    parser.add_argument("--tolerance", type=int, default=0,
+                        help="with --compare, how far a pixel's channels can be off (0-255) "
+                             "before it counts as changed")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("script", help="the demo to run")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER,
+                        help="options for the demo")
+    args = parser.parse_args()
+
+    seed_everything(args.seed)
+    loop = OffscreenLoop(args.frames, 1 / args.fps, args.warmup,
+                         args.png_dir, args.compare, args.tolerance)
+    pyglet.app.event_loop = loop
+    run_script(args.script, args.script_args)
+
+    report = loop.report()
+    if args.out:
+        with open(args.out, "w") as out_file:
+            json.dump(report, out_file, indent=2)
+    render = report.get("render_ms", {})
+    print("{} frames on {}: render {:.3f} ms mean, {:.3f} ms p95 (draw {:.3f}, finish {:.3f})".format(
+        report["frames"], report["renderer"], render.get("mean", 0), render.get("p95", 0),
+        report.get("draw_ms", {}).get("mean", 0), report.get("finish_ms", {}).get("mean", 0)),
+        file=sys.stderr)
+    if args.compare:
+        compare = report["compare"]
+        print("{} frames differ from {} ({} had no reference)".format(
+            len(compare["mismatches"]), args.compare, compare["missing"]), file=sys.stderr)
+        if compare["mismatches"]:
+            sys.exit(1)
@@ -0,0 +1,266 @@
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import pyglet
+
+from common.stats import spread
+
+
+class FrameProfiler():
+    """
+    FrameProfiler times the named parts of each frame (update, emit, cull,
+    draw and so on) so it's plain which one is blowing the frame budget. The
+    parts are hooked in by wrapping them:
+
+        wrap(name, func)            any function, such as a clock callback
+        wrap_method(obj, method)    one object's method, for the hot paths
+                                    inside an update
+        wrap_batch(batch)           a batch's draw
+        event(window)               use in place of @window.event; on_draw
+                                    also marks the end of each frame
+        section(name)               a with block
+
+    Each frame, the time spent in every part is added up, and the last
+    history frames' worth are kept for rolling percentiles. Times include
+    any wrapped parts called from inside, so an update's time includes its
+    emit. 'frame' is the time from one frame's end to the next, and 'busy'
+    the time spent in top level wrapped calls during it; busy frames over
+    budget are counted.
+
+    Anything that wants each frame's busy time, a QualityController say, can
+    be added to frame_listeners, and is called with it (in seconds) as each
+    frame ends.
+
+    A disabled FrameProfiler hands every function back unwrapped, so it
+    costs nothing at all. With overlay, the percentiles are drawn in the
+    corner of the window, and with trace every call is kept to be written
+    out as a Chrome trace (open it in chrome://tracing or Perfetto).
+    """
+    def __init__(self,
+                 enabled: bool = True,
+                 history: int = 300,
+                 budget: float = 1 / 60,
+                 overlay: bool = False,
+                 trace: bool = False,
+                 max_trace_events: int = 500000):
+        self.enabled = enabled
+        self.budget = budget
+        self.show_overlay = overlay
+        self.tracing = trace
+        self.max_trace_events = max_trace_events
+        self.history = {}           # name -> deque of ms per frame
+        self.history_length = history
+        self.current = {}           # name -> seconds so far this frame
+        self.busy = 0.0
+        self.depth = 0
+        self.frames = 0
+        self.over_budget = 0
+        self.trace_events = []      # (name, start, duration)
+        self.frame_ends = []
+        self.origin = time.perf_counter()
+        self.last_frame_end = None
+        self.overlay_label = None
+        self.overlay_updated = 0.0
+        self.trace_path = None
+        self.summary_path = None
+        self.frame_listeners = []
+
+
+    @classmethod
+    def add_arguments(cls, parser):
+        """Add the --profile, --profile-out and --trace options to a demo's parser."""
+        parser.add_argument("--profile", action="store_true",
+                            help="time each part of every frame, and show the timings on screen")
+        parser.add_argument("--profile-out", metavar="PATH",
+                            help="write the timings as JSON when the window is closed")
+        parser.add_argument("--trace", metavar="PATH",
+                            help="write every timed call as a Chrome trace when the window is closed")
+
+
+    @classmethod
+    def from_args(cls, args, enabled=False):
+        """
+        Make a profiler as the options from add_arguments ask. It is disabled
+        without them, unless enabled is given because something else needs
+        the timings.
+        """
+        profiler = cls(enabled=bool(enabled or args.profile or args.profile_out or args.trace),
+                       overlay=args.profile,
+                       trace=bool(args.trace))
+        profiler.summary_path = args.profile_out
+        profiler.trace_path = args.trace
+        return profiler
+
+
+    def record(self, name, start, end):
+        elapsed = end - start
+        self.current[name] = self.current.get(name, 0.0) + elapsed
+        if self.depth == 0:
+            self.busy += elapsed
+        if self.tracing and len(self.trace_events) < self.max_trace_events:
+            self.trace_events.append((name, start, elapsed))
+
+
+    def wrap(self, name, func):
+        """Return func, timed under name."""
+        if not self.enabled:
+            return func
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            self.depth += 1
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.depth -= 1
+                self.record(name, start, clock())
+        timed.__name__ = getattr(func, "__name__", name)
+        return timed
+
+
+    def wrap_method(self, obj, method_name, name=None):
+        """Time obj's method_name under name (the method's own name by default)."""
+        if self.enabled:
+            setattr(obj, method_name, self.wrap(name or method_name, getattr(obj, method_name)))
+
+
+    def wrap_batch(self, batch, name="draw"):
+        """Time batch's draw under name."""
+        self.wrap_method(batch, "draw", name)
+
+
+    @contextmanager
+    def timed_section(self, name):
+        self.depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            self.record(name, start, time.perf_counter())
+
+
+    def section(self, name):
+        """Return a context manager timing a with block under name."""
+        if not self.enabled:
+            return nullcontext()
+        return self.timed_section(name)
+
+
+    def event(self, window, name=None):
+        """
+        A decorator to use in place of @window.event, timing the handler under
+        its own name. An on_draw handler also ends the frame, and then draws
+        the overlay on top of what it drew.
+        """
+        def set_handler(func):
+            if not self.enabled:
+                return window.event(func)
+            handler_name = func.__name__
+            timed = self.wrap(name or handler_name, func)
+            if handler_name == "on_draw":
+                def on_draw():
+                    result = timed()
+                    self.end_frame()
+                    if self.show_overlay:
+                        self.draw_overlay(window)
+                    return result
+                window.set_handler(handler_name, on_draw)
+            else:
+                window.set_handler(handler_name, timed)
+            return func
+        return set_handler
+
+
+    def end_frame(self):
+        """Close off this frame's timings and start the next frame's."""
+        now = time.perf_counter()
+        if self.last_frame_end is not None:
+            self.current["frame"] = now - self.last_frame_end
+        self.current["busy"] = self.busy
+        if self.busy > self.budget:
+            self.over_budget += 1
+        for listener in self.frame_listeners:
+            listener(self.busy)
+        for name, seconds in self.current.items():
+            if name not in self.history:
+                self.history[name] = deque(maxlen=self.history_length)
+            self.history[name].append(seconds * 1000)
+        if self.tracing and len(self.frame_ends) < self.max_trace_events:
+            self.frame_ends.append(now)
+        self.current = {}
+        self.busy = 0.0
+        self.frames += 1
+        self.last_frame_end = now
+
+
+    def stats(self, name) -> dict:
+        """The mean, percentiles and worst of one part, in ms per frame, over the recent frames."""
+        times = self.history.get(name, ())
+        if not times:
+            return {}
+        return dict(spread(times), frames=len(times))
+
+
+    def summary(self) -> dict:
+        return {"frames": self.frames,
+                "budget_ms": self.budget * 1000,
+                "over_budget": self.over_budget,
+                "sections": {name: self.stats(name) for name in self.history}}
+
+
+    def overlay_text(self):
+        lines = ["{:<12}{:>8}{:>8}{:>8}".format("ms", "p50", "p95", "max")]
+        for name in sorted(self.history, key=lambda name: (name not in ("frame", "busy"), name)):
+            stats = self.stats(name)
+            lines.append("{:<12}{p50:>8.2f}{p95:>8.2f}{max:>8.2f}".format(name[:12], **stats))
+        lines.append("over budget: {} of {}".format(self.over_budget, self.frames))
+        return "\n".join(lines)
+
+
+    def draw_overlay(self, window):
+        """Draw the timings in the window's top left corner. The text changes four times a second."""
+        now = time.perf_counter()
+        if self.overlay_label is None:
+            self.overlay_label = pyglet.text.Label("", font_name="Courier New", font_size=10,
+                                                   x=4, y=window.height - 4, anchor_y="top",
+                                                   multiline=True, width=400,
+                                                   color=(255, 255, 0, 255))
+        if now - self.overlay_updated > 0.25:
+            self.overlay_label.text = self.overlay_text()
+            self.overlay_label.y = window.height - 4
+            self.overlay_updated = now
+        self.overlay_label.draw()
+
+
+    def write_json(self, path):
+        """Write the summary, and the recent frames of every part, as JSON."""
+        report = self.summary()
+        report["history_ms"] = {name: list(times) for name, times in self.history.items()}
+        with open(path, "w") as out_file:
+            json.dump(report, out_file, indent=2)
+
+
+    def write_trace(self, path):
+        """Write every timed call, and the frame ends, in Chrome's trace event format."""
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "pid": pid, "tid": 0,
+                   "ts": (start - self.origin) * 1e6, "dur": duration * 1e6}
+                  for name, start, duration in self.trace_events]
+        events += [{"name": "frame", "ph": "i", "s": "p", "pid": pid, "tid": 0,
+                    "ts": (end - self.origin) * 1e6}
+                   for end in self.frame_ends]
+        with open(path, "w") as out_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, out_file)
+
+
+    def close(self):
+        """Write out whatever from_args asked for."""
+        if self.summary_path:
+            self.write_json(self.summary_path)
+        if self.trace_path:
+            self.write_trace(self.trace_path)
@@ -0,0 +1,142 @@
+import numpy as np
+import pyglet
+from pyglet.gl import GL_QUADS, GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA
+
+
+def as_array(ctypes_array, dtype):
+    """
+    Return a writable NumPy view of a ctypes array, such as the one returned
+    by a pyglet vertex list's vertices or colors property. Writes to the view
+    land directly in pyglet's copy of the data, no per-element Python calls.
+    """
+    return np.ctypeslib.as_array(ctypes_array).view(dtype)
+
+
+def sprite_quads(image, x, y, scale=None, rotation=None, out=None):
+    """
+    Work out the four corners of a sprite quad for every entry in the x and y
+    arrays at once. This follows the same math as pyglet's Sprite, so a quad
+    drawn from here lines up with a Sprite given the same values: the image's
+    anchor is the center of scaling and rotation, and rotation is clockwise in
+    degrees. Returns an (n, 8) float32 array of ax, ay, bx, by, cx, cy, dx, dy.
+    """
+    n = len(x)
+    if out is None:
+        out = np.empty((n, 8), dtype=np.float32)
+    x1 = -image.anchor_x
+    y1 = -image.anchor_y
+    x2 = x1 + image.width
+    y2 = y1 + image.height
+
+    # The corners are worked out in a scratch array laid out corner-major, so
+    # every operation runs down one long contiguous row. NumPy is far quicker
+    # at that than at striding through the interleaved (n, 8) layout, which
+    # only gets written once, at the end.
+    if rotation is None:
+        if scale is None:
+            scale = np.ones(n, dtype=np.float32)
+        cr = scale
+        sr = None
+    else:
+        rads = np.radians(rotation, dtype=np.float32)
+        rads *= -1
+        cr = np.cos(rads)
+        sr = np.sin(rads)
+        if scale is not None:
+            cr *= scale
+            sr *= scale
+
+    scratch = np.empty((8, n), dtype=np.float32)
+    for k, (corner_x, corner_y) in enumerate(((x1, y1), (x2, y1), (x2, y2), (x1, y2))):
+        row_x = scratch[2 * k]
+        row_y = scratch[2 * k + 1]
+        np.multiply(cr, corner_x, out=row_x)
+        np.multiply(cr, corner_y, out=row_y)
+        if sr is not None:
+            row_x -= sr * corner_y
+            row_y += sr * corner_x
+        row_x += x
+        row_y += y
+    out[:] = scratch.T
+    return out
+
+
+class QuadBatch():
+    """
+    QuadBatch draws many copies of one image from a single vertex list in a
+    graphics batch. It does the job of a crowd of Sprites, but instead of each
+    sprite writing its own four vertices, the caller hands over arrays of
+    positions, scales, rotations and colors and they are written in one go.
+    Slots past the live count are collapsed to zero-size quads, so they cost
+    nothing to look at.
+    """
+    def __init__(self, image, batch, capacity=1024, group=None,
+                 blend_src=GL_SRC_ALPHA, blend_dest=GL_ONE_MINUS_SRC_ALPHA):
+        self.image = image
+        self.texture = image.get_texture()
+        self.batch = batch
+        self.group = pyglet.sprite.SpriteGroup(self.texture, blend_src, blend_dest, group)
+        self.capacity = 0
+        self.count = 0
+        self.vertex_list = None
+        self.resize(capacity)
+
+    def resize(self, capacity):
+        """
+        Make room for at least capacity quads. The vertex list only grows, so
+        effects that come in waves don't keep reallocating.
+        """
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        tex_coords = tuple(self.texture.tex_coords) * capacity
+        if self.vertex_list is None:
+            self.vertex_list = self.batch.add(capacity * 4, GL_QUADS, self.group,
+                                              'v2f/stream', 'c4B/stream',
+                                              ('t3f/static', tex_coords))
+            as_array(self.vertex_list.vertices, np.float32)[:] = 0
+        else:
+            self.vertex_list.resize(capacity * 4)
+            self.vertex_list.tex_coords[:] = tex_coords
+            as_array(self.vertex_list.vertices, np.float32)[self.capacity * 8:] = 0
+        self.capacity = capacity
+
+    def update(self, x, y, scale=None, rotation=None, color=(255, 255, 255), opacity=255):
+        """
+        Write quads for the first len(x) slots. scale and rotation may be None
+        (meaning 1.0 and 0), or arrays. color may be a single RGB tuple or an
+        (n, 3) array, and opacity a single value or an (n,) array. If color
+        is None, the colors already written are left as they are, which saves
+        rewriting them when only the positions have changed.
+        """
+        n = len(x)
+        self.resize(n)
+        if self.vertex_list is None:
+            return
+        vertices = as_array(self.vertex_list.vertices, np.float32).reshape(-1, 8)
+        sprite_quads(self.image, x, y, scale, rotation, out=vertices[:n])
+        if self.count > n:
+            vertices[n:self.count] = 0
+        if color is None:
+            self.count = n
+            return
+
+        # Each vertex color is packed into one 32 bit RGBA value (byte order
+        # for little-endian machines), so a quad's four colors can be written
+        # with four array copies.
+        rgb = np.asarray(color, dtype=np.uint32).reshape(-1, 3)
+        packed = rgb[:, 0] | (rgb[:, 1] << 8) | (rgb[:, 2] << 16)
+        packed = packed | (np.asarray(opacity).astype(np.uint32) << 24)
+        packed = np.broadcast_to(packed, (n,))
+        colors = as_array(self.vertex_list.colors, np.uint8).view(np.uint32).reshape(-1, 4)
+        for k in range(4):
+            colors[:n, k] = packed
+        self.count = n
+
+    def delete(self):
+        """Remove the quads from their batch."""
+        if self.vertex_list is not None:
+            self.vertex_list.delete()
+            self.vertex_list = None
+        self.capacity = 0
+        self.count = 0
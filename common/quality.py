@@ -0,0 +1,197 @@
+import json
+import sys
+import time
+
+
+class Knob():
+    """
+    Knob is one thing an emitter or group can turn down to save time when
+    frames run long, such as how many particles it emits. Its level goes
+    from 1.0 (full quality) down to floor, step at a time, and setter is
+    called with the new level each time it changes.
+
+    Knobs with the lowest priority are turned down first, and turned back
+    up last, so the ones whose loss is hardest to see should have the lowest.
+    """
+    def __init__(self, name: str, setter, floor: float = 0.25, step: float = 0.25, priority: int = 0):
+        self.name = name
+        self.setter = setter
+        self.floor = floor
+        self.step = step
+        self.priority = priority
+        self.level = 1.0
+
+
+    def can_turn_down(self) -> bool:
+        return self.level - self.step >= self.floor - 1e-9
+
+
+    def set_level(self, level):
+        self.level = round(min(1.0, max(self.floor, level)), 6)
+        self.setter(self.level)
+
+
+class QualityController():
+    """
+    QualityController holds the frames to a time budget by turning work down
+    when they run long, and back up when there's room again. Each frame's
+    cost (the time spent updating and drawing it) is passed to frame(), by
+    a FrameProfiler, say, and a running average of it is kept.
+
+    Emitters and groups join in with add(). Each one's quality_knobs method
+    returns the Knobs it is willing to have turned down. When the average has
+    been over budget for down_after frames in a row, one knob is turned down
+    a step: the lowest priority knob that still can be. When it has been
+    under low times the budget for up_after frames in a row, the last knob
+    turned down is turned back up a step. In between, nothing changes, and
+    after every change nothing changes for settle frames, so each change has
+    time to show in the average before the next is decided on. Together
+    those stop the quality from flickering up and down around the budget.
+
+    Every change is kept in decisions, and with verbose, printed as well.
+    """
+    def __init__(self,
+                 budget: float = 1 / 120,
+                 low: float = 0.75,
+                 smoothing: float = 0.1,
+                 down_after: int = 10,
+                 up_after: int = 120,
+                 settle: int = 30,
+                 warmup: int = 30,
+                 verbose: bool = False):
+        self.budget = budget
+        self.low = low
+        self.smoothing = smoothing
+        self.down_after = down_after
+        self.up_after = up_after
+        self.settle = settle
+        self.warmup = warmup
+        self.verbose = verbose
+        self.knobs = []         # (owner, name, Knob), in the order they are turned down
+        self.turned_down = []   # the knobs turned down, most recent last
+        self.decisions = []
+        self.average = None
+        self.frames = 0
+        self.over = 0           # frames in a row over budget
+        self.under = 0          # frames in a row with room to spare
+        self.wait = 0           # frames left to settle
+        self.saturated = 0      # times something needed turning down, but nothing could be
+        self.log_path = None
+        self.start = time.perf_counter()
+
+
+    @classmethod
+    def add_arguments(cls, parser):
+        """Add the --target-ms and --quality-log options to a demo's parser."""
+        parser.add_argument("--target-ms", type=float, metavar="MS",
+                            help="turn the effects down whenever frames take longer than MS "
+                                 "to update and draw (8.3 for 120 Hz), and back up when "
+                                 "they don't")
+        parser.add_argument("--quality-log", metavar="PATH",
+                            help="with --target-ms, write every change as JSON when the "
+                                 "window is closed")
+
+
+    @classmethod
+    def from_args(cls, args):
+        """Make a controller as the options from add_arguments ask, or None without them."""
+        if args.target_ms is None:
+            return None
+        controller = cls(budget=args.target_ms / 1000, verbose=True)
+        controller.log_path = args.quality_log
+        return controller
+
+
+    def add(self, owner, name: str = None):
+        """Take charge of owner's quality_knobs, naming them after name."""
+        if name is None:
+            name = "{}{}".format(type(owner).__name__, len({id(entry[0]) for entry in self.knobs}))
+        for knob in owner.quality_knobs():
+            self.knobs.append((owner, name, knob))
+        self.knobs.sort(key=lambda entry: entry[2].priority)
+
+
+    def frame(self, cost: float):
+        """Take one frame's cost, in seconds, and turn something down or up if it's time to."""
+        self.frames += 1
+        if self.frames <= self.warmup:
+            return
+        if self.average is None:
+            self.average = cost
+        else:
+            self.average += self.smoothing * (cost - self.average)
+        if self.wait > 0:
+            self.wait -= 1
+            return
+
+        if self.average > self.budget:
+            self.over += 1
+            self.under = 0
+            if self.over >= self.down_after:
+                self.turn_down()
+        elif self.average < self.budget * self.low:
+            self.under += 1
+            self.over = 0
+            if self.under >= self.up_after:
+                self.turn_up()
+        else:
+            self.over = 0
+            self.under = 0
+
+
+    def turn_down(self):
+        for owner, name, knob in self.knobs:
+            if knob.can_turn_down():
+                knob.set_level(knob.level - knob.step)
+                self.turned_down.append((name, knob))
+                self.decide("down", name, knob)
+                return
+        self.saturated += 1
+        self.over = 0
+
+
+    def turn_up(self):
+        if not self.turned_down:
+            self.under = 0
+            return
+        name, knob = self.turned_down.pop()
+        knob.set_level(knob.level + knob.step)
+        self.decide("up", name, knob)
+
+
+    def decide(self, change, name, knob):
+        decision = {"frame": self.frames,
+                    "time": time.perf_counter() - self.start,
+                    "change": change,
+                    "knob": "{}.{}".format(name, knob.name),
+                    "level": knob.level,
+                    "average_ms": (self.average or 0.0) * 1000,
+                    "budget_ms": self.budget * 1000}
+        self.decisions.append(decision)
+        self.over = 0
+        self.under = 0
+        self.wait = self.settle
+        if self.verbose:
+            print("quality: frame {frame}, {average_ms:.2f} ms against {budget_ms:.2f} ms: "
+                  "{knob} {change} to {level:g}".format(**decision), file=sys.stderr)
+
+
+    def levels(self) -> dict:
+        """Every knob's level now."""
+        return {"{}.{}".format(name, knob.name): knob.level for owner, name, knob in self.knobs}
+
+
+    def write_json(self, path):
+        report = {"budget_ms": self.budget * 1000,
+                  "frames": self.frames,
+                  "saturated": self.saturated,
+                  "levels": self.levels(),
+                  "decisions": self.decisions}
+        with open(path, "w") as out_file:
+            json.dump(report, out_file, indent=2)
+
+
+    def close(self):
+        """Write out whatever from_args asked for."""
+        if self.log_path:
+            self.write_json(self.log_path)
@@ -0,0 +1,253 @@
+"""
+Records a run of any of the demos (the random seed, the time of every frame
+and every mouse and keyboard event) to a log, and plays the log back with no
+window, as fast as it will go. Because the replay does exactly the work the
+recorded run did, frame for frame, two builds can be timed against each other
+on the same workload. From the top of the repository:
+
+    python -m common.replay record --log arrows.log.gz arrows/arrow.py
+    python -m common.replay play arrows.log.gz --repeat 5 --out timings.json
+
+Anything after the demo's path is passed on to the demo, and is saved in the
+log, so the replay runs it with the same options.
+
+The recording works by giving the demo a clock whose time only moves once a
+frame, at the start of the event loop's idle, and logging that time. Events
+are logged with the number of the frame they came before. Replaying, the
+clock is moved to each logged time in turn, and each frame's events are
+dispatched before it, so the demo's scheduled functions get the same dts and
+the same events in the same order, and draw the same frames. The FPS
+counters, which go by the real time, are frozen in the replay, and the
+number of frames drawn is checked against the recording.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import pyglet
+
+from common.headless import HeadlessLoop, run_script, seed_everything, use_headless
+from common.stats import spread
+
+
+# The window events that are logged and replayed: the input, and the window
+# being shown, resized and so on. Their arguments are all ints and strings,
+# so they go into the log as they are.
+WINDOW_EVENTS = ("on_key_press", "on_key_release", "on_text", "on_text_motion",
+                 "on_text_motion_select", "on_mouse_motion", "on_mouse_press",
+                 "on_mouse_release", "on_mouse_drag", "on_mouse_scroll",
+                 "on_mouse_enter", "on_mouse_leave", "on_resize", "on_move",
+                 "on_show", "on_hide", "on_expose", "on_activate", "on_deactivate")
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def watch(windows, on_event, on_draw):
+    """
+    Push handlers onto every window that call on_event(number, name, *args)
+    for each of the WINDOW_EVENTS, and on_draw(number) when it is drawn. The
+    recording and the replay both do this, because a window is redrawn
+    after any event that has a handler, so they need the same handlers.
+    """
+    for number, window in enumerate(windows):
+        handlers = {}
+        for name in WINDOW_EVENTS:
+            def handler(*args, number=number, name=name):
+                on_event(number, name, *args)
+            handlers[name] = handler
+        def drawn(number=number):
+            on_draw(number)
+        handlers["on_draw"] = drawn
+        window.push_handlers(**handlers)
+
+
+class FrameClock(pyglet.clock.Clock):
+    """
+    A clock whose time only moves when update_time is called, once a frame,
+    to whatever source returns. Anything scheduled between frames (by an
+    event handler, say) is scheduled from the frame's time. While recording,
+    source is the real time since the start, and every time is kept in
+    frame_times; while replaying, source hands back the recorded times.
+    """
+    def __init__(self, source, record: bool = False):
+        self.now = 0.0
+        self.source = source
+        self.frame_times = [] if record else None
+        super(FrameClock, self).__init__(time_function=lambda: self.now)
+
+
+    def update_time(self):
+        self.now = self.source()
+        if self.frame_times is not None:
+            self.frame_times.append(self.now)
+        return super(FrameClock, self).update_time()
+
+
+class RecordingLoop(pyglet.app.EventLoop):
+    """
+    The normal event loop, but on a FrameClock, and logging every window's
+    input events and the frames they came before.
+    """
+    def __init__(self, seed, script, script_args):
+        start = time.perf_counter()
+        pyglet.clock.set_default(FrameClock(lambda: time.perf_counter() - start, record=True))
+        super(RecordingLoop, self).__init__()
+        self.seed = seed
+        self.script = script
+        self.script_args = script_args
+        self.events = []        # [frame, window, name, *args]
+        self.draws = []         # how many times each window was drawn
+
+
+    def run(self):
+        windows = list(pyglet.app.windows)
+        self.draws = [0] * len(windows)
+        watch(windows, self.log_event, self.count_draw)
+        super(RecordingLoop, self).run()
+
+
+    def log_event(self, number, name, *args):
+        self.events.append([len(self.clock.frame_times), number, name] + list(args))
+
+
+    def count_draw(self, number):
+        self.draws[number] += 1
+
+
+    def save(self, path):
+        """Write the log, gzipped if path ends in .gz."""
+        log = {"version": 1,
+               "script": self.script,
+               "args": self.script_args,
+               "seed": self.seed,
+               "frame_times": self.clock.frame_times,
+               "events": self.events,
+               "draws": self.draws}
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt") as out_file:
+            json.dump(log, out_file, separators=(",", ":"))
+
+
+def load(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as in_file:
+        return json.load(in_file)
+
+
+class ReplayLoop(HeadlessLoop):
+    """
+    A HeadlessLoop that plays a log back: before each recorded frame it
+    dispatches that frame's events, then runs the frame just as the normal
+    loop does. Each frame is timed through to the finish.
+    """
+    def __init__(self, log):
+        times = iter(log["frame_times"])
+        pyglet.clock.set_default(FrameClock(lambda: next(times)))
+        super(ReplayLoop, self).__init__(len(log["frame_times"]))
+        self.log = log
+        self.frame_ms = []
+        self.draws = []
+        self.next_event = 0
+
+
+    def prepare(self, windows):
+        self.draws = [0] * len(windows)
+        watch(windows, self.ignore_event, self.count_draw)
+
+
+    def run_frame(self, frame, windows):
+        start = time.perf_counter()
+        events = self.log["events"]
+        while self.next_event < len(events) and events[self.next_event][0] == frame:
+            _, number, name, *args = events[self.next_event]
+            windows[number].dispatch_event(name, *args)
+            self.next_event += 1
+        super(ReplayLoop, self).run_frame(frame, windows)
+        self.frame_ms.append((time.perf_counter() - start) * 1000)
+
+
+    def ignore_event(self, number, name, *args):
+        pass
+
+
+    def count_draw(self, number):
+        self.draws[number] += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record a demo's input and timing, or replay it headlessly.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="run a demo in a window, and log the run")
+    record.add_argument("--log", required=True, help="where to write the log (gzipped if it ends in .gz)")
+    record.add_argument("--seed", type=int, help="the random seed (a random one by default)")
+    record.add_argument("script", help="the demo to run")
+    record.add_argument("script_args", nargs=argparse.REMAINDER, help="options for the demo")
+    play = commands.add_parser("play", help="replay a log with no window, as fast as possible")
+    play.add_argument("log")
+    play.add_argument("--repeat", type=int, default=1,
+                      help="replay this many times, each in a fresh process, and report each")
+    play.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+        seed_everything(seed)
+        loop = RecordingLoop(seed, os.path.relpath(os.path.abspath(args.script), ROOT), args.script_args)
+        pyglet.app.event_loop = loop
+        run_script(os.path.join(ROOT, loop.script), args.script_args)
+        loop.save(args.log)
+        print("recorded {} frames and {} events (seed {}) to {}".format(
+            len(loop.clock.frame_times), len(loop.events), seed, args.log), file=sys.stderr)
+
+    elif args.repeat > 1:
+        # pyglet can't start over in the same process, so each replay gets
+        # its own.
+        import subprocess
+        import tempfile
+        runs = []
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as folder:
+                out = os.path.join(folder, "run.json")
+                subprocess.run([sys.executable, "-m", "common.replay", "play",
+                                os.path.abspath(args.log), "--out", out],
+                               check=True, cwd=ROOT)
+                runs.append(load(out))
+        totals = [run["seconds"] for run in runs]
+        report = {"log": args.log, "repeat": args.repeat,
+                  "seconds": spread(totals), "runs": runs}
+        print("best {:.3f} s, median {:.3f} s over {} replays".format(
+            min(totals), statistics.median(totals), args.repeat), file=sys.stderr)
+        if args.out:
+            with open(args.out, "w") as out_file:
+                json.dump(report, out_file, indent=2)
+
+    else:
+        use_headless()
+        log = load(args.log)
+        seed_everything(log["seed"])
+        loop = ReplayLoop(log)
+        pyglet.app.event_loop = loop
+        run_script(os.path.join(ROOT, log["script"]), log["args"])
+
+        report = {"log": args.log,
+                  "script": log["script"],
+                  "args": log["args"],
+                  "frames": len(loop.frame_ms),
+                  "seconds": loop.seconds,
+                  "frame_ms": spread(loop.frame_ms) if loop.frame_ms else {},
+                  "draws": loop.draws,
+                  "recorded_draws": log["draws"],
+                  "matches": loop.draws == log["draws"]}
+        print("replayed {} frames in {:.3f} s ({:.3f} ms mean, {:.3f} ms p95 a frame){}".format(
+            report["frames"], report["seconds"], report["frame_ms"].get("mean", 0),
+            report["frame_ms"].get("p95", 0),
+            "" if report["matches"] else ": drew {} frames, but the recording drew {}".format(
+                loop.draws, log["draws"])), file=sys.stderr)
+        if args.out:
+            with open(args.out, "w") as out_file:
+                json.dump(report, out_file, indent=2)
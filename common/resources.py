@@ -0,0 +1,208 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pyglet
+from pyglet.image.atlas import TextureBin
+
+
+def center_anchor(image):
+    """
+    Return a copy of an image (sharing its texture) anchored at its center,
+    so it scales and rotates about the middle. The anchor is kept to whole
+    pixels, which is what textures expect.
+    """
+    region = image.get_region(0, 0, image.width, image.height)
+    region.anchor_x = image.width // 2
+    region.anchor_y = image.height // 2
+    return region
+
+
+class ResourceCache():
+    """
+    ResourceCache loads images from its own list of folders, without touching
+    pyglet.resource's global path, and keeps them in a cache keyed by file
+    name, so asking for the same image twice doesn't load it twice. An image
+    can be asked for centered (anchored at its middle, ready to rotate), and
+    that variant is cached too, sharing the plain image's texture.
+
+    Small images (no bigger than atlas_max in either direction) are packed
+    into shared texture atlases instead of getting a texture each, so a batch
+    drawing several of them doesn't have to switch textures between them.
+    Atlases are shared by every ResourceCache that uses the same TextureBin;
+    by default that is one bin for the whole program.
+
+    Big images each get their own texture, and these are what budget limits:
+    when the textures held add up to more than budget bytes, the least
+    recently used are dropped from the cache (and freed, once nothing else
+    is using them). Packed images are small and can't be taken back out of
+    their atlas, so they are kept for good.
+
+    preload decodes a list of images on a worker thread, so a game can start
+    without waiting for them all. Decoding doesn't need OpenGL, but making
+    textures does, so that part is always done on the main thread: either
+    when the image is first asked for, or a few at a time by upload_preloaded.
+    """
+    shared_bin = None
+
+    def __init__(self,
+                 paths,
+                 budget: int = 64 * 1024 * 1024,
+                 atlas_max: int = 512,
+                 texture_bin: TextureBin = None):
+        """
+        paths is a folder or list of folders to look for files in, relative
+        to the running script's folder if they aren't absolute.
+        """
+        if isinstance(paths, str):
+            paths = [paths]
+        self.loader = pyglet.resource.Loader(list(paths))
+        self.budget = budget
+        self.atlas_max = atlas_max
+        self.texture_bin = texture_bin
+        self.images = OrderedDict()     # (name, centered) -> image, least recently used first
+        self.costs = OrderedDict()      # name -> bytes of texture held for it, if not packed,
+                                        # least recently used first
+        self.texture_bytes = 0          # bytes of texture held for images that aren't packed
+        self.preloaded = {}             # name -> decoded image waiting for a texture
+        self.lock = threading.Lock()
+        self.executor = None
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "packed": 0}
+
+
+    def get_bin(self):
+        if self.texture_bin is None:
+            if ResourceCache.shared_bin is None:
+                ResourceCache.shared_bin = TextureBin(1024, 1024)
+            self.texture_bin = ResourceCache.shared_bin
+        return self.texture_bin
+
+
+    def image(self, name: str, centered: bool = False):
+        """
+        Return the image in file name, loading it if it isn't cached. With
+        centered, the image is anchored at its middle.
+        """
+        key = (name, centered)
+        if key in self.images:
+            self.images.move_to_end(key)
+            if name in self.costs:
+                self.costs.move_to_end(name)
+            self.stats["hits"] += 1
+            return self.images[key]
+        self.stats["misses"] += 1
+
+        if centered:
+            image = center_anchor(self.image(name))
+        else:
+            image = self.make_texture(name, self.decode_or_take(name))
+        self.images[key] = image
+        self.evict()
+        return image
+
+
+    def decode(self, name):
+        """Read and decode one image file. Safe to call off the main thread."""
+        with self.loader.file(name) as image_file:
+            return pyglet.image.load(name, file=image_file)
+
+
+    def decode_or_take(self, name):
+        with self.lock:
+            image_data = self.preloaded.pop(name, None)
+        if image_data is None:
+            image_data = self.decode(name)
+        return image_data
+
+
+    def make_texture(self, name, image_data):
+        if image_data.width <= self.atlas_max and image_data.height <= self.atlas_max:
+            self.stats["packed"] += 1
+            return self.get_bin().add(image_data, border=1)
+        self.texture_bytes -= self.costs.pop(name, 0)
+        self.costs[name] = image_data.width * image_data.height * 4
+        self.texture_bytes += self.costs[name]
+        return image_data.get_texture()
+
+
+    def evict(self):
+        """
+        Drop least recently used textures until they fit the budget. costs
+        is kept in the order they were last used in, so the one to drop is
+        always at the front. The image just asked for is never dropped.
+        """
+        newest = next(reversed(self.images))[0]
+        while self.texture_bytes > self.budget:
+            oldest = next(iter(self.costs), None)
+            if oldest is None or oldest == newest:
+                return
+            self.drop(oldest)
+
+
+    def drop(self, name):
+        """Forget an image and its centered variant."""
+        self.images.pop((name, False), None)
+        self.images.pop((name, True), None)
+        self.texture_bytes -= self.costs.pop(name, 0)
+        self.stats["evictions"] += 1
+
+
+    def preload(self, manifest):
+        """
+        Start decoding every file named in manifest (a list of file names) on
+        a worker thread. Returns a Future that finishes, with the list of
+        names decoded, once they all are.
+        """
+        names = [name for name in manifest if (name, False) not in self.images]
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preload")
+        return self.executor.submit(self.preload_names, names)
+
+
+    def preload_names(self, names):
+        for name in names:
+            image_data = self.decode(name)
+            with self.lock:
+                self.preloaded[name] = image_data
+        return names
+
+
+    def upload_preloaded(self, limit: int = None) -> int:
+        """
+        Make textures for up to limit images that have finished preloading
+        (all of them if limit is None). Must be called on the main thread;
+        scheduling it on the clock spreads the work over a few frames.
+        Returns how many were made.
+        """
+        with self.lock:
+            names = list(self.preloaded)
+        if limit is not None:
+            names = names[:limit]
+        for name in names:
+            if (name, False) in self.images:
+                # Asked for (and decoded again) before the preload finished.
+                with self.lock:
+                    self.preloaded.pop(name, None)
+            else:
+                self.image(name)
+        return len(names)
+
+
+    def close(self):
+        """Stop the preload thread, once it has finished what it is doing."""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+_caches = {}
+
+
+def get_cache(path: str) -> ResourceCache:
+    """
+    Return the ResourceCache for a folder, making it the first time. Every
+    part of a program loading from the same folder then shares one cache.
+    """
+    if path not in _caches:
+        _caches[path] = ResourceCache(path)
+    return _caches[path]
@@ -0,0 +1,187 @@
+import json
+import time
+
+import pyglet
+
+
+# The phases of a frame, in the order they run. Everything but draw runs in
+# tick; draw runs from on_draw.
+PHASES = ("input", "emit", "simulate", "sync", "draw")
+
+
+class Task():
+    """One piece of per-frame work, added to a FrameScheduler with add()."""
+    def __init__(self, func, phase, priority, interval, name, order):
+        self.func = func
+        self.phase = phase
+        self.priority = priority
+        self.interval = interval
+        self.name = name
+        self.order = order
+        self.pending = 0.0      # seconds since it last ran
+        self.runs = 0
+        self.deferred = 0
+
+
+    def sort_key(self):
+        return (PHASES.index(self.phase), -self.priority, self.order)
+
+
+class FrameScheduler():
+    """
+    FrameScheduler runs all of a demo's per-frame work from one clock
+    callback, tick, in a fixed order, in place of a schedule_interval for
+    each thing at its own rate. Those fire in separate clock ticks whenever
+    their times come round, each tick redrawing the window, and none of them
+    lined up with the frames. Here everything that's due runs in the same
+    tick, just before the frame is drawn.
+
+    Work is added with add(), to one of the PHASES. Within a phase, higher
+    priorities go first, then whatever was added first. A task with an
+    interval only runs once that long has gone by, and then once, with dt
+    being all the time since it last ran; so does anything else that misses
+    a tick.
+
+    Tasks with a priority below 0 can wait: once a tick has gone over budget,
+    they are put off to a later tick, but never for more than max_delay
+    seconds. Draw tasks are called with no arguments, from draw(), which
+    on_draw should call after clearing the window, and are never put off.
+
+    If the clock fires again before the last tick's frame has been drawn,
+    the tick just adds its dt on to the next one, so the work is done once a
+    frame however often the clock fires.
+
+    Given a FrameProfiler, each task is timed under its name.
+    """
+    def __init__(self, budget: float = 1 / 120, max_delay: float = 0.25, profiler=None):
+        self.budget = budget
+        self.max_delay = max_delay
+        self.profiler = profiler
+        self.tasks = []         # tick tasks, in the order they run
+        self.draw_tasks = []
+        self.added = 0
+        self.carry = 0.0        # dt from ticks that were folded into the next
+        self.drawn = True       # whether the last tick's frame has been drawn
+        self.draws = 0
+        self.ticks = 0
+        self.coalesced = 0
+        self.over_budget = 0
+        self.deferred = 0
+        self.stats_path = None
+
+
+    @classmethod
+    def add_arguments(cls, parser):
+        """Add the --tick-budget-ms and --scheduler-out options to a demo's parser."""
+        parser.add_argument("--tick-budget-ms", type=float, default=1000 / 120, metavar="MS",
+                            help="once a tick has taken MS, put off the work that can wait")
+        parser.add_argument("--scheduler-out", metavar="PATH",
+                            help="write how often each task ran and was put off as JSON "
+                                 "when the window is closed")
+
+
+    @classmethod
+    def from_args(cls, args, profiler=None):
+        """Make a scheduler as the options from add_arguments ask."""
+        scheduler = cls(budget=args.tick_budget_ms / 1000, profiler=profiler)
+        scheduler.stats_path = args.scheduler_out
+        return scheduler
+
+
+    def add(self, func, phase: str = "simulate", priority: int = 0,
+            interval: float = None, name: str = None) -> Task:
+        """
+        Run func once a frame, in phase. Tasks in every phase but draw are
+        called with dt. Returns the Task, which remove() takes.
+        """
+        if phase not in PHASES:
+            raise ValueError("phase must be one of {}, not {!r}".format(", ".join(PHASES), phase))
+        if name is None:
+            name = getattr(func, "__name__", "task")
+        if self.profiler is not None:
+            func = self.profiler.wrap(name, func)
+        task = Task(func, phase, priority, interval, name, self.added)
+        self.added += 1
+        tasks = self.draw_tasks if phase == "draw" else self.tasks
+        tasks.append(task)
+        tasks.sort(key=Task.sort_key)
+        return task
+
+
+    def remove(self, task: Task):
+        if task in self.draw_tasks:
+            self.draw_tasks.remove(task)
+        else:
+            self.tasks.remove(task)
+
+
+    def start(self, rate: float = 120):
+        """
+        Put tick on the clock, rate times a second, or every time the clock
+        ticks if rate is None (which, without vsync, is as often as it can).
+        """
+        if rate:
+            pyglet.clock.schedule_interval(self.tick, 1 / rate)
+        else:
+            pyglet.clock.schedule(self.tick)
+
+
+    def stop(self):
+        pyglet.clock.unschedule(self.tick)
+
+
+    def tick(self, dt):
+        """Run every task that is due, phase by phase."""
+        if not self.drawn and self.draws:
+            self.carry += dt
+            self.coalesced += 1
+            return
+        dt += self.carry
+        self.carry = 0.0
+        self.ticks += 1
+        clock = time.perf_counter
+        start = clock()
+        for task in self.tasks:
+            task.pending += dt
+            if task.interval is not None and task.pending < task.interval:
+                continue
+            if task.priority < 0 and clock() - start > self.budget and task.pending < self.max_delay:
+                task.deferred += 1
+                self.deferred += 1
+                continue
+            elapsed = task.pending
+            task.pending = 0.0
+            task.runs += 1
+            task.func(elapsed)
+        if clock() - start > self.budget:
+            self.over_budget += 1
+        self.drawn = False
+
+
+    def draw(self):
+        """Run the draw tasks. Call this from on_draw."""
+        for task in self.draw_tasks:
+            task.runs += 1
+            task.func()
+        self.drawn = True
+        self.draws += 1
+
+
+    def stats(self) -> dict:
+        return {"ticks": self.ticks,
+                "draws": self.draws,
+                "coalesced": self.coalesced,
+                "over_budget": self.over_budget,
+                "deferred": self.deferred,
+                "tasks": {task.name: {"phase": task.phase,
+                                      "priority": task.priority,
+                                      "runs": task.runs,
+                                      "deferred": task.deferred}
+                          for task in self.tasks + self.draw_tasks}}
+
+
+    def close(self):
+        """Write out whatever from_args asked for."""
+        if self.stats_path:
+            with open(self.stats_path, "w") as out_file:
+                json.dump(self.stats(), out_file, indent=2)
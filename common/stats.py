@@ -0,0 +1,19 @@
+import statistics
+
+
+def percentile(ordered, p):
+    """
+    The value p percent of the way through ordered, a sorted list, by
+    nearest rank: no interpolation, so it is always one of the values.
+    """
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def spread(values, percentiles=(50, 95, 99)) -> dict:
+    """The mean, the given percentiles (as "p50" and so on) and the largest of a list of numbers."""
+    ordered = sorted(values)
+    summary = {"mean": statistics.fmean(ordered)}
+    for p in percentiles:
+        summary["p{:g}".format(p)] = percentile(ordered, p)
+    summary["max"] = ordered[-1]
+    return summary
@@ -0,0 +1,45 @@
+class FixedTimestep():
+    """
+    FixedTimestep runs a simulation step at a steady rate, however often the
+    clock actually calls it. Each call to advance adds the real time that has
+    passed to an accumulator, and the step function is run, always with the
+    same dt, once for each whole step's worth of time in it. What's left over
+    is returned as alpha, the fraction of the way to the next step, which a
+    renderer can use to draw objects part way between their last two states.
+
+    Because the step always sees the same dt, the simulation gives the same
+    results however the frames happen to fall, and it can run at a lower rate
+    than the screen is drawn at.
+
+    If the game falls behind (a slow frame, or the window being dragged), more
+    and more steps would be needed to catch up, each making the next frame
+    slower still. To stop that spiral, no more than max_steps are run per
+    call, and any time beyond that is dropped (and added to dropped_time).
+    """
+    def __init__(self, step, rate: float = 60.0, max_steps: int = 5):
+        self.step = step
+        self.dt = 1.0 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.steps = 0
+        self.dropped_time = 0.0
+
+    def advance(self, dt: float) -> float:
+        """
+        Add dt seconds of real time, run whatever steps are due, and return
+        alpha (between 0.0 and 1.0).
+        """
+        self.accumulator += dt
+        steps = 0
+        while self.accumulator >= self.dt and steps < self.max_steps:
+            self.step(self.dt)
+            self.accumulator -= self.dt
+            steps += 1
+        if self.accumulator >= self.dt:
+            dropped = self.accumulator - self.accumulator % self.dt
+            self.dropped_time += dropped
+            self.accumulator -= dropped
+        self.steps += steps
+        self.alpha = self.accumulator / self.dt
+        return self.alpha
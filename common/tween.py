@@ -0,0 +1,244 @@
+import numpy as np
+
+
+def _linear(t):
+    return t
+
+def _quad_in(t):
+    return t * t
+
+def _quad_out(t):
+    return t * (2 - t)
+
+def _quad_in_out(t):
+    return np.where(t < 0.5, 2 * t * t, 1 - 2 * (1 - t) ** 2)
+
+def _cubic_in(t):
+    return t ** 3
+
+def _cubic_out(t):
+    return 1 - (1 - t) ** 3
+
+def _sine_in_out(t):
+    return 0.5 - 0.5 * np.cos(np.pi * t)
+
+
+# Easing functions take an array of times from 0.0 to 1.0 and return how far
+# along the way each value should be at those times.
+EASINGS = {"linear": _linear,
+           "quad_in": _quad_in,
+           "quad_out": _quad_out,
+           "quad_in_out": _quad_in_out,
+           "cubic_in": _cubic_in,
+           "cubic_out": _cubic_out,
+           "sine_in_out": _sine_in_out}
+EASING_NAMES = tuple(EASINGS)
+
+
+class Tweener():
+    """
+    Tweener moves properties from one value to another over time, for any
+    number of objects at once. Each tween is one row in a set of NumPy arrays
+    (start and end values, how long it takes, how far along it is, which
+    easing to use), so a whole frame's worth of tweens is worked out in one
+    go, however many there are, rather than by an update method on every
+    object.
+
+    A tween's target is either an object, whose attribute is set (a Label's
+    font_size, say, or a Sprite's x), or a NumPy array, whose entries at the
+    given indices are set, which costs no Python calls per entry at all. With
+    whole, values are rounded down to whole numbers. Either way, a value is
+    only written when it has changed since it was last written, so a Label
+    isn't laid out again just because its font size went from 15.2 to 15.4.
+
+    When tweens finish, on_done is called with the list of their targets (or
+    indices, for arrays), all of a frame's finished tweens for a callback
+    together. So on_done should be shared by a whole group of tweens, such as
+    a bound method of whatever made them.
+
+    Nothing moves until update is called, once a frame, by whoever owns the
+    Tweener; several groups of objects can share one.
+    """
+    FIELDS = ("start", "end", "elapsed", "delay", "duration", "last")
+
+    def __init__(self, capacity: int = 256):
+        self.count = 0
+        self.capacity = 0
+        self.data = {}
+        self.easing = np.zeros(0, dtype=np.int8)
+        self.whole = np.zeros(0, dtype=bool)
+        self.array_id = np.zeros(0, dtype=np.int32)     # -1 for an attribute tween
+        self.done_id = np.zeros(0, dtype=np.int32)      # -1 for no callback
+        self.targets = np.zeros(0, dtype=object)
+        self.props = np.zeros(0, dtype=object)          # attribute name, or array index
+        self.arrays = []
+        self.callbacks = []
+        self.callback_ids = {}
+        self.grow(capacity)
+
+
+    def __len__(self):
+        return self.count
+
+
+    def grow(self, capacity):
+        """Make room for at least capacity tweens."""
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        for name in self.FIELDS:
+            # Double precision, so times add up exactly enough that a tween
+            # lands on the same whole numbers as the frame by frame version.
+            new_array = np.zeros(capacity, dtype=np.float64)
+            if name in self.data:
+                new_array[:self.count] = self.data[name][:self.count]
+            self.data[name] = new_array
+        for name in ("easing", "whole", "array_id", "done_id", "targets", "props"):
+            old_array = getattr(self, name)
+            new_array = np.zeros(capacity, dtype=old_array.dtype)
+            new_array[:self.count] = old_array[:self.count]
+            setattr(self, name, new_array)
+        self.capacity = capacity
+
+
+    def live(self, name):
+        """Return a view of one field for the tweens running now."""
+        return self.data[name][:self.count]
+
+
+    def tween(self, target, prop, start, end, duration,
+              easing="linear", delay=0.0, whole=False, on_done=None):
+        """
+        Move target's prop from start to end over duration seconds, after
+        waiting delay seconds. If target is a NumPy array, prop is an index or
+        an array of indices, and start and end can be arrays of the same
+        length, to start a tween for each entry in one call.
+        """
+        if isinstance(target, np.ndarray):
+            prop = np.atleast_1d(np.asarray(prop))
+            n = len(prop)
+            array_id = self.array_index(target)
+        else:
+            n = 1
+            array_id = -1
+        self.grow(self.count + n)
+        new = slice(self.count, self.count + n)
+        data = self.data
+        data["start"][new] = start
+        data["end"][new] = end
+        data["elapsed"][new] = 0
+        data["delay"][new] = delay
+        data["duration"][new] = duration
+        data["last"][new] = np.nan
+        self.easing[new] = EASING_NAMES.index(easing)
+        self.whole[new] = whole
+        self.array_id[new] = array_id
+        self.done_id[new] = -1 if on_done is None else self.callback_index(on_done)
+        if array_id >= 0:
+            self.targets[new] = None
+            self.props[new] = list(prop)
+        else:
+            self.targets[new] = target
+            self.props[new] = prop
+        self.count += n
+
+
+    def array_index(self, array):
+        for i, known in enumerate(self.arrays):
+            if known is array:
+                return i
+        self.arrays.append(array)
+        return len(self.arrays) - 1
+
+
+    def callback_index(self, callback):
+        if callback not in self.callback_ids:
+            self.callback_ids[callback] = len(self.callbacks)
+            self.callbacks.append(callback)
+        return self.callback_ids[callback]
+
+
+    def cancel(self, target):
+        """
+        Stop every tween on target (an object, or an array) where it is,
+        without calling on_done.
+        """
+        if isinstance(target, np.ndarray):
+            keep = self.array_id[:self.count] != self.array_index(target)
+        else:
+            keep = np.array([known is not target for known in self.targets[:self.count]], dtype=bool)
+        if not keep.all():
+            self.compact(keep)
+
+
+    def values(self, t):
+        """Return the eased values of the running tweens at times t."""
+        eased = np.empty_like(t)
+        easing = self.easing[:self.count]
+        for easing_id in np.flatnonzero(np.bincount(easing, minlength=len(EASING_NAMES))):
+            rows = easing == easing_id
+            eased[rows] = EASINGS[EASING_NAMES[easing_id]](t[rows])
+        start = self.live("start")
+        value = start + (self.live("end") - start) * eased
+        whole = self.whole[:self.count]
+        if whole.any():
+            value[whole] = np.floor(value[whole])
+        return value
+
+
+    def update(self, dt):
+        """
+        Move every tween on by dt seconds, write the values that changed,
+        then drop the finished tweens and call their on_done callbacks.
+        """
+        if self.count == 0:
+            return
+        elapsed = self.live("elapsed")
+        elapsed += dt
+        running_time = elapsed - self.live("delay")
+        duration = self.live("duration")
+        t = np.clip(running_time / np.maximum(duration, 1e-9), 0.0, 1.0)
+        t[duration <= 0] = 1.0
+        value = self.values(t)
+
+        last = self.live("last")
+        changed = (running_time >= 0) & (value != last)
+        last[changed] = value[changed]
+        self.write(np.flatnonzero(changed), value)
+
+        finished = running_time >= duration
+        if finished.any():
+            done = self.done_id[:self.count][finished]
+            targets = np.where(self.array_id[:self.count] >= 0,
+                               self.props[:self.count], self.targets[:self.count])[finished]
+            self.compact(~finished)
+            for callback_id in np.flatnonzero(np.bincount(done[done >= 0], minlength=1)):
+                self.callbacks[callback_id](targets[done == callback_id].tolist())
+
+
+    def write(self, rows, value):
+        array_id = self.array_id[rows]
+        attribute_rows = rows[array_id < 0]
+        for target, prop, new_value, whole in zip(self.targets[attribute_rows],
+                                                  self.props[attribute_rows],
+                                                  value[attribute_rows].tolist(),
+                                                  self.whole[attribute_rows]):
+            setattr(target, prop, int(new_value) if whole else new_value)
+        for i in np.unique(array_id[array_id >= 0]):
+            array_rows = rows[array_id == i]
+            self.arrays[i][self.props[array_rows].astype(np.intp)] = value[array_rows]
+
+
+    def compact(self, keep):
+        """Keep only the tweens in keep, in order."""
+        n = int(keep.sum())
+        for name in self.FIELDS:
+            array = self.data[name]
+            array[:n] = array[:self.count][keep]
+        for name in ("easing", "whole", "array_id", "done_id", "targets", "props"):
+            array = getattr(self, name)
+            array[:n] = array[:self.count][keep]
+            # Let go of the finished tweens' targets.
+            if array.dtype == object:
+                array[n:self.count] = None
+        self.count = n
@@ -0,0 +1,72 @@
+"""
+Times each stage of the ArrayParticleEmitter affector pipeline on its own, so
+the cost of adding gravity, drag or an over-life curve to an effect is a
+number rather than a guess. No window is needed. Run it from this folder:
+
+    python bench_affectors.py --particles 100000 --ticks 200
+"""
+import argparse
+import time
+
+import pyglet
+pyglet.options['shadow_window'] = False
+
+from particle_arrays import ArrayParticleEmitter
+from particle_affectors import affectors_from_chars
+
+
+BENCH_CHARS = {"img": None,
+               "color": (255, 255, 255),
+               "opacity": (51, 153),
+               "rotation": (0, 0),
+               "scale": (0.5, 1.5),
+               "speed": (50, 100),
+               "direction": (0, 360),
+               "life": (1000.0, 1000.0),
+               "gravity": (0, -98),
+               "drag": 0.5,
+               "scale_over_life": ((0.0, 1.0), (1.0, 2.5)),
+               "opacity_over_life": ((0.0, 1.0), (0.7, 1.0), (1.0, 0.0)),
+               "color_over_life": ((0.0, (255, 255, 0)), (1.0, (255, 0, 0))),
+               "batch": None}
+
+
+def time_stage(stage, ticks):
+    """Run stage() ticks times and return the mean milliseconds per call."""
+    start = time.perf_counter()
+    for i in range(ticks):
+        stage()
+    return (time.perf_counter() - start) * 1000 / ticks
+
+
+def run(particles, ticks, dt=1/120):
+    emitter = ArrayParticleEmitter(0, 0, BENCH_CHARS, capacity=particles, seed=1)
+    emitter.emit(particles)
+    # Leave the affectors off the emitter, so 'move' is the bare simulation.
+    affectors = affectors_from_chars(BENCH_CHARS)
+    emitter.affectors = []
+    emitter.live("age")[:] = emitter.live("life") * 0.5
+
+    results = [("move", time_stage(lambda: emitter.update(dt), ticks))]
+    t = emitter.live("age") / emitter.live("life")
+    for affector in affectors:
+        if affector.stage == "motion":
+            stage = lambda: affector.apply(emitter, dt)
+        else:
+            stage = lambda: affector.apply_look({"scale": emitter.live("scale"),
+                                                  "opacity": emitter.live("opacity"),
+                                                  "color": emitter.color}, t)
+        results.append((type(affector).__name__, time_stage(stage, ticks)))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage cost of particle affectors.")
+    parser.add_argument("--particles", type=int, default=100000)
+    parser.add_argument("--ticks", type=int, default=200)
+    args = parser.parse_args()
+
+    print("{} particles, {} ticks".format(args.particles, args.ticks))
+    print("{:<16}{:>12}{:>16}".format("stage", "ms/tick", "ns/particle"))
+    for name, ms in run(args.particles, args.ticks):
+        print("{:<16}{:>12.3f}{:>16.2f}".format(name, ms, ms * 1e6 / args.particles))
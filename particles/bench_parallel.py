@@ -0,0 +1,85 @@
+"""
+Scaling curve for ParallelParticleEmitter: runs the same effect with the
+single-process ArrayParticleEmitter and then with 1 to N worker processes,
+reporting ms per tick and the speedup over the single-process engine. It also
+checks that every run ends up with exactly the same particles. No window is
+needed. Run it from this folder:
+
+    python bench_parallel.py --particles 2000000 --max-workers 8
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pyglet
+pyglet.options['shadow_window'] = False
+
+from particle_arrays import ArrayParticleEmitter
+from particle_parallel import ParallelParticleEmitter
+
+
+def bench_chars(particles, ticks, dt):
+    # Long enough lives that the effect stays near full size for the whole run,
+    # with a steady trickle of deaths and emissions.
+    life = ticks * dt * 4
+    return {"img": None,
+            "color": (255, 255, 255),
+            "opacity": (51, 153),
+            "rotation": (0, 0),
+            "scale": (0.5, 1.5),
+            "speed": (50, 100),
+            "direction": (0, 360),
+            "life": (life * 0.5, life),
+            "rate": particles / life,
+            "gravity": (0, -98),
+            "drag": 0.5,
+            "batch": None}
+
+
+def run_engine(emitter, particles, ticks, dt):
+    emitter.emit(particles)
+    emitter.update(dt)
+    start = time.perf_counter()
+    for i in range(ticks):
+        emitter.update(dt)
+    ms = (time.perf_counter() - start) * 1000 / ticks
+    return ms, {name: emitter.live(name).copy() for name in emitter.FIELDS}
+
+
+def run(particles, max_workers, ticks, dt=1/120):
+    chars = bench_chars(particles, ticks, dt)
+    baseline_ms, baseline = run_engine(ArrayParticleEmitter(0, 0, chars, capacity=particles * 2, seed=1),
+                                       particles, ticks, dt)
+    results = [{"workers": 0, "ms_per_tick": baseline_ms, "speedup": 1.0, "matches": True}]
+    for workers in range(1, max_workers + 1):
+        emitter = ParallelParticleEmitter(0, 0, chars, capacity=particles * 2, seed=1, workers=workers)
+        ms, final = run_engine(emitter, particles, ticks, dt)
+        emitter.close()
+        matches = all(np.array_equal(final[name], baseline[name]) for name in baseline)
+        results.append({"workers": workers,
+                        "ms_per_tick": ms,
+                        "speedup": baseline_ms / ms,
+                        "matches": matches})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process particle scaling benchmark.")
+    parser.add_argument("--particles", type=int, default=2000000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--ticks", type=int, default=60)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.particles, args.max_workers, args.ticks)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print("{} particles, {} ticks, {} CPUs".format(args.particles, args.ticks, os.cpu_count()))
+        print("{:>8}{:>12}{:>10}{:>10}".format("workers", "ms/tick", "speedup", "matches"))
+        for result in results:
+            workers = result["workers"] or "single"
+            print("{:>8}{:>12.2f}{:>10.2f}{:>10}".format(workers, result["ms_per_tick"],
+                                                        result["speedup"], str(result["matches"])))
@@ -0,0 +1,178 @@
+"""
+Headless throughput benchmark for the particle emitters. For every engine it
+sweeps the number of live particles and the emission rate, runs the emitter
+(emission and update) without opening a visible window, and reports as JSON:
+
+    ms_per_tick / p95_ms_per_tick   update time per tick
+    particles_per_sec               particle updates per second of wall time
+    peak_kb                         peak memory traced while the effect runs
+    net_blocks_per_tick             Python memory blocks left allocated per tick
+    gc_collections                  garbage collections during the timed ticks
+
+The effect's life is set so that emission and deaths balance, keeping the
+live count steady at the target. The sprite engines need an OpenGL context
+for their textures, which comes from pyglet's headless (EGL) mode; without one
+only the array engine is run, with no drawing. Run it from this folder:
+
+    python bench_particles.py --out results.json
+    python bench_particles.py --engines array --counts 1000 1000000 --rates 0 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+
+import numpy as np
+import pyglet
+pyglet.options['headless'] = True
+pyglet.options['shadow_window'] = False
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.bench import add_output_argument, open_gl_context, peak_memory, write_results
+from particle00 import ParticleEmitter, PooledParticleEmitter
+from particle_arrays import ArrayParticleEmitter
+
+
+ENGINES = ("sprite", "pool", "array")
+
+
+def make_chars(rate, life, image, batch):
+    return {"img": image,
+            "color": (255, 255, 255),
+            "opacity": (51, 153),
+            "rotation": (0, 0),
+            "scale": (0.5, 1.5),
+            "speed": (50, 100),
+            "direction": (0, 360),
+            "life": (life, life),
+            "rate": rate,
+            "batch": batch}
+
+
+def build_emitter(engine, count, rate, dt, image, batch):
+    """
+    Make an emitter of the given engine, already holding count live particles
+    with ages spread evenly over their life.
+    """
+    life = count / rate if rate else 1e9
+    chars = make_chars(rate, life, image, batch)
+    capacity = count + int(rate * dt) + 16
+    if engine == "array":
+        emitter = ArrayParticleEmitter(0, 0, chars, capacity=capacity, seed=1)
+        emitter.emit(count)
+        emitter.live("age")[:] = np.linspace(0, life, count, endpoint=False)
+        return emitter
+
+    if engine == "pool":
+        emitter = PooledParticleEmitter(0, 0, chars, capacity=capacity, seed=1)
+    else:
+        emitter = ParticleEmitter(0, 0, chars, seed=1)
+    for i in range(count):
+        emitter.add_particle(0)
+    for i, particle in enumerate(emitter.particle_list):
+        particle.age = life * i / count
+    return emitter
+
+
+def delete_emitter(engine, emitter):
+    """
+    Take all the emitter's particles out of the batch, pooled ones waiting
+    to be reused included, so the next case doesn't draw and time them too.
+    """
+    if engine == "array":
+        emitter.delete()
+        return
+    for particle in emitter.particle_list + getattr(emitter, "free_list", []):
+        particle.delete()
+    emitter.particle_list = []
+
+
+def run_case(engine, count, rate, ticks, dt, image, batch):
+    emitter = build_emitter(engine, count, rate, dt, image, batch)
+    emitter.update(dt)
+
+    tick_times = []
+    gc_before = sum(stat["collections"] for stat in gc.get_stats())
+    blocks_before = sys.getallocatedblocks()
+    for i in range(ticks):
+        start = time.perf_counter()
+        emitter.update(dt)
+        tick_times.append(time.perf_counter() - start)
+    blocks_after = sys.getallocatedblocks()
+    gc_after = sum(stat["collections"] for stat in gc.get_stats())
+    live = len(emitter) if engine == "array" else len(emitter.particle_list)
+    delete_emitter(engine, emitter)
+
+    # Memory is measured in a separate pass, since tracing slows things down.
+    del emitter
+    def build_and_update():
+        emitter = build_emitter(engine, count, rate, dt, image, batch)
+        for i in range(min(ticks, 10)):
+            emitter.update(dt)
+        return emitter
+    emitter, peak = peak_memory(build_and_update)
+    delete_emitter(engine, emitter)
+
+    tick_times = np.array(tick_times) * 1000
+    return {"engine": engine,
+            "count": count,
+            "rate": rate,
+            "ticks": ticks,
+            "live_at_end": live,
+            "ms_per_tick": float(tick_times.mean()),
+            "p95_ms_per_tick": float(np.percentile(tick_times, 95)),
+            "particles_per_sec": count * ticks / (tick_times.sum() / 1000),
+            "peak_kb": peak / 1024,
+            "net_blocks_per_tick": (blocks_after - blocks_before) / ticks,
+            "gc_collections": gc_after - gc_before}
+
+
+def run(engines, counts, rates, ticks, dt=1/120, max_sprites=20000, draw=True):
+    window = None
+    if draw or any(engine != "array" for engine in engines):
+        window = open_gl_context("sprite engines skipped")
+    image = None
+    batch = None
+    if window is not None:
+        image = pyglet.image.SolidColorImagePattern((255, 255, 255, 255)).create_image(8, 8)
+        image.anchor_x = image.width // 2
+        image.anchor_y = image.height // 2
+        batch = pyglet.graphics.Batch()
+    else:
+        engines = [engine for engine in engines if engine == "array"]
+
+    results = []
+    for engine in engines:
+        for count in counts:
+            if engine != "array" and count > max_sprites:
+                continue
+            for rate in rates:
+                engine_batch = batch if draw or engine != "array" else None
+                results.append(run_case(engine, count, rate, ticks, dt, image, engine_batch))
+                print("{engine:>6} {count:>8} particles {rate:>8}/s: "
+                      "{ms_per_tick:8.3f} ms/tick".format(**results[-1]), file=sys.stderr)
+    if window is not None:
+        window.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless particle emitter benchmark.")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--counts", nargs="+", type=int, default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--rates", nargs="+", type=float, default=[0, 1000, 10000])
+    parser.add_argument("--ticks", type=int, default=120)
+    parser.add_argument("--max-sprites", type=int, default=20000,
+                        help="largest count to try with the Sprite based engines")
+    parser.add_argument("--no-draw", action="store_true",
+                        help="run the array engine without writing vertices")
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    results = run(args.engines, args.counts, args.rates, args.ticks,
+                  max_sprites=args.max_sprites, draw=not args.no_draw)
+    write_results(results, args.out)
@@ -0,0 +1,82 @@
+import os
+import sys
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.quality import Knob
+
+
+class PoolStats():
+    """
+    PoolStats keeps track of how hard a fixed-size particle pool is being
+    worked, so each effect's pool can be sized from real numbers: the most
+    particles that were ever alive at once (high_water), and how many
+    particles could not be emitted because the pool was full (exhausted).
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.high_water = 0
+        self.exhausted = 0
+        self.emitted = 0
+
+    def record_emit(self, wanted: int, emitted: int, live: int):
+        """Note the result of one emission."""
+        self.emitted += emitted
+        self.exhausted += wanted - emitted
+        if live > self.high_water:
+            self.high_water = live
+
+    def as_dict(self) -> dict:
+        return {"capacity": self.capacity,
+                "high_water": self.high_water,
+                "exhausted": self.exhausted,
+                "emitted": self.emitted}
+
+
+class EmissionRate():
+    """
+    EmissionRate turns a rate in particles per second into a whole number of
+    particles for each tick. The fraction of a particle left over from one
+    tick is carried into the next, so a rate of 6 per second really does give
+    6 particles a second at any frame rate. Bursts of extra particles can be
+    queued up, and they come out with the next tick's particles.
+    """
+    def __init__(self, rate: float = 0.0):
+        self.rate = rate
+        self.carry = 0.0
+        self.pending = 0
+
+    def burst(self, n: int):
+        """Queue up n extra particles for the next tick."""
+        self.pending += n
+
+    def take(self, dt: float) -> int:
+        """Return how many particles are due this tick."""
+        self.carry += self.rate * dt
+        n = int(self.carry)
+        self.carry -= n
+        n += self.pending
+        self.pending = 0
+        return n
+
+
+def emission_knobs(emitter) -> list:
+    """
+    The Knobs an emitter can offer a QualityController: first how long new
+    particles live (down to half as long), then how many are emitted (down
+    to a quarter). Particles already out are left as they are.
+    """
+    rate = emitter.emission.rate
+    life_min, life_max = emitter.life_min, emitter.life_max
+
+    def set_life(level):
+        emitter.life_min = life_min * level
+        emitter.life_max = life_max * level
+
+    def set_rate(level):
+        emitter.emission.rate = rate * level
+
+    return [Knob("life", set_life, floor=0.5, priority=1),
+            Knob("rate", set_rate, floor=0.25, priority=2)]
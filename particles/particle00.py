@@ -1,7 +1,16 @@
+import os
+import sys
+
 import pyglet
 import math
 import random
 
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from emission import EmissionRate, PoolStats, emission_knobs
+
 
 class Particle(pyglet.sprite.Sprite):
     """
@@ -24,6 +33,25 @@ class Particle(pyglet.sprite.Sprite):
                  life=1.0,
                 ):
         super(Particle, self).__init__(img=image, x=loc_x, y=loc_y, batch=my_batch)
+        self.reset(loc_x, loc_y, color, opacity, rotation, scale, speed, direction, life)
+
+    def reset(self,
+              loc_x,
+              loc_y,
+              color=(255, 255, 255),
+              opacity=255,
+              rotation=0,
+              scale=1.0,
+              speed=50,
+              direction=0,
+              life=1.0,
+             ):
+        """
+        Give the particle a fresh set of characteristics. This is how a new
+        particle gets set up, and also how a pooled particle is brought back
+        to life without building a new sprite.
+        """
+        self.position = (loc_x, loc_y)
         self.color = color
         self.opacity = opacity
         self.rotation = rotation
@@ -68,8 +96,34 @@ class Particle(pyglet.sprite.Sprite):
         self.age += dt
         if self.age > self.life:
             self.dead = True
-            self.batch = None
-            del self
+            self.retire()
+
+
+    def animate(self, tweener, on_done=None):
+        """
+        Hand the particle's movement to a Tweener, which moves it along with
+        every other tween at once, instead of calling update. It travels in a
+        straight line for its whole life, just as update_loc moves it, and
+        on_done is called with the particles that have reached the end.
+        """
+        tweener.tween(self, 'x', self.x, self.x + self.dx * self.life, self.life)
+        tweener.tween(self, 'y', self.y, self.y + self.dy * self.life, self.life, on_done=on_done)
+
+
+    def retire(self):
+        """
+        Take a dead particle off the screen by removing it from its batch.
+        """
+        self.batch = None
+
+
+class PooledParticle(Particle):
+    """
+    A Particle that belongs to a PooledParticleEmitter. When it dies it just
+    hides itself and stays in its batch, ready to be reset and reused.
+    """
+    def retire(self):
+        self.visible = False
 
 
 class ParticleEmitter():
@@ -79,11 +133,23 @@ class ParticleEmitter():
     the characteristics of the Emitter's particles. Some of these can be
     ranges of values, so the particles have variation. Emitters keep a list of
     active particles, and remove 'dead' ones from the list.
+
+    The dict may also have a "rate" in particles per second, in which case
+    the Emitter emits on its own during update, and burst() adds extra
+    particles on top. Without a rate, add_particle can be scheduled on the
+    clock as before. Each Emitter has its own random number generator, so
+    giving it a seed makes its particles the same every run.
+
+    Given a Tweener, the Emitter hands each new particle's movement to it,
+    and the particles are no longer updated one by one. Whoever owns the
+    Tweener updates it, and it tells the Emitter which particles are done.
     """
     def __init__(self,
                  x: int,
                  y: int,
-                 particle_chars: dict):
+                 particle_chars: dict,
+                 seed=None,
+                 tweener=None):
         self.x = x
         self.y = y
         self.image = particle_chars["img"]
@@ -95,9 +161,27 @@ class ParticleEmitter():
         self.direction_min, self.direction_max = particle_chars["direction"]
         self.life_min, self.life_max = particle_chars["life"]
         self.batch = particle_chars["batch"]
+        self.emission = EmissionRate(particle_chars.get("rate", 0.0))
+        self.random = random.Random(seed)
+        self.tweener = tweener
         self.particle_list = []
 
 
+    def random_chars(self) -> dict:
+        """
+        Pick the characteristics for one new particle from the Emitter's ranges.
+        """
+        rand = self.random
+        return {"color": self.color,
+                "opacity": rand.randint(self.opacity_min, self.opacity_max),
+                "rotation": rand.randint(self.rotation_min, self.rotation_max),
+                "scale": rand.uniform(self.scale_min, self.scale_max),
+                "speed": rand.randint(self.speed_min, self.speed_max),
+                "direction": rand.randint(self.direction_min, self.direction_max),
+                "life": rand.uniform(self.life_min, self.life_max),
+               }
+
+
     def add_particle(self, dt):
         """
         Instantiates a new particle and adds it to the Emitter's particle list.
@@ -106,47 +190,189 @@ class ParticleEmitter():
                                 loc_x=self.x,
                                 loc_y=self.y,
                                 my_batch=self.batch,
-                                color=self.color,
-                                opacity=random.randint(self.opacity_min, self.opacity_max),
-                                rotation=random.randint(self.rotation_min, self.rotation_max),
-                                scale=(random.randint(self.scale_min * 100, self.scale_max * 100))/100.0,
-                                speed=random.randint(self.speed_min, self.speed_max),
-                                direction=random.randint(self.direction_min, self.direction_max),
-                                life=(random.randint(self.life_min * 100, self.life_max * 100))/100.0,
+                                **self.random_chars()
                                 )
+        if self.tweener is not None:
+            new_particle.animate(self.tweener, self.retire_particles)
         self.particle_list.append(new_particle)
 
 
+    def burst(self, n: int):
+        """Emit n extra particles on the next update."""
+        self.emission.burst(n)
+
+
     def update(self, dt):
         """
         Loops throug the Emitter's particle list, updating 'non-dead' particles,
-        and removing 'dead' particles.
+        and removing 'dead' particles. Then emits however many particles are
+        due this tick.
+        """
+        self.update_particles(dt)
+        for i in range(self.emission.take(dt)):
+            self.add_particle(dt)
+
+
+    def update_particles(self, dt):
+        """Update the live particles and drop the dead ones."""
+        if self.tweener is None:
+            remove_dead(self.particle_list, dt)
+
+
+    def retire_particles(self, particles):
+        """
+        Called by the Tweener with the particles that have finished. They are
+        taken off the screen, and all dropped from the list in one pass.
+        Returns them.
         """
-        for particle in self.particle_list:
-            particle.update(dt)
-            if particle.dead:
-                self.particle_list.remove(particle)
+        for particle in particles:
+            particle.dead = True
+            particle.retire()
+        self.particle_list = [particle for particle in self.particle_list if not particle.dead]
+        return particles
+
+
+    def quality_knobs(self) -> list:
+        """What a QualityController may turn down: see emission_knobs."""
+        return emission_knobs(self)
+
+
+def remove_dead(particle_list, dt):
+    """
+    Update every particle in the list and take out the ones that die. A dead
+    particle is swapped with the last one in the list and popped off the end,
+    which costs the same however long the list is. The particle that gets
+    swapped in hasn't been updated yet, so it gets looked at next.
+    Returns the dead particles.
+    """
+    dead = []
+    i = 0
+    while i < len(particle_list):
+        particle = particle_list[i]
+        particle.update(dt)
+        if particle.dead:
+            dead.append(particle)
+            last = particle_list.pop()
+            if i < len(particle_list):
+                particle_list[i] = last
+        else:
+            i += 1
+    return dead
+
+
+class PooledParticleEmitter(ParticleEmitter):
+    """
+    PooledParticleEmitter works like ParticleEmitter, except that it builds
+    all of its particle sprites up front and reuses them. New particles are
+    taken from a free list and dead ones go back onto it, so a steadily
+    emitting effect doesn't create and throw away a sprite every time. When
+    every particle in the pool is alive, new emissions are skipped and counted
+    in the pool's stats.
+    """
+    def __init__(self,
+                 x: int,
+                 y: int,
+                 particle_chars: dict,
+                 capacity: int = 256,
+                 seed=None,
+                 tweener=None):
+        super(PooledParticleEmitter, self).__init__(x, y, particle_chars, seed, tweener)
+        self.stats = PoolStats(capacity)
+        self.free_list = []
+        for i in range(capacity):
+            particle = PooledParticle(image=self.image,
+                                      loc_x=self.x,
+                                      loc_y=self.y,
+                                      my_batch=self.batch)
+            particle.visible = False
+            self.free_list.append(particle)
+
+
+    def add_particle(self, dt):
+        """
+        Revives a particle from the free list, if there is one left.
+        """
+        if not self.free_list:
+            self.stats.record_emit(1, 0, len(self.particle_list))
+            return
+        particle = self.free_list.pop()
+        particle.reset(loc_x=self.x, loc_y=self.y, **self.random_chars())
+        particle.visible = True
+        if self.tweener is not None:
+            particle.animate(self.tweener, self.retire_particles)
+        self.particle_list.append(particle)
+        self.stats.record_emit(1, 1, len(self.particle_list))
+
+
+    def update_particles(self, dt):
+        """
+        Updates the live particles, and puts the dead ones back on the free list.
+        """
+        if self.tweener is None:
+            self.free_list.extend(remove_dead(self.particle_list, dt))
+
+
+    def retire_particles(self, particles):
+        self.free_list.extend(super(PooledParticleEmitter, self).retire_particles(particles))
 
 
 if __name__ == "__main__":
-    window = pyglet.window.Window()
-    fps_display = pyglet.window.FPSDisplay(window)
+    import argparse
 
-    # import some graphics to use for particles.
-    pyglet.resource.path = ['./img']
-    pyglet.resource.reindex()
+    parser = argparse.ArgumentParser(description="Particle emitter demo.")
+    parser.add_argument("--engine", choices=("sprite", "pool", "tween", "array", "system"),
+                        default="sprite",
+                        help="'sprite' uses one Sprite per particle, 'pool' reuses "
+                             "a fixed pool of Sprites, 'tween' moves the Sprites with a "
+                             "shared Tweener, 'array' uses the "
+                             "NumPy-backed ArrayParticleEmitter, 'system' runs "
+                             "array emitters together in a ParticleSystem.")
+    parser.add_argument("--seed", type=int,
+                        help="seed the emitters, so the particles come out the same every run")
+    from common.profiler import FrameProfiler
+    from common.quality import QualityController
+    from common.scheduler import FrameScheduler
+    FrameProfiler.add_arguments(parser)
+    QualityController.add_arguments(parser)
+    FrameScheduler.add_arguments(parser)
+    args = parser.parse_args()
+    quality = QualityController.from_args(args)
+    profiler = FrameProfiler.from_args(args, enabled=quality is not None)
+    scheduler = FrameScheduler.from_args(args, profiler)
+    # Without --seed, the emitters' seeds come from random, so seeding random
+    # (as common.replay does) is enough to get the same particles again.
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
 
-    particle_image = pyglet.resource.image('particle.gif')
-    particle_image.anchor_x = particle_image.width / 2
-    particle_image.anchor_y = particle_image.height / 2
+    if args.engine == "array":
+        from particle_arrays import ArrayParticleEmitter as Emitter
+    elif args.engine == "pool":
+        Emitter = PooledParticleEmitter
+    elif args.engine == "system":
+        from particle_system import ParticleSystem
+    elif args.engine == "tween":
+        from functools import partial
+        from common.tween import Tweener
+        tweener = Tweener()
+        Emitter = partial(ParticleEmitter, tweener=tweener)
+    else:
+        Emitter = ParticleEmitter
+
+    window = pyglet.window.Window()
+    fps_display = pyglet.window.FPSDisplay(window)
+    if args.engine == "array":
+        # So that, once the quality is turned down, particles that have
+        # drifted out of the window aren't drawn.
+        from functools import partial
+        Emitter = partial(Emitter, bounds=(0, 0, window.width, window.height))
 
-    particle_image2 = pyglet.resource.image('particle2.gif')
-    particle_image2.anchor_x = particle_image2.width / 2
-    particle_image2.anchor_y = particle_image2.height / 2
+    # import some graphics to use for particles. They're small, so they all
+    # get packed into one texture atlas.
+    from common.resources import get_cache
+    resources = get_cache('./img')
 
-    particle_image3 = pyglet.resource.image('particle5.png')
-    particle_image3.anchor_x = particle_image2.width / 2
-    particle_image3.anchor_y = particle_image2.height / 2
+    particle_image = resources.image('particle.gif', centered=True)
+    particle_image2 = resources.image('particle2.gif', centered=True)
+    particle_image3 = resources.image('particle5.png', centered=True)
 
 
     def get_random_color():
@@ -158,6 +384,12 @@ if __name__ == "__main__":
     # create a graphics batch for pyglet to use in drawing the particles.
     my_batch = pyglet.graphics.Batch()
 
+    # With the 'system' engine, one ParticleSystem runs every emitter.
+    system = None
+    if args.engine == "system":
+        system = ParticleSystem(my_batch, bounds=(0, 0, window.width, window.height))
+        Emitter = system.add_emitter
+
     """
     Make a pair of dicts describing two very different types of Particles,
     and instantiate a pair of ParticleEmitters to emit them
@@ -170,9 +402,10 @@ if __name__ == "__main__":
                         "speed": (50, 100),
                         "direction": (80, 140),
                         "life": (20.0, 20.0),
+                        "rate": 60,
                         "batch": my_batch
     }
-    part_emit = ParticleEmitter(window.width/2, window.height/6, particle_dict)
+    part_emit = Emitter(window.width/2, window.height/6, particle_dict, seed=seed)
 
     particle_dict2 = {  "img": particle_image2,
                         "color": (255, 255, 255),
@@ -182,22 +415,48 @@ if __name__ == "__main__":
                         "speed": (300, 300),
                         "direction": (0, 0),
                         "life": (4.0, 4.0),
+                        "rate": 6,
                         "batch": my_batch
     }
-    part_emit2 = ParticleEmitter(window.width/6, window.height/2, particle_dict2)
+    part_emit2 = Emitter(window.width/6, window.height/2, particle_dict2, seed=seed + 1)
+
+    # Time the hot paths inside each emitter's update too.
+    for emitter in (part_emit, part_emit2):
+        if hasattr(emitter, "compact"):
+            profiler.wrap_method(emitter, "emit")
+            profiler.wrap_method(emitter, "compact", "cull")
+            profiler.wrap_method(emitter, "sync")
+        else:
+            profiler.wrap_method(emitter, "add_particle", "emit")
+            profiler.wrap_method(emitter, "update_particles", "particles")
+
+    # With --target-ms, the emitters are turned down when frames run long.
+    if quality is not None:
+        quality.add(part_emit, "emitter1")
+        quality.add(part_emit2, "emitter2")
+        profiler.frame_listeners.append(quality.frame)
 
-    @window.event
+    @profiler.event(window)
     def on_draw():
         window.clear()
-        my_batch.draw()
-        fps_display.draw()
+        scheduler.draw()
 
 
-    def update(dt):
-        part_emit.update(dt)
-        part_emit2.update(dt)
+    # Everything runs from the scheduler's one tick. The second emitter's
+    # few big particles are the first thing put off when a tick runs long.
+    if system is not None:
+        scheduler.add(system.update, "simulate", name="system")
+    else:
+        if args.engine == "tween":
+            scheduler.add(tweener.update, "simulate", priority=1, name="tween")
+        scheduler.add(part_emit.update, "emit", name="emitter1")
+        scheduler.add(part_emit2.update, "emit", priority=-1, name="emitter2")
+    scheduler.add(my_batch.draw, "draw", name="draw")
+    scheduler.add(fps_display.draw, "draw", name="fps")
 
-    pyglet.clock.schedule_interval(part_emit.add_particle, 1/60)
-    pyglet.clock.schedule_interval(part_emit2.add_particle, 1/6)
-    pyglet.clock.schedule_interval(update, 1/120)
+    scheduler.start(120)
     pyglet.app.run()
+    profiler.close()
+    scheduler.close()
+    if quality is not None:
+        quality.close()
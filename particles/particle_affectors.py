@@ -0,0 +1,123 @@
+import numpy as np
+
+
+class Affector():
+    """
+    Affectors change particles over their lifetime. Each one works on all of
+    an ArrayParticleEmitter's live particles at once, as a few array
+    operations, so adding one to an effect adds a fixed handful of steps per
+    tick no matter how many particles there are.
+
+    There are two kinds. 'motion' affectors change the particles' simulation
+    state (their velocities, say) before the particles are moved each tick.
+    'look' affectors change how the particles are drawn, based on how far
+    through its life each particle is (0.0 when born, 1.0 when it dies), and
+    never touch the particles' own characteristics.
+    """
+    stage = "motion"
+
+    def apply(self, emitter, dt):
+        """
+        Change the emitter's live particles for a tick of length dt. Does
+        nothing here, so a 'look' affector needn't override it.
+        """
+
+    def apply_look(self, look, t):
+        """
+        Change the look dict, which has "scale", "opacity" and "color" entries,
+        for particles at normalized ages t. Does nothing here, so a 'motion'
+        affector needn't override it.
+        """
+
+
+class Gravity(Affector):
+    """Constant acceleration, in pixels per second per second."""
+    def __init__(self, gx, gy):
+        self.gx = gx
+        self.gy = gy
+
+    def apply(self, emitter, dt):
+        if self.gx:
+            emitter.live("dx")[:] += self.gx * dt
+        if self.gy:
+            emitter.live("dy")[:] += self.gy * dt
+
+
+class LinearDrag(Affector):
+    """
+    Slows particles down in proportion to their speed. A drag of 1.0 loses
+    about 63% of a particle's speed every second, whatever the frame rate.
+    """
+    def __init__(self, drag):
+        self.drag = drag
+
+    def apply(self, emitter, dt):
+        factor = np.float32(np.exp(-self.drag * dt))
+        emitter.live("dx")[:] *= factor
+        emitter.live("dy")[:] *= factor
+
+
+class Curve(Affector):
+    """
+    A piecewise-linear curve over normalized age, given as (t, value) stops
+    sorted by t. Particles between two stops get a value blended between them.
+    """
+    stage = "look"
+
+    def __init__(self, stops):
+        self.times = np.array([stop[0] for stop in stops], dtype=np.float32)
+        self.values = np.array([stop[1] for stop in stops], dtype=np.float32)
+
+    def evaluate(self, t):
+        return np.interp(t, self.times, self.values).astype(np.float32)
+
+
+class ScaleCurve(Curve):
+    """Multiplies each particle's scale by the curve's value."""
+    def apply_look(self, look, t):
+        look["scale"] = look["scale"] * self.evaluate(t)
+
+
+class OpacityFade(Curve):
+    """Multiplies each particle's opacity by the curve's value (0.0 to 1.0)."""
+    def apply_look(self, look, t):
+        look["opacity"] = look["opacity"] * self.evaluate(t)
+
+
+class ColorGradient(Curve):
+    """
+    Replaces the particles' color with one blended between RGB stops, like
+    ((0.0, (255, 255, 0)), (1.0, (255, 0, 0))) for yellow fading to red.
+    """
+    def evaluate(self, t):
+        color = np.empty((len(t), 3), dtype=np.float32)
+        for channel in range(3):
+            color[:, channel] = np.interp(t, self.times, self.values[:, channel])
+        return color
+
+    def apply_look(self, look, t):
+        look["color"] = self.evaluate(t)
+
+
+# The particle_chars keys that set up affectors, in the order they are run.
+AFFECTOR_KEYS = (
+    ("gravity", lambda value: Gravity(*value)),
+    ("drag", LinearDrag),
+    ("scale_over_life", ScaleCurve),
+    ("opacity_over_life", OpacityFade),
+    ("color_over_life", ColorGradient),
+)
+
+
+def affectors_from_chars(particle_chars: dict) -> list:
+    """
+    Build the affectors asked for in a particle_chars dict. For example:
+        "gravity": (0, -98),
+        "drag": 0.5,
+        "scale_over_life": ((0.0, 1.0), (1.0, 2.5)),
+        "opacity_over_life": ((0.0, 1.0), (0.7, 1.0), (1.0, 0.0)),
+        "color_over_life": ((0.0, (255, 255, 0)), (1.0, (255, 0, 0))),
+    """
+    return [make(particle_chars[key])
+            for key, make in AFFECTOR_KEYS
+            if key in particle_chars]
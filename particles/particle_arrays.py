@@ -0,0 +1,318 @@
+import math
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.quads import QuadBatch
+from common.quality import Knob
+from emission import EmissionRate, PoolStats, emission_knobs
+from particle_affectors import affectors_from_chars
+
+
+class ArrayParticleEmitter():
+    """
+    ArrayParticleEmitter is an alternative engine to ParticleEmitter, meant for
+    effects with many thousands of particles. Instead of one Sprite per
+    particle, it keeps every particle characteristic in its own NumPy array
+    (struct-of-arrays), moves all the particles with a handful of array
+    operations per tick, and writes the result into a single shared vertex
+    list. It takes the same particle_chars dict as ParticleEmitter, including
+    the optional "rate" in particles per second. Each tick's worth of new
+    particles is drawn in one go from the Emitter's own seeded generator, so
+    the same seed gives the same effect every run.
+
+    Effects beyond straight-line motion come from its list of affectors
+    (gravity, drag, and scale, opacity and color over the particles' lives),
+    which can be set up from particle_chars or added to the list directly.
+    See particle_affectors.py.
+
+    Live particles are always packed into the first 'count' slots of each
+    array. Dead ones are swapped out by compacting the arrays, so no Python
+    loop ever touches individual particles, and the freed slots (and their
+    vertices) are simply reused by the next emission.
+
+    By default the arrays grow when more room is needed. With fixed_capacity
+    set, capacity is a hard limit: the memory is all allocated up front, and
+    emissions that don't fit are skipped and counted in the pool's stats.
+
+    With skip_hidden set, only the particles that can be seen are written to
+    the vertex list: ones faded all the way out are left out, and so are ones
+    too far outside bounds (left, bottom, right, top), if it is given, to
+    reach into it. They stay alive and keep moving, they just aren't drawn.
+    Picking out the visible ones costs a copy of every array, which is only
+    worth it once a good share of them are hidden, so it is off to start with
+    and is one of the emitter's quality knobs.
+    """
+    FIELDS = ("x", "y", "dx", "dy", "age", "life", "scale", "opacity", "rotation")
+
+    def __init__(self,
+                 x: int,
+                 y: int,
+                 particle_chars: dict,
+                 capacity: int = 1024,
+                 seed=None,
+                 fixed_capacity: bool = False,
+                 bounds=None):
+        self.x = x
+        self.y = y
+        self.image = particle_chars["img"]
+        self.color = particle_chars["color"]
+        self.opacity_min, self.opacity_max = particle_chars["opacity"]
+        self.rotation_min, self.rotation_max = particle_chars["rotation"]
+        self.scale_min, self.scale_max = particle_chars["scale"]
+        self.speed_min, self.speed_max = particle_chars["speed"]
+        self.direction_min, self.direction_max = particle_chars["direction"]
+        self.life_min, self.life_max = particle_chars["life"]
+        self.batch = particle_chars["batch"]
+        self.emission = EmissionRate(particle_chars.get("rate", 0.0))
+        self.affectors = affectors_from_chars(particle_chars)
+
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.capacity = 0
+        self.data = {}
+        self.grow(capacity)
+        self.fixed_capacity = fixed_capacity
+        self.stats = PoolStats(self.capacity)
+        self.bounds = bounds
+        self.skip_hidden = False
+
+        # With no batch there is nothing to draw, which is handy for running
+        # the simulation without a window.
+        self.quads = None
+        if self.batch is not None:
+            self.quads = QuadBatch(self.image, self.batch, self.capacity)
+
+
+    def __len__(self):
+        return self.count
+
+
+    def grow(self, capacity):
+        """
+        Make sure every particle array can hold at least capacity particles,
+        keeping the live ones.
+        """
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        for name in self.FIELDS:
+            new_array = np.zeros(capacity, dtype=np.float32)
+            if name in self.data:
+                new_array[:self.count] = self.data[name][:self.count]
+            self.data[name] = new_array
+        self.capacity = capacity
+
+
+    def adopt(self, data):
+        """
+        Switch to keeping particles in the given arrays (one per name in
+        FIELDS, all the same length), bringing the live particles along.
+        A ParticleSystem uses this to give each of its emitters a slice of
+        one shared buffer.
+        """
+        for name in self.FIELDS:
+            if name in self.data:
+                data[name][:self.count] = self.data[name][:self.count]
+        self.data = data
+        self.capacity = len(data["x"])
+        self.stats.capacity = self.capacity
+
+
+    def live(self, name):
+        """Return a view of one characteristic for the live particles only."""
+        return self.data[name][:self.count]
+
+
+    def emit(self, n, spread=0.0):
+        """
+        Create n new particles at the Emitter's location, drawing all their
+        random characteristics in one go. Returns how many were created, which
+        is less than n if a fixed-capacity pool ran out of room.
+
+        If spread is given, each particle is aged by a random part of it and
+        moved along accordingly, as if the particles had come out one at a time
+        during the last spread seconds instead of all at once.
+        """
+        wanted = n
+        if self.fixed_capacity:
+            n = min(n, self.capacity - self.count)
+        if n <= 0:
+            self.stats.record_emit(wanted, 0, self.count)
+            return 0
+        self.grow(self.count + n)
+        new = slice(self.count, self.count + n)
+        data = self.data
+        rng = self.rng
+
+        speed = rng.uniform(self.speed_min, self.speed_max, n)
+        rads = np.radians(rng.uniform(self.direction_min, self.direction_max, n))
+        data["dx"][new] = np.cos(rads) * speed
+        data["dy"][new] = np.sin(rads) * speed
+        if spread:
+            age = rng.uniform(0.0, spread, n)
+            data["age"][new] = age
+            data["x"][new] = self.x + data["dx"][new] * age
+            data["y"][new] = self.y + data["dy"][new] * age
+        else:
+            data["age"][new] = 0.0
+            data["x"][new] = self.x
+            data["y"][new] = self.y
+        data["life"][new] = rng.uniform(self.life_min, self.life_max, n)
+        data["scale"][new] = rng.uniform(self.scale_min, self.scale_max, n)
+        data["opacity"][new] = rng.uniform(self.opacity_min, self.opacity_max, n)
+        data["rotation"][new] = rng.uniform(self.rotation_min, self.rotation_max, n)
+        self.count += n
+        self.stats.capacity = self.capacity
+        self.stats.record_emit(wanted, n, self.count)
+        return n
+
+
+    def add_particle(self, dt):
+        """
+        Adds a single particle, with the same signature as
+        ParticleEmitter.add_particle so it can be scheduled the same way.
+        """
+        self.emit(1)
+
+
+    def burst(self, n: int):
+        """Emit n extra particles on the next update."""
+        self.emission.burst(n)
+
+
+    def update(self, dt):
+        """
+        Moves and ages every live particle at once, drops the ones that have
+        outlived their life, emits this tick's new particles, and sends the
+        lot off to be drawn.
+        """
+        self.apply_motion(dt)
+        n = self.count
+        data = self.data
+        data["x"][:n] += data["dx"][:n] * dt
+        data["y"][:n] += data["dy"][:n] * dt
+        age = data["age"][:n]
+        age += dt
+        self.finish_tick(age <= data["life"][:n], dt)
+
+
+    def apply_motion(self, dt):
+        """Run the 'motion' affectors over the live particles."""
+        for affector in self.affectors:
+            if affector.stage == "motion":
+                affector.apply(self, dt)
+
+
+    def finish_tick(self, alive, dt):
+        """
+        The rest of a tick, once the particles have moved: drop the ones not
+        flagged in the alive mask, emit the new ones and draw.
+        """
+        if not alive.all():
+            self.compact(alive)
+        self.emit(self.emission.take(dt), spread=dt)
+        self.sync()
+
+
+    def compact(self, alive):
+        """
+        Squeeze the dead particles out of the live range. The particles at the
+        end of the range that are still alive get moved down into the holes
+        left by the dead ones (swap-remove, for all of them at once), so the
+        cost follows the number of deaths rather than the number of particles.
+        """
+        new_count = int(np.count_nonzero(alive))
+        holes = np.flatnonzero(~alive[:new_count])
+        if len(holes):
+            fillers = np.flatnonzero(alive[new_count:]) + new_count
+            for array in self.data.values():
+                array[holes] = array[fillers]
+        self.count = new_count
+
+
+    def look(self):
+        """
+        Work out how the live particles should be drawn: their scale, opacity
+        and color after the 'look' affectors have had their say.
+        """
+        look = {"scale": self.live("scale"),
+                "opacity": self.live("opacity"),
+                "color": self.color}
+        look_affectors = [a for a in self.affectors if a.stage == "look"]
+        if look_affectors:
+            t = self.live("age") / self.live("life")
+            for affector in look_affectors:
+                affector.apply_look(look, t)
+        return look
+
+
+    def sync(self):
+        """
+        Write the live particles into the shared vertex list. With
+        skip_hidden, only the visible ones are written, packed together at
+        the front; the slots left over are collapsed, so they aren't drawn.
+        """
+        if self.quads is None:
+            return
+        x = self.live("x")
+        y = self.live("y")
+        rotation = None
+        if self.rotation_min != 0 or self.rotation_max != 0:
+            rotation = self.live("rotation")
+        look = self.look()
+        scale = look["scale"]
+        color = np.clip(look["color"], 0, 255)
+        opacity = np.clip(look["opacity"], 0, 255)
+        if self.skip_hidden:
+            shown = self.shown(x, y, scale, opacity)
+            if not shown.all():
+                x = x[shown]
+                y = y[shown]
+                scale = scale[shown]
+                opacity = opacity[shown]
+                if rotation is not None:
+                    rotation = rotation[shown]
+                if color.ndim == 2:
+                    color = color[shown]
+        self.quads.update(x, y, scale, rotation, color, opacity)
+
+
+    def shown(self, x, y, scale, opacity):
+        """
+        Which of the live particles can be seen: the ones whose opacity
+        doesn't round down to 0, and with bounds, that come close enough to
+        them for some part of their quad to be inside, however it's rotated.
+        """
+        shown = opacity >= 1
+        if self.bounds is not None:
+            left, bottom, right, top = self.bounds
+            reach = math.hypot(self.image.width, self.image.height) * scale
+            shown &= (x + reach >= left) & (x - reach <= right)
+            shown &= (y + reach >= bottom) & (y - reach <= top)
+        return shown
+
+
+    def quality_knobs(self) -> list:
+        """
+        What a QualityController may turn down: first skip_hidden, which
+        changes nothing that can be seen, then the ones emission.emission_knobs
+        gives every emitter.
+        """
+        def set_skip_hidden(level):
+            self.skip_hidden = level < 1.0
+
+        return [Knob("skip_hidden", set_skip_hidden, floor=0.75, priority=0)] + emission_knobs(self)
+
+
+    def delete(self):
+        """Remove all particles and their vertex list from the batch."""
+        self.count = 0
+        if self.quads is not None:
+            self.quads.delete()
+            self.quads = None
@@ -0,0 +1,195 @@
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from particle_arrays import ArrayParticleEmitter
+
+
+FIELD_COUNT = len(ArrayParticleEmitter.FIELDS)
+
+
+def shared_arrays(buffer, capacity):
+    """
+    Lay the particle arrays out over a block of shared memory: one float32
+    array per name in FIELDS, one after the other, then the alive flags.
+    """
+    data = {}
+    for i, name in enumerate(ArrayParticleEmitter.FIELDS):
+        data[name] = np.ndarray(capacity, dtype=np.float32, buffer=buffer, offset=i * capacity * 4)
+    alive = np.ndarray(capacity, dtype=np.bool_, buffer=buffer, offset=FIELD_COUNT * capacity * 4)
+    return data, alive
+
+
+class ShardView():
+    """
+    Stands in for an emitter when an affector runs in a worker process: its
+    live() gives the worker's slice of the particles instead of all of them.
+    """
+    def __init__(self, data, lo, hi):
+        self.data = data
+        self.lo = lo
+        self.hi = hi
+
+    def live(self, name):
+        return self.data[name][self.lo:self.hi]
+
+
+# Each worker process keeps the shared memory it has attached to, so it only
+# has to attach again when the emitter grows into a new block.
+_attached = {}
+
+
+def advance_shard(name, capacity, lo, hi, dt, affectors):
+    """
+    Move and age particles lo to hi, and flag which are still alive. This is
+    the same arithmetic, in the same order, as ArrayParticleEmitter.update, so
+    the results match it bit for bit.
+    """
+    if name not in _attached:
+        for block, data, alive in _attached.values():
+            block.close()
+        _attached.clear()
+        block = shared_memory.SharedMemory(name=name)
+        _attached[name] = (block,) + shared_arrays(block.buf, capacity)
+    block, data, alive = _attached[name]
+
+    view = ShardView(data, lo, hi)
+    for affector in affectors:
+        affector.apply(view, dt)
+    data["x"][lo:hi] += data["dx"][lo:hi] * dt
+    data["y"][lo:hi] += data["dy"][lo:hi] * dt
+    age = data["age"][lo:hi]
+    age += dt
+    np.less_equal(age, data["life"][lo:hi], out=alive[lo:hi])
+
+
+class ParallelParticleEmitter(ArrayParticleEmitter):
+    """
+    ParallelParticleEmitter is an ArrayParticleEmitter for very large effects,
+    which splits the work of each tick across a pool of worker processes. Its
+    particle arrays live in shared memory, so the workers work on them in
+    place with nothing copied back and forth. Each worker moves and ages its
+    own shard of the live particles (running the 'motion' affectors on it
+    too), and then the main process drops the dead, emits and draws, exactly
+    as the single-process emitter does. Given the same seed, the particles
+    come out identical to an ArrayParticleEmitter's.
+
+    Call close() when done with it, to stop the workers and free the memory.
+    If it is given arrays of its own to adopt, which aren't in shared memory,
+    it stops its workers and carries on as an ordinary ArrayParticleEmitter.
+    """
+    def __init__(self,
+                 x: int,
+                 y: int,
+                 particle_chars: dict,
+                 capacity: int = 1024,
+                 seed=None,
+                 fixed_capacity: bool = False,
+                 workers: int = None,
+                 min_shard: int = 16384):
+        """
+        workers is the number of processes (the number of CPUs by default).
+        Shards are kept at least min_shard particles long, since a tiny shard
+        costs more to hand out than to just do.
+        """
+        self.block = None
+        self.alive = None
+        self.workers = workers or os.cpu_count()
+        self.min_shard = min_shard
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        super(ParallelParticleEmitter, self).__init__(x, y, particle_chars, max(capacity, 1),
+                                                      seed, fixed_capacity)
+        atexit.register(self.close)
+
+
+    def grow(self, capacity):
+        """
+        Make room for at least capacity particles, in a new block of shared
+        memory. The workers notice the new block's name and attach to it.
+        """
+        if self.pool is None:
+            return super(ParallelParticleEmitter, self).grow(capacity)
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        block = shared_memory.SharedMemory(create=True, size=capacity * (FIELD_COUNT * 4 + 1))
+        data, alive = shared_arrays(block.buf, capacity)
+        for name in self.FIELDS:
+            if name in self.data:
+                data[name][:self.count] = self.data[name][:self.count]
+        self.release_block()
+        self.block = block
+        self.data = data
+        self.alive = alive
+        self.capacity = capacity
+
+
+    def adopt(self, data):
+        """
+        Switch to keeping particles in the given arrays, as
+        ArrayParticleEmitter.adopt does. The workers can't reach arrays
+        outside shared memory, so they are stopped and the shared block is
+        freed, and from then on every tick runs in this process.
+        """
+        super(ParallelParticleEmitter, self).adopt(data)
+        self.stop_workers()
+        self.alive = None
+        block, self.block = self.block, None
+        if block is not None:
+            block.close()
+            block.unlink()
+
+
+    def shards(self):
+        """Split the live particles into (lo, hi) ranges, one per worker."""
+        n = self.count
+        shard_count = max(1, min(self.workers, n // self.min_shard))
+        edges = np.linspace(0, n, shard_count + 1).astype(int)
+        return list(zip(edges[:-1], edges[1:]))
+
+
+    def update(self, dt):
+        """
+        Has the workers move and age their shards of the particles, waits for
+        them all, and then finishes the tick here.
+        """
+        if self.pool is None:
+            return super(ParallelParticleEmitter, self).update(dt)
+        affectors = [a for a in self.affectors if a.stage == "motion"]
+        jobs = [self.pool.submit(advance_shard, self.block.name, self.capacity, lo, hi, dt, affectors)
+                for lo, hi in self.shards()]
+        for job in jobs:
+            job.result()
+        self.finish_tick(self.alive[:self.count], dt)
+
+
+    def release_block(self):
+        if self.block is not None:
+            self.data = {}
+            self.alive = None
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+
+
+    def stop_workers(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        atexit.unregister(self.close)
+
+
+    def close(self):
+        """Stop the worker processes and free the shared memory."""
+        self.stop_workers()
+        self.release_block()
+        self.count = 0
+        self.capacity = 0
+
+
+    def delete(self):
+        super(ParallelParticleEmitter, self).delete()
+        self.close()
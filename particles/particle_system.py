@@ -0,0 +1,158 @@
+import time
+
+import numpy as np
+
+from particle_arrays import ArrayParticleEmitter
+
+
+class ParticleSystem():
+    """
+    ParticleSystem runs many ArrayParticleEmitters as one simulation. All the
+    emitters' particles live in one shared set of arrays: each emitter is given
+    its own fixed-size region of them, and keeps working on that region just
+    as it would on its own arrays. Every tick the whole buffer is moved and
+    aged in a single pass, and particles that have left the bounds are culled
+    along with the ones that have died. Then each emitter tidies up its own
+    region, emits, and draws.
+
+    Emitters can be added and removed at any time. A removed emitter's region
+    goes back on a free list for the next one, so a game can keep making
+    short-lived explosions without the buffer creeping ever larger.
+    """
+    def __init__(self, batch=None, bounds=None, capacity: int = 4096):
+        """
+        bounds, if given, is (left, bottom, right, top). Particles outside it
+        are removed.
+        """
+        self.batch = batch
+        self.bounds = bounds
+        self.emitters = []
+        self.regions = {}       # emitter -> (start, size) of its region of the buffer
+        self.free_regions = []  # (start, size) of unused regions
+        self.end = 0            # everything past here is unused
+        self.capacity = 0
+        self.data = {}
+        self.timings = {}       # emitter -> seconds spent on its part of the last tick
+        self.shared_time = 0.0  # seconds spent on the shared pass last tick
+        self.grow(capacity)
+
+
+    def grow(self, capacity):
+        """Make the shared buffer at least capacity particles long."""
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        for name in ArrayParticleEmitter.FIELDS:
+            new_array = np.zeros(capacity, dtype=np.float32)
+            if name in self.data:
+                new_array[:self.end] = self.data[name][:self.end]
+            self.data[name] = new_array
+        self.capacity = capacity
+        # The emitters are still looking at the old arrays.
+        for emitter in self.emitters:
+            emitter.data = self.region_data(*self.regions[emitter])
+
+
+    def region_data(self, start, size):
+        return {name: array[start:start + size] for name, array in self.data.items()}
+
+
+    def allocate(self, size):
+        """Find room for size particles, reusing a free region if one fits."""
+        for i, (start, free_size) in enumerate(self.free_regions):
+            if free_size >= size:
+                if free_size == size:
+                    del self.free_regions[i]
+                else:
+                    self.free_regions[i] = (start + size, free_size - size)
+                return start
+        start = self.end
+        self.grow(start + size)
+        self.end = start + size
+        return start
+
+
+    def release(self, start, size):
+        """Give a region back, merging it with any free neighbours."""
+        if start + size == self.end:
+            self.end = start
+        else:
+            self.free_regions.append((start, size))
+        self.free_regions.sort()
+        merged = []
+        for region in self.free_regions:
+            if merged and merged[-1][0] + merged[-1][1] == region[0]:
+                merged[-1] = (merged[-1][0], merged[-1][1] + region[1])
+            else:
+                merged.append(region)
+        # A free region that now reaches the end just shortens the buffer.
+        while merged and merged[-1][0] + merged[-1][1] == self.end:
+            self.end = merged.pop()[0]
+        self.free_regions = merged
+
+
+    def add_emitter(self,
+                    x: int,
+                    y: int,
+                    particle_chars: dict,
+                    capacity: int = 1024,
+                    seed=None) -> ArrayParticleEmitter:
+        """
+        Create an emitter that runs as part of this system. The particle_chars
+        dict is the same as for any other emitter, except that the system's
+        batch is used for drawing. capacity is the most particles the emitter
+        can have alive at once; past that, emissions are skipped and counted in
+        the emitter's stats.
+        """
+        chars = dict(particle_chars, batch=self.batch)
+        emitter = ArrayParticleEmitter(x, y, chars, capacity=0, seed=seed, fixed_capacity=True)
+        start = self.allocate(capacity)
+        self.regions[emitter] = (start, capacity)
+        emitter.adopt(self.region_data(start, capacity))
+        if emitter.quads is not None:
+            emitter.quads.resize(capacity)
+        self.emitters.append(emitter)
+        return emitter
+
+
+    def remove_emitter(self, emitter: ArrayParticleEmitter):
+        """Take an emitter and all its particles out of the system."""
+        self.emitters.remove(emitter)
+        self.timings.pop(emitter, None)
+        self.release(*self.regions.pop(emitter))
+        emitter.delete()
+
+
+    def live_counts(self) -> list:
+        """The number of live particles for each emitter, in the order added."""
+        return [emitter.count for emitter in self.emitters]
+
+
+    def update(self, dt):
+        """
+        Advance every emitter's particles by dt. The motion, aging and culling
+        happen once over the whole buffer. Slots that aren't in use get moved
+        along too, which is harmless and cheaper than skipping them.
+        """
+        start_time = time.perf_counter()
+        for emitter in self.emitters:
+            emitter.apply_motion(dt)
+        end = self.end
+        data = self.data
+        data["x"][:end] += data["dx"][:end] * dt
+        data["y"][:end] += data["dy"][:end] * dt
+        age = data["age"][:end]
+        age += dt
+        alive = age <= data["life"][:end]
+        if self.bounds is not None:
+            left, bottom, right, top = self.bounds
+            x = data["x"][:end]
+            y = data["y"][:end]
+            alive &= (x >= left) & (x <= right) & (y >= bottom) & (y <= top)
+        self.shared_time = time.perf_counter() - start_time
+
+        for emitter in self.emitters:
+            start_time = time.perf_counter()
+            start = self.regions[emitter][0]
+            emitter.finish_tick(alive[start:start + emitter.count], dt)
+            self.timings[emitter] = time.perf_counter() - start_time
@@ -0,0 +1,156 @@
+"""
+Headless benchmark for the point bursts: how many bursts can be on screen at
+once while keeping up a frame rate? For each engine it keeps a steady number
+of live bursts (new ones started as fast as old ones fade), and times whole
+frames: starting the new bursts, updating, and drawing. Then it searches for
+the most live bursts that still fit in the frame budget. Run it from this
+folder:
+
+    python bench_bursts.py
+    python bench_bursts.py --engines field --counts 1000 10000 --fps 60
+
+The engines are:
+
+    label   PointBurstGroup, a Label per burst
+    pooled  PooledPointBurstGroup, reusing its Labels (with room for
+            every live burst, so none are dropped)
+    tween   PointBurstGroup, its Labels animated by a Tweener
+    field   BurstField, drawn from a glyph atlas
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pyglet
+pyglet.options['headless'] = True
+pyglet.options['shadow_window'] = False
+from pyglet.gl import glFinish
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.bench import add_output_argument, write_results
+from common.tween import Tweener
+from point_burst import PointBurstGroup, PooledPointBurstGroup
+from burst_field import BurstField
+
+
+ENGINES = ("label", "pooled", "tween", "field")
+LIFE = 1.0
+
+
+class Run():
+    """One engine, kept at a steady number of live bursts."""
+    def __init__(self, engine, live, dt, seed=1):
+        self.rng = np.random.default_rng(seed)
+        self.dt = dt
+        self.rate = live / LIFE
+        self.owed = 0.0
+        self.batch = pyglet.graphics.Batch()
+        if engine in ("label", "pooled", "tween"):
+            if engine == "label":
+                self.group = PointBurstGroup()
+                self.update = self.group.update_pbs
+            elif engine == "pooled":
+                self.group = PooledPointBurstGroup(capacity=live + live // 2 + 16)
+                self.update = self.group.update_pbs
+            else:
+                self.group = PointBurstGroup(Tweener())
+                self.update = self.group.tweener.update
+            self.batch = self.group.pb_batch
+            self.add = self.group.add_pb
+        else:
+            self.group = BurstField(self.batch)
+            self.add = self.group.add_burst
+            self.update = self.group.update
+
+    def frame(self):
+        self.owed += self.rate * self.dt
+        new = int(self.owed)
+        self.owed -= new
+        points = self.rng.integers(5, 11, new) * 10
+        x = self.rng.integers(0, 1000, new)
+        y = self.rng.integers(0, 700, new)
+        color = self.rng.integers(0, 256, (new, 3))
+        for i in range(new):
+            self.add(points=int(points[i]), font='Arial', start_size=15, end_size=30,
+                     x_loc=int(x[i]), y_loc=int(y[i]), color=tuple(color[i].tolist()) + (255,),
+                     life=LIFE, distance=50)
+        self.update(self.dt)
+        self.batch.draw()
+        glFinish()
+
+    def delete(self):
+        if isinstance(self.group, (PointBurstGroup, PooledPointBurstGroup)):
+            for pb in self.group.pb_list:
+                pb.delete()
+        else:
+            self.group.delete()
+
+
+def time_frames(engine, live, frames, dt):
+    """Warm up to a steady state, then time frames. Returns ms per frame."""
+    run = Run(engine, live, dt)
+    for i in range(int(LIFE / dt) + 1):
+        run.frame()
+    frame_times = []
+    for i in range(frames):
+        start = time.perf_counter()
+        run.frame()
+        frame_times.append(time.perf_counter() - start)
+    run.delete()
+    return np.array(frame_times) * 1000
+
+
+def capacity(engine, budget_ms, frames, dt, limit=1 << 20):
+    """The most live bursts whose average frame fits in budget_ms."""
+    low, high = 0, 16
+    while high <= limit and time_frames(engine, high, frames, dt).mean() <= budget_ms:
+        low, high = high, high * 2
+    while high - low > max(low // 20, 1):
+        middle = (low + high) // 2
+        if time_frames(engine, middle, frames, dt).mean() <= budget_ms:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+def run(engines, counts, frames, fps, find_capacity=True):
+    window = pyglet.window.Window(1000, 700, visible=False)
+    window.switch_to()
+    window.on_resize(1000, 700)
+    dt = 1 / fps
+    results = []
+    for engine in engines:
+        for live in counts:
+            frame_times = time_frames(engine, live, frames, dt)
+            results.append({"engine": engine,
+                            "live_bursts": live,
+                            "ms_per_frame": float(frame_times.mean()),
+                            "p95_ms": float(np.percentile(frame_times, 95))})
+            print("{engine:>6} {live_bursts:>7} bursts: {ms_per_frame:8.3f} ms/frame".format(
+                **results[-1]), file=sys.stderr)
+        if find_capacity:
+            most = capacity(engine, 1000 / fps, frames, dt)
+            results.append({"engine": engine, "fps": fps, "capacity": most})
+            print("{:>6} capacity at {} fps: {} bursts".format(engine, fps, most), file=sys.stderr)
+    window.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless point burst benchmark.")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--counts", nargs="+", type=int, default=[10, 100, 1000])
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--fps", type=float, default=60, help="frame rate to find the capacity at")
+    parser.add_argument("--no-capacity", action="store_true", help="skip the capacity search")
+    add_output_argument(parser)
+    args = parser.parse_args()
+
+    results = run(args.engines, args.counts, args.frames, args.fps, not args.no_capacity)
+    write_results(results, args.out)
@@ -0,0 +1,284 @@
+import os
+import sys
+
+import numpy as np
+import pyglet
+from pyglet.gl import GL_QUADS
+from pyglet.image.atlas import TextureAtlas
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.quads import as_array
+from common.quality import Knob
+
+
+class GlyphAtlas():
+    """
+    GlyphAtlas renders the characters of one font, once each, into a single
+    texture, at a reference size big enough to stay crisp when scaled down.
+    It also remembers the layout of every text it has been asked for: one
+    quad per character, measured in reference-size pixels from the text's
+    anchor point (centered, at the bottom, just like a Label anchored
+    'center', 'bottom'). Drawing the text at any other size is then just a
+    matter of scaling those quads.
+    """
+    def __init__(self, font_name, ref_size=48, atlas_size=1024):
+        self.font = pyglet.font.load(font_name, ref_size)
+        self.ref_size = ref_size
+        self.atlas = TextureAtlas(atlas_size, atlas_size)
+        self.texture = self.atlas.texture
+        self.glyphs = {}    # char -> (region or None, (x1, y1, x2, y2), advance)
+        self.layouts = {}   # text -> (corners, tex_coords)
+
+
+    def glyph(self, char):
+        if char not in self.glyphs:
+            font_glyph = self.font.get_glyphs(char)[0]
+            region = None
+            if font_glyph.width and font_glyph.height:
+                # Glyphs come out of the font's texture black and upside down
+                # (the font flips them back with its texture coordinates).
+                # They're stored white and upright here, so a vertex color
+                # tints them and the atlas's own coordinates are right.
+                image_data = font_glyph.get_image_data()
+                width, height = image_data.width, image_data.height
+                pixels = np.frombuffer(image_data.get_data('RGBA', width * 4), dtype=np.uint8)
+                pixels = pixels.reshape(height, width, 4)[::-1].copy()
+                pixels[:, :, :3] = 255
+                white = pyglet.image.ImageData(width, height, 'RGBA', pixels.tobytes())
+                region = self.atlas.add(white, border=1)
+            self.glyphs[char] = (region, font_glyph.vertices, font_glyph.advance)
+        return self.glyphs[char]
+
+
+    def layout(self, text):
+        """
+        Return the quads for a text: an (n, 8) array of corners, anticlockwise
+        from the bottom left as x, y pairs, and an (n, 12) array of texture
+        coordinates, one row per visible character.
+        """
+        if text not in self.layouts:
+            pen_x = 0
+            corners = []
+            tex_coords = []
+            for char in text:
+                region, (x1, y1, x2, y2), advance = self.glyph(char)
+                if region is not None:
+                    corners.append((pen_x + x1, y1, pen_x + x2, y1, pen_x + x2, y2, pen_x + x1, y2))
+                    tex_coords.append(region.tex_coords)
+                pen_x += advance
+            corners = np.array(corners, dtype=np.float32).reshape(-1, 8)
+            # Center on the advance width, and lift the baseline clear of the
+            # descent, the way a Label anchored 'center', 'bottom' is laid out.
+            corners[:, 0::2] -= pen_x / 2
+            corners[:, 1::2] -= self.font.descent
+            self.layouts[text] = (corners, np.array(tex_coords, dtype=np.float32).reshape(-1, 12))
+        return self.layouts[text]
+
+
+class BurstLayer():
+    """
+    The glyphs of every live burst in one font: each glyph's quad and the
+    details of the burst it belongs to are kept in NumPy arrays, and drawn
+    from one vertex list using the font's GlyphAtlas texture.
+    """
+    FIELDS = ("x", "y", "age", "life", "distance", "start_size", "end_size", "opacity", "fade_out")
+
+    def __init__(self, atlas, batch, capacity=256, group=None):
+        self.atlas = atlas
+        self.batch = batch
+        self.group = pyglet.sprite.SpriteGroup(atlas.texture, pyglet.gl.GL_SRC_ALPHA,
+                                               pyglet.gl.GL_ONE_MINUS_SRC_ALPHA, group)
+        self.count = 0
+        self.capacity = 0
+        self.data = {}
+        self.corners = np.zeros((0, 8), dtype=np.float32)
+        self.tex_coords = np.zeros((0, 12), dtype=np.float32)
+        self.color = np.zeros((0, 3), dtype=np.uint32)
+        self.vertex_list = None
+        self.tex_dirty = False
+        self.grow(capacity)
+
+
+    def grow(self, capacity):
+        """Make room for at least capacity glyphs."""
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        for name in self.FIELDS:
+            new_array = np.zeros(capacity, dtype=np.float32)
+            if name in self.data:
+                new_array[:self.count] = self.data[name][:self.count]
+            self.data[name] = new_array
+        for name, columns, dtype in (("corners", 8, np.float32),
+                                     ("tex_coords", 12, np.float32),
+                                     ("color", 3, np.uint32)):
+            new_array = np.zeros((capacity, columns), dtype=dtype)
+            new_array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, new_array)
+        if self.batch is not None:
+            if self.vertex_list is None:
+                self.vertex_list = self.batch.add(capacity * 4, GL_QUADS, self.group,
+                                                  'v2f/stream', 'c4B/stream', 't3f/dynamic')
+            else:
+                self.vertex_list.resize(capacity * 4)
+            as_array(self.vertex_list.vertices, np.float32)[:] = 0
+            self.tex_dirty = True
+        self.capacity = capacity
+
+
+    def live(self, name):
+        return self.data[name][:self.count]
+
+
+    def add(self, text, x, y, color, life, distance, start_size, end_size):
+        corners, tex_coords = self.atlas.layout(text)
+        n = len(corners)
+        self.grow(self.count + n)
+        new = slice(self.count, self.count + n)
+        data = self.data
+        data["x"][new] = x
+        data["y"][new] = y
+        data["age"][new] = 0
+        data["life"][new] = life
+        data["distance"][new] = distance
+        data["start_size"][new] = start_size
+        data["end_size"][new] = end_size
+        data["opacity"][new] = color[3]
+        # A burst is gone once its fading opacity drops below 1.
+        data["fade_out"][new] = life * (1 - 1 / max(color[3], 1))
+        self.corners[new] = corners
+        self.tex_coords[new] = tex_coords
+        self.color[new] = color[:3]
+        self.count += n
+        self.tex_dirty = True
+
+
+    def update(self, dt):
+        """Age every glyph, drop the faded ones, and draw the rest."""
+        age = self.live("age")
+        age += dt
+        alive = age < self.live("fade_out")
+        if not alive.all():
+            self.compact(alive)
+        self.sync()
+
+
+    def compact(self, alive):
+        """Drop the glyphs that aren't alive, keeping the rest in order."""
+        n = int(alive.sum())
+        for name in self.FIELDS:
+            array = self.data[name]
+            array[:n] = array[:self.count][alive]
+        for array in (self.corners, self.tex_coords, self.color):
+            array[:n] = array[:self.count][alive]
+        if self.vertex_list is not None:
+            as_array(self.vertex_list.vertices, np.float32)[n * 8:self.count * 8] = 0
+        self.count = n
+        self.tex_dirty = True
+
+
+    def sync(self):
+        """
+        Write every glyph's quad. Growth, rise and fade are all worked out
+        here from the burst's age: nothing is laid out or rendered again.
+        """
+        if self.vertex_list is None:
+            return
+        n = self.count
+        t = self.live("age") / self.live("life")
+        scale = (self.live("start_size") + (self.live("end_size") - self.live("start_size")) * t)
+        scale /= self.atlas.ref_size
+        y = self.live("y") + self.live("distance") * t
+        vertices = as_array(self.vertex_list.vertices, np.float32).reshape(-1, 8)[:n]
+        np.multiply(self.corners[:n], scale[:, None], out=vertices)
+        vertices[:, 0::2] += self.live("x")[:, None]
+        vertices[:, 1::2] += y[:, None]
+
+        opacity = self.live("opacity") * (1 - t)
+        rgb = self.color[:n]
+        packed = (rgb[:, 0] | (rgb[:, 1] << 8) | (rgb[:, 2] << 16)
+                  | (np.maximum(opacity, 0).astype(np.uint32) << 24))
+        colors = as_array(self.vertex_list.colors, np.uint8).view(np.uint32).reshape(-1, 4)
+        for k in range(4):
+            colors[:n, k] = packed
+
+        if self.tex_dirty:
+            as_array(self.vertex_list.tex_coords, np.float32).reshape(-1, 12)[:n] = self.tex_coords[:n]
+            self.tex_dirty = False
+
+
+    def delete(self):
+        if self.vertex_list is not None:
+            self.vertex_list.delete()
+            self.vertex_list = None
+        self.count = 0
+
+
+class BurstField():
+    """
+    BurstField draws point bursts like PointBurst does (text that floats up,
+    grows and fades out), but without a Label for each. Changing a Label's
+    font size lays out and renders its text all over again, and PointBurst
+    does that every frame for every burst. Here each character is rendered
+    once into a GlyphAtlas, each text is laid out once, and a burst is grown,
+    raised and faded by moving and recoloring its quads, for every glyph of
+    every burst at once with NumPy.
+
+    The bursts follow the same start_size, end_size, distance and life as a
+    PointBurst, changing smoothly rather than a whole pixel or font size at a
+    time.
+    """
+    def __init__(self, batch=None, ref_size=48, group=None):
+        self.batch = batch
+        self.ref_size = ref_size
+        self.group = group
+        self.atlases = {}   # font name -> GlyphAtlas
+        self.layers = {}    # font name -> BurstLayer
+        self.life_scale = 1.0
+
+
+    def layer(self, font):
+        if font not in self.layers:
+            self.atlases[font] = GlyphAtlas(font, self.ref_size)
+            self.layers[font] = BurstLayer(self.atlases[font], self.batch, group=self.group)
+        return self.layers[font]
+
+
+    def add_burst(self,
+                  points=100,
+                  font='Arial',
+                  start_size=30,
+                  x_loc=0,
+                  y_loc=0,
+                  color=(255, 255, 255, 255),
+                  life=2.0,
+                  distance=100,
+                  end_size=60):
+        """Start a new burst. The arguments are the same as PointBurstGroup.add_pb."""
+        self.layer(font).add(str(points), x_loc, y_loc, color, life * self.life_scale,
+                             distance, start_size, end_size)
+
+
+    def update(self, dt):
+        for layer in self.layers.values():
+            layer.update(dt)
+
+
+    def quality_knobs(self):
+        """
+        What a QualityController may turn down. Drawing a burst costs next to
+        nothing here, so all there is is to have new bursts fade out faster,
+        in down to half the time.
+        """
+        def set_life(level):
+            self.life_scale = level
+        return [Knob("life", set_life, floor=0.5, priority=1)]
+
+
+    def delete(self):
+        for layer in self.layers.values():
+            layer.delete()
+        self.layers = {}
@@ -1,7 +1,17 @@
+import os
+import sys
+
 import pyglet
+from collections import deque
 from math import floor
 from random import randint, random
 
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common.quality import Knob
+
 
 class PointBurst(pyglet.text.Label):
     '''
@@ -29,6 +39,14 @@ class PointBurst(pyglet.text.Label):
                                          anchor_y='bottom',
                                          color=color,
                                          batch=what_batch)
+        self.points = points
+        self.set_motion(start_size, life, distance, end_size)
+
+
+    def set_motion(self, start_size, life, distance, end_size):
+        '''
+        Work out how fast the label should float up, grow and fade out.
+        '''
         self.dead = False
         self.fsize = self.font_size * 1.0   # font-size stored as a float
         #self.xf = self.x * 1.0              # x coord stored as a float
@@ -42,36 +60,86 @@ class PointBurst(pyglet.text.Label):
         self.grow_per_second = (self.end_size - start_size) / self.life
 
 
-    def update(self, dt):
+    def restart(self, points, font, start_size, x_loc, y_loc, color, life, distance, end_size):
+        '''
+        Start this point burst over with new settings. The label is kept,
+        so nothing new is made; the text is laid out just once, and its
+        vertices go back into the same batch.
+        '''
+        self.begin_update()
+        self.text = str(points)
+        self.font_name = font
+        self.font_size = start_size
+        self.x = x_loc
+        self.y = y_loc
+        self.color = color
+        self.visible = True
+        self.end_update()
+        self.points = points
+        self.set_motion(start_size, life, distance, end_size)
+
+
+    def update(self, dt, restyle=True):
         '''
         This function should be called every frame to update the point burst.
         Most of these values need to be figured as floats, and then converted to
         integers to update the display. Otherwise the change in each frame might
         remain too small to ever take effect.
+
+        Without restyle, the label is only moved: its size and color are
+        worked out, but not changed until the next update that restyles it.
+        That saves laying the text out again, which is most of the cost.
         '''
         if not self.dead:
             self.fsize = self.fsize + self.grow_per_second * dt
-            self.font_size = floor(self.fsize)
             self.yf = self.yf + self.pix_per_sec * dt
-            self.y = floor(self.yf)
             self.visibility = self.visibility - self.vis_per_sec * dt
-            self.color = (self.color[0], self.color[1], self.color[2], floor(self.visibility))
+            if restyle:
+                # The new size lays the text out again; the new color only
+                # rewrites the vertex colors.
+                self.font_size = floor(self.fsize)
+                self.y = floor(self.yf)
+                self.color = (self.color[0], self.color[1], self.color[2], floor(self.visibility))
+            else:
+                self.y = floor(self.yf)
             if self.visibility < 1.0:
                 self.visibility = 0.0
                 self.dead = True
-                self.batch = None
+                # Hiding the label hands its vertices back to the batch.
+                self.visible = False
+
+
+    def animate(self, tweener, on_done=None):
+        '''
+        Hand this point burst's growing, floating and fading to a Tweener,
+        which works it out along with every other tween at once, instead of
+        calling update. The values are rounded down just as update does, and
+        the label is only changed when they do. on_done is called with the
+        point bursts that have faded out.
+        '''
+        tweener.tween(self, 'font_size', self.fsize, self.end_size, self.life, whole=True)
+        tweener.tween(self, 'y', self.yf, self.yf + self.distance, self.life, whole=True)
+        tweener.tween(self, 'opacity', self.visibility, 0, self.life, whole=True, on_done=on_done)
 
 
 
 class PointBurstGroup():
     '''
     A convenient class to hold all the point bursts being used at any given time.
+
+    Given a Tweener, the group hands each new point burst's animation to it,
+    and update_pbs has nothing left to do: whoever owns the Tweener updates
+    it, and the faded point bursts are all dropped together in fade_pbs.
     '''
-    def __init__(self):
+    def __init__(self, tweener=None):
         #self.window = window
         self.pb_batch = pyglet.graphics.Batch() # tells the point bursts which graphics batch to render with
         self.pb_list = []   # list to hold all the point bursts in this group
         self.dead_pbs = []  # list to hold all the point bursts that have faded out
+        self.tweener = tweener
+        self.restyle_every = 1  # each point burst is restyled one update in this many
+        self.life_scale = 1.0
+        self.updates = 0
 
 
     def add_pb( self,
@@ -87,7 +155,10 @@ class PointBurstGroup():
         '''
         Instantiate a new point burst and add it to the point burst list.
         '''
+        life *= self.life_scale
         new_pb = PointBurst(points, font, start_size, x_loc, y_loc, color, life, distance, end_size, self.pb_batch)
+        if self.tweener is not None:
+            new_pb.animate(self.tweener, self.fade_pbs)
         self.pb_list.append(new_pb)
 
 
@@ -96,10 +167,15 @@ class PointBurstGroup():
         Loop through all point bursts and call each one's update method.
         Build a list of dead ones for removal.
         '''
+        if self.tweener is not None:
+            return
         self.dead_pbs = []
-        for pb in self.pb_list:
+        self.updates += 1
+        every = self.restyle_every
+        for i, pb in enumerate(self.pb_list):
             if not pb.dead:
-                pb.update(dt)
+                # The restyles are staggered, so they're spread over the updates.
+                pb.update(dt, (i + self.updates) % every == 0)
             else:
                 self.dead_pbs.append(pb)
         self.remove_dead_pbs()
@@ -115,38 +191,305 @@ class PointBurstGroup():
             self.pb_list.remove(pb)
 
 
+    def fade_pbs(self, pbs):
+        '''
+        Called by the Tweener with the point bursts that have faded out.
+        They are hidden, and all dropped from the list in one pass.
+        '''
+        for pb in pbs:
+            pb.dead = True
+            pb.visible = False
+        self.pb_list = [pb for pb in self.pb_list if not pb.dead]
+
+
+    def quality_knobs(self):
+        '''
+        What a QualityController may turn down: see burst_knobs.
+        '''
+        return burst_knobs(self)
+
+
+
+class PooledPointBurstGroup():
+    '''
+    A point burst group that never holds more than capacity point bursts,
+    and reuses them instead of making a new Label for every one.
+
+    PointBurstGroup makes a new PointBurst each time one is added, and when
+    they fade out, removes each from the middle of its list, which gets slow
+    on the busy frames where lots of points are being scored. Here a faded
+    point burst is hidden, which hands its vertices back to the batch, and
+    swapped with the last one in the list, so it can be dropped off the end.
+    It then waits to be restarted the next time one is added.
+
+    When all capacity point bursts are in use, when_full says what to do
+    with a new one:
+        'drop_oldest'   the oldest point burst is cut short and restarted
+                        with the new one.
+        'merge'         if there is a point burst in the same font within
+                        merge_distance pixels, it is restarted where the new
+                        one is, showing the two scores added together. If
+                        there isn't, the oldest is dropped.
+
+    Neither needs a look at every live point burst. They're kept in the
+    order they were started in, so the oldest is always at the front, and
+    for merging they're also filed by which merge_distance sized cell of the
+    window they're in, so only the cells around a new one are searched.
+    '''
+    def __init__(self, capacity=64, when_full='drop_oldest', merge_distance=40):
+        if when_full not in ('drop_oldest', 'merge'):
+            raise ValueError("when_full must be 'drop_oldest' or 'merge', not {!r}".format(when_full))
+        self.pb_batch = pyglet.graphics.Batch() # tells the point bursts which graphics batch to render with
+        self.capacity = capacity
+        self.full_capacity = capacity
+        self.when_full = when_full
+        self.merge_distance = merge_distance
+        self.pb_list = []   # the live point bursts, in no particular order
+        self.free_pbs = []  # faded point bursts, waiting to be reused
+        self.started = 0    # how many point bursts have been started, to tell which is oldest
+        self.ages = deque() # (start_order, point burst), oldest first; stale ones are skipped
+        self.cells = {} if when_full == 'merge' else None   # cell -> {point burst: None}
+        self.stats = {"made": 0, "reused": 0, "dropped": 0, "merged": 0}
+        self.tweener = None
+        self.restyle_every = 1
+        self.life_scale = 1.0
+        self.updates = 0
+
+
+    def add_pb( self,
+                points=100,
+                font='Arial',
+                start_size=30,
+                x_loc=0,
+                y_loc=0,
+                color=(255, 255, 255, 255),
+                life=2.0,
+                distance=100,
+                end_size=60):
+        '''
+        Start a point burst, reusing a faded one if there is one. Takes the
+        same arguments as PointBurstGroup.add_pb.
+        '''
+        life *= self.life_scale
+        if len(self.pb_list) >= self.capacity:
+            if self.when_full == 'merge' and isinstance(points, int):
+                near_pb = self.find_near(font, x_loc, y_loc)
+                if near_pb is not None:
+                    self.stats["merged"] += 1
+                    self.start(near_pb, near_pb.points + points, font, start_size, x_loc, y_loc,
+                               color, life, distance, end_size)
+                    return
+            self.stats["dropped"] += 1
+            self.retire(self.oldest())
+
+        if self.free_pbs:
+            self.stats["reused"] += 1
+            new_pb = self.free_pbs.pop()
+            self.start(new_pb, points, font, start_size, x_loc, y_loc, color, life, distance, end_size)
+        else:
+            self.stats["made"] += 1
+            new_pb = PointBurst(points, font, start_size, x_loc, y_loc, color, life, distance, end_size, self.pb_batch)
+            self.started_now(new_pb)
+        new_pb.index = len(self.pb_list)
+        self.pb_list.append(new_pb)
+
+
+    def start(self, pb, *settings):
+        pb.restart(*settings)
+        self.started_now(pb)
+
+
+    def started_now(self, pb):
+        '''
+        Give a point burst that has just been started (or restarted) the next
+        place in the line, and file it under its cell.
+        '''
+        if len(self.ages) > 2 * len(self.pb_list) + 64:
+            # Point bursts that faded out or were restarted are still in the
+            # line; start it over with just the live ones.
+            self.ages = deque(sorted(((live.start_order, live) for live in self.pb_list),
+                                     key=lambda age: age[0]))
+        pb.start_order = self.started
+        self.started += 1
+        self.ages.append((pb.start_order, pb))
+        if self.cells is not None:
+            self.file(pb)
+
+
+    def oldest(self):
+        '''
+        The live point burst that was started longest ago. Entries for ones
+        that have since faded or been restarted are dropped on the way.
+        '''
+        while True:
+            order, pb = self.ages[0]
+            if not pb.dead and pb.start_order == order:
+                return pb
+            self.ages.popleft()
+
+
+    def cell_of(self, x, y):
+        return (floor(x / self.merge_distance), floor(y / self.merge_distance))
+
+
+    def file(self, pb):
+        '''File a point burst under the cell it's in now, taking it out of its old one.'''
+        cell = self.cell_of(pb.x, pb.y)
+        if getattr(pb, 'cell', None) == cell:
+            return
+        self.unfile(pb)
+        pb.cell = cell
+        self.cells.setdefault(cell, {})[pb] = None
+
+
+    def unfile(self, pb):
+        cell = getattr(pb, 'cell', None)
+        if cell is None:
+            return
+        filed = self.cells.get(cell)
+        if filed is not None:
+            filed.pop(pb, None)
+            if not filed:
+                del self.cells[cell]
+        pb.cell = None
+
+
+    def find_near(self, font, x, y):
+        '''
+        Return the closest live point burst in the given font, within
+        merge_distance of x, y, or None if there isn't one. Only the cell
+        x, y is in and the ones around it can hold one that close.
+        '''
+        near_pb = None
+        nearest = self.merge_distance ** 2
+        cell_x, cell_y = self.cell_of(x, y)
+        for offset_x in (-1, 0, 1):
+            for offset_y in (-1, 0, 1):
+                for pb in self.cells.get((cell_x + offset_x, cell_y + offset_y), ()):
+                    distance = (pb.x - x) ** 2 + (pb.y - y) ** 2
+                    if distance <= nearest and pb.font_name == font and isinstance(pb.points, int):
+                        near_pb = pb
+                        nearest = distance
+        return near_pb
+
+
+    def update_pbs(self, dt):
+        '''
+        Update every point burst, and retire the ones that have faded out.
+        The list is walked backwards, so the point burst swapped into a
+        retired one's place has already been updated.
+        '''
+        self.updates += 1
+        every = self.restyle_every
+        for i in range(len(self.pb_list) - 1, -1, -1):
+            pb = self.pb_list[i]
+            pb.update(dt, (i + self.updates) % every == 0)
+            if pb.dead:
+                self.retire(pb)
+            elif self.cells is not None:
+                self.file(pb)
+
+
+    def retire(self, pb):
+        '''
+        Hide a point burst and put it aside for reuse. The last point burst
+        in the list takes its place, so nothing else has to move.
+        '''
+        last_pb = self.pb_list.pop()
+        if last_pb is not pb:
+            self.pb_list[pb.index] = last_pb
+            last_pb.index = pb.index
+        pb.dead = True
+        pb.visible = False
+        if self.cells is not None:
+            self.unfile(pb)
+        self.free_pbs.append(pb)
+
+
+    def quality_knobs(self):
+        '''
+        What a QualityController may turn down: see burst_knobs. Last of
+        all, the capacity can go down to a quarter, so fewer point bursts
+        are shown at once.
+        '''
+        def set_capacity(level):
+            self.capacity = max(1, round(self.full_capacity * level))
+        return burst_knobs(self) + [Knob("capacity", set_capacity, floor=0.25, priority=2)]
+
+
+def burst_knobs(group):
+    '''
+    The Knobs a point burst group can offer a QualityController. First the
+    point bursts are restyled (grown and faded, which lays their text out
+    again) less often: at the lowest level, one update in four. The ones
+    being moved by a Tweener don't have this knob. Then new point bursts
+    fade out faster, in down to half the time.
+    '''
+    def set_restyle(level):
+        group.restyle_every = 1 + round((1.0 - level) * 4)
+
+    def set_life(level):
+        group.life_scale = level
+
+    knobs = [Knob("life", set_life, floor=0.5, priority=1)]
+    if group.tweener is None:
+        knobs.insert(0, Knob("restyle", set_restyle, floor=0.25, priority=0))
+    return knobs
+
 
 if __name__ == "__main__":
+    import argparse
+    from common.profiler import FrameProfiler
+    from common.quality import QualityController
+    from common.scheduler import FrameScheduler
+
+    parser = argparse.ArgumentParser(description="Point bursts wherever the mouse is clicked.")
+    parser.add_argument("--engine", choices=("label", "pooled", "tween", "field"), default="label",
+                        help="'label' draws each burst with its own Label, 'pooled' reuses "
+                             "a fixed number of Labels, 'tween' animates the Labels with "
+                             "a shared Tweener, 'field' draws them all from a glyph atlas "
+                             "with a BurstField.")
+    parser.add_argument("--capacity", type=int, default=64,
+                        help="most point bursts at once, for the pooled engine")
+    parser.add_argument("--when-full", choices=("drop_oldest", "merge"), default="drop_oldest",
+                        help="what the pooled engine does with a new burst when it is full")
+    FrameProfiler.add_arguments(parser)
+    QualityController.add_arguments(parser)
+    FrameScheduler.add_arguments(parser)
+    args = parser.parse_args()
+    quality = QualityController.from_args(args)
+    profiler = FrameProfiler.from_args(args, enabled=quality is not None)
+    scheduler = FrameScheduler.from_args(args, profiler)
 
     window = pyglet.window.Window(1000, 700, caption="Points!")
     fps_display = pyglet.window.FPSDisplay(window)
 
 
-    @window.event
+    @profiler.event(window)
     def on_mouse_press(x, y, button, modifiers):
         '''
         This function draws a somewhat randomized point burst wherever the mouse is clicked.
         '''
-        pb_group.add_pb(points=randint(5, 10) * 10,
-                        font='Arial',
-                        start_size=15,
-                        end_size=30,
-                        x_loc=x,
-                        y_loc=y,
-                        color=get_random_color(),
-                        life=1.0,
-                        distance=50
-                        )
+        add_burst = pb_group.add_pb if field is None else field.add_burst
+        add_burst(points=randint(5, 10) * 10,
+                  font='Arial',
+                  start_size=15,
+                  end_size=30,
+                  x_loc=x,
+                  y_loc=y,
+                  color=get_random_color(),
+                  life=1.0,
+                  distance=50
+                  )
 
 
-    @window.event
+    @profiler.event(window)
     def on_draw():
         '''
         Clears the window, draw the point bursts and the fps display
         '''
         window.clear()
-        pb_group.pb_batch.draw()
-        fps_display.draw()
+        scheduler.draw()
 
 
     def get_random_color():
@@ -159,6 +502,37 @@ if __name__ == "__main__":
     '''
     Create a point burst group, set the frames to update, and run the program.
     '''
-    pb_group = PointBurstGroup()
-    pyglet.clock.schedule_interval(pb_group.update_pbs, 1/120)
+    field = None
+    if args.engine == "pooled":
+        pb_group = PooledPointBurstGroup(args.capacity, args.when_full)
+    elif args.engine == "tween":
+        from common.tween import Tweener
+        tweener = Tweener()
+        pb_group = PointBurstGroup(tweener)
+    else:
+        pb_group = PointBurstGroup()
+
+    if args.engine == "field":
+        from burst_field import BurstField
+        field = BurstField(pb_group.pb_batch)
+        update = field.update
+    elif args.engine == "tween":
+        update = tweener.update
+    else:
+        update = pb_group.update_pbs
+
+    # With --target-ms, the point bursts are turned down when frames run long.
+    if quality is not None:
+        quality.add(pb_group if field is None else field, "bursts")
+        profiler.frame_listeners.append(quality.frame)
+
+    scheduler.add(update, "simulate", name="update")
+    scheduler.add(pb_group.pb_batch.draw, "draw", name="draw")
+    scheduler.add(fps_display.draw, "draw", name="fps")
+
+    scheduler.start(120)
     pyglet.app.run()
+    profiler.close()
+    scheduler.close()
+    if quality is not None:
+        quality.close()
@@ -0,0 +1,235 @@
+"""
+Plays the three-button game with no window, on a virtual clock, so a bot can
+get through thousands of whole games a second. That makes it possible to see
+how the difficulty curve (round_time shrinking by 0.99 a round, and growing by
+1.1 for each life lost) treats players with different reaction times, without
+playing it by hand. Run it from this folder:
+
+    python bot.py --games 10000
+    python bot.py --games 100000 --workers 4 --mean 0.3 --sd 0.06 --accuracy 0.97
+    python bot.py --bot scripted --script 0.4,0.35,0.3 --games 1
+
+Each game starts from its own seed, so the results are the same however many
+worker processes share them out.
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pyglet
+pyglet.options['shadow_window'] = False
+from pyglet.window import key
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from common import stats
+from three_button import GameObject
+
+
+class VirtualClock:
+    '''VirtualClock stands in for pyglet's clock. Nothing happens in real
+    time: scheduled functions are run in order, and the time jumps straight
+    to each one as it's run, called with the same dt pyglet would give it
+    (the time since it was scheduled).'''
+    def __init__(self):
+        self.time = 0.0
+        self.queue = []     # [due, order, func, scheduled_at, alive]
+        self.order = 0
+
+    def schedule_once(self, func, delay):
+        heapq.heappush(self.queue, [self.time + delay, self.order, func, self.time, True])
+        self.order += 1
+
+    def unschedule(self, func):
+        # Only a couple of things are ever scheduled at once, so a look
+        # through the whole queue is the quickest way.
+        for entry in self.queue:
+            if entry[2] == func:
+                entry[4] = False
+
+    def next_due(self):
+        '''Return when the next scheduled function is due, or None.'''
+        queue = self.queue
+        while queue and not queue[0][4]:
+            heapq.heappop(queue)
+        return queue[0][0] if queue else None
+
+    def step(self):
+        '''Jump to the next scheduled function and run it. Returns False if
+        there wasn't one.'''
+        if self.next_due() is None:
+            return False
+        due, order, func, scheduled_at, alive = heapq.heappop(self.queue)
+        self.time = due
+        func(due - scheduled_at)
+        return True
+
+    def advance(self, to):
+        '''Run everything due up to the time to, then move the time there.'''
+        while self.next_due() is not None and self.queue[0][0] <= to:
+            self.step()
+        self.time = max(self.time, to)
+
+
+class ReactionBot:
+    '''A player whose reaction times are drawn at random, in seconds:
+
+        normal      mean and sd
+        lognormal   a skewed curve with the same mean and sd
+        exgauss     normal, plus an exponential tail of mean tau, which is
+                    the usual shape of human reaction times
+
+    No reaction is ever quicker than minimum. The right key is pressed with
+    probability accuracy; otherwise one of the other two is.'''
+    def __init__(self, mean=0.25, sd=0.05, minimum=0.1, accuracy=0.98,
+                 distribution="normal", tau=0.05):
+        self.mean = mean
+        self.sd = sd
+        self.minimum = minimum
+        self.accuracy = accuracy
+        self.distribution = distribution
+        self.tau = tau
+        if distribution == "lognormal":
+            self.sigma = math.sqrt(math.log(1 + (sd / mean) ** 2))
+            self.mu = math.log(mean) - self.sigma ** 2 / 2
+
+    def react(self, rng, round_number):
+        '''Return (delay, correct) for one round.'''
+        if self.distribution == "lognormal":
+            delay = rng.lognormvariate(self.mu, self.sigma)
+        elif self.distribution == "exgauss":
+            delay = rng.gauss(self.mean, self.sd) + rng.expovariate(1 / self.tau)
+        else:
+            delay = rng.gauss(self.mean, self.sd)
+        return max(self.minimum, delay), rng.random() < self.accuracy
+
+
+class ScriptedBot:
+    '''A player that reacts after each delay in script in turn, starting over
+    at the end, and presses the wrong key in the rounds listed in wrong
+    (counting from 1).'''
+    def __init__(self, script, wrong=()):
+        self.script = list(script)
+        self.wrong = set(wrong)
+
+    def react(self, rng, round_number):
+        return self.script[(round_number - 1) % len(self.script)], round_number not in self.wrong
+
+
+KEYS = {rect: symbol for symbol, rect in GameObject.ANSWERS.items()}
+
+
+def play_game(bot, seed, max_rounds=100000):
+    '''Play one whole game and return how it went.'''
+    rng = random.Random(seed)
+    clock = VirtualClock()
+    game = GameObject(clock=clock, headless=True, rng=rng)
+    game.on_key_press(key.SPACE, 0)     # off the splash screen
+    rounds = 0
+    while game.mode != "gameover" and rounds < max_rounds:
+        clock.step()
+        if game.mode != "playing":
+            continue
+        # A round has just started: press a key, unless too_long comes first.
+        rounds += 1
+        delay, correct = bot.react(rng, rounds)
+        if clock.time + delay < clock.next_due():
+            clock.advance(clock.time + delay)
+            if correct:
+                symbol = KEYS[game.rect]
+            else:
+                symbol = KEYS[(game.rect + rng.randint(1, 2)) % 3]
+            game.on_key_press(symbol, 0)
+    return {"score": game.score,
+            "rounds": rounds,
+            "lifetime": clock.time,
+            "round_time": game.round_time}
+
+
+def play_games(bot, first_seed, games):
+    return [play_game(bot, seed) for seed in range(first_seed, first_seed + games)]
+
+
+def spread(values):
+    '''The mean, standard deviation and percentiles of a list of numbers.'''
+    return dict(stats.spread(values, (5, 25, 50, 75, 95)),
+                sd=statistics.pstdev(values),
+                min=min(values))
+
+
+def histogram(values, bins=20):
+    '''Count values in bins equal width bins, as a list of (low, high, count).'''
+    low, high = min(values), max(values)
+    width = (high - low) / bins or 1
+    counts = [0] * bins
+    for value in values:
+        counts[min(bins - 1, int((value - low) / width))] += 1
+    return [(low + i * width, low + (i + 1) * width, count) for i, count in enumerate(counts)]
+
+
+def run(bot, games, seed=0, workers=1):
+    '''Play games games, sharing them between workers processes, and return a
+    report of the scores, rounds and lifetimes (in game seconds).'''
+    start = time.perf_counter()
+    if workers > 1:
+        chunk = math.ceil(games / (workers * 4))
+        firsts = range(seed, seed + games, chunk)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = [pool.submit(play_games, bot, first, min(chunk, seed + games - first))
+                    for first in firsts]
+            results = [result for job in jobs for result in job.result()]
+    else:
+        results = play_games(bot, seed, games)
+    seconds = time.perf_counter() - start
+
+    report = {"games": games,
+              "workers": workers,
+              "seconds": seconds,
+              "games_per_sec": games / seconds}
+    for name in ("score", "rounds", "lifetime"):
+        values = [result[name] for result in results]
+        report[name] = spread(values)
+        report[name]["histogram"] = histogram(values)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless bot player for the three-button game.")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes to share the games between (0 for one per CPU)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bot", choices=("reaction", "scripted"), default="reaction")
+    parser.add_argument("--distribution", choices=("normal", "lognormal", "exgauss"), default="normal")
+    parser.add_argument("--mean", type=float, default=0.25, help="mean reaction time, in seconds")
+    parser.add_argument("--sd", type=float, default=0.05, help="reaction time standard deviation")
+    parser.add_argument("--tau", type=float, default=0.05, help="exgauss tail, in seconds")
+    parser.add_argument("--minimum", type=float, default=0.1, help="quickest possible reaction")
+    parser.add_argument("--accuracy", type=float, default=0.98,
+                        help="chance of pressing the right key")
+    parser.add_argument("--script", default="0.3",
+                        help="comma separated reaction times for the scripted bot")
+    parser.add_argument("--out", help="write the JSON report here instead of to stdout")
+    args = parser.parse_args()
+
+    if args.bot == "scripted":
+        bot = ScriptedBot(float(delay) for delay in args.script.split(","))
+    else:
+        bot = ReactionBot(args.mean, args.sd, args.minimum, args.accuracy, args.distribution, args.tau)
+    report = run(bot, args.games, args.seed, args.workers or os.cpu_count())
+    print("{games} games in {seconds:.2f} s ({games_per_sec:.0f} games/s): "
+          "score {mean:.1f} (p5 {p5}, p95 {p95})".format(**report, **report["score"]), file=sys.stderr)
+    if args.out:
+        with open(args.out, "w") as out_file:
+            json.dump(report, out_file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,163 @@
+import bisect
+import csv
+import json
+import time
+
+
+class LatencyRecorder:
+    '''Times how much of each round the game loop itself takes up, rather than
+    the player. The game calls the methods below at each step of a round, and
+    every call is stamped with time.perf_counter:
+
+        rest            take_rest asks for new_round in rest_time seconds
+        round_started   new_round actually fires, and lights a rectangle
+        drawn           on_draw has drawn that rectangle
+        presented       the window has flipped it onto the screen
+        key             the key press was handed to the game
+        round_ended     the round is over: "score", "wrong" or "too_long"
+
+    Each round becomes one record of what was scheduled and what actually
+    happened, in milliseconds:
+
+        rest_late_ms        new_round fired this long after it was due
+        draw_ms             round_started until the rectangle was drawn
+        present_ms          round_started until the frame was flipped
+        reaction_ms         presented until the key press arrived
+        timeout_late_ms     too_long fired this long after it was due
+        window_ms           how long the player really had: round_time, less
+                            the time before the rectangle was on screen, plus
+                            however late too_long was
+
+    A round the player lost to too_long, where window_ms came out less than
+    round_time, is one where the loop's delays cost the player time.
+    present_ms can't see past the flip, so the monitor's own delay isn't
+    counted, and key press times are when pyglet handed the event over,
+    not when the key went down.'''
+
+    # Upper edges of the histogram bins, in milliseconds. The last bin is
+    # everything over the last edge.
+    BIN_EDGES_MS = (1, 2, 4, 8, 12, 16, 20, 25, 33, 50, 67, 100, 150, 250, 500, 1000)
+    METRICS = ("rest_late_ms", "draw_ms", "present_ms", "reaction_ms", "timeout_late_ms", "window_ms")
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.rounds = []        # one dict per finished round
+        self.current = None     # the round being played, if there is one
+        self.rest_due = None    # when new_round is due to fire
+        self.rest_time = None
+
+    def rest(self, rest_time):
+        self.rest_due = self.clock() + rest_time
+        self.rest_time = rest_time
+
+    def round_started(self, rect, round_time):
+        now = self.clock()
+        self.current = {"round": len(self.rounds) + 1,
+                        "rect": rect,
+                        "rest_time_ms": self.rest_time * 1000 if self.rest_due is not None else None,
+                        "round_time_ms": round_time * 1000,
+                        "rest_late_ms": (now - self.rest_due) * 1000 if self.rest_due is not None else None,
+                        "started": now,
+                        "drawn": None,
+                        "presented": None,
+                        "key": None}
+        self.rest_due = None
+
+    def drawn(self):
+        if self.current is not None and self.current["drawn"] is None:
+            self.current["drawn"] = self.clock()
+
+    def presented(self):
+        if self.current is not None and self.current["drawn"] is not None \
+                and self.current["presented"] is None:
+            self.current["presented"] = self.clock()
+
+    def key(self):
+        if self.current is not None and self.current["key"] is None:
+            self.current["key"] = self.clock()
+
+    def round_ended(self, outcome):
+        if self.current is None:
+            return
+        now = self.clock()
+        record = self.current
+        self.current = None
+        started = record.pop("started")
+        drawn = record.pop("drawn")
+        presented = record.pop("presented")
+        key = record.pop("key")
+
+        def since(start, end):
+            if start is None or end is None:
+                return None
+            return (end - start) * 1000
+
+        record["outcome"] = outcome
+        record["draw_ms"] = since(started, drawn)
+        record["present_ms"] = since(started, presented)
+        record["reaction_ms"] = since(presented, key)
+        timeout_late = None
+        if outcome == "too_long":
+            timeout_late = since(started, now) - record["round_time_ms"]
+        record["timeout_late_ms"] = timeout_late
+        shown = presented if presented is not None else drawn
+        if shown is not None:
+            record["window_ms"] = (record["round_time_ms"] - since(started, shown)
+                                   + (timeout_late or 0.0))
+        else:
+            # The round was over before the rectangle was ever on screen.
+            record["window_ms"] = 0.0
+        record["cost_a_life"] = (outcome == "too_long"
+                                 and record["window_ms"] < record["round_time_ms"])
+        self.rounds.append(record)
+
+    def histogram(self, metric):
+        '''Return the counts of one metric's values in each bin, as a list of
+        (low_ms, high_ms, count), high_ms being None for the last bin.'''
+        counts = [0] * (len(self.BIN_EDGES_MS) + 1)
+        for record in self.rounds:
+            value = record.get(metric)
+            if value is not None:
+                counts[bisect.bisect_left(self.BIN_EDGES_MS, value)] += 1
+        lows = (None,) + self.BIN_EDGES_MS
+        highs = self.BIN_EDGES_MS + (None,)
+        return list(zip(lows, highs, counts))
+
+    def summary(self):
+        '''Return the mean, 95th percentile and worst of each metric, and how
+        many lives the loop cost.'''
+        result = {"rounds": len(self.rounds),
+                  "lives_lost_to_loop": sum(record["cost_a_life"] for record in self.rounds)}
+        for metric in self.METRICS:
+            values = sorted(record[metric] for record in self.rounds if record.get(metric) is not None)
+            if values:
+                result[metric] = {"mean": sum(values) / len(values),
+                                  "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                                  "max": values[-1]}
+        return result
+
+    def write_json(self, path):
+        '''Write the rounds, the summary and every histogram as JSON.'''
+        report = {"summary": self.summary(),
+                  "histograms": {metric: [{"low_ms": low, "high_ms": high, "count": count}
+                                          for low, high, count in self.histogram(metric)]
+                                 for metric in self.METRICS},
+                  "rounds": self.rounds}
+        with open(path, "w") as out_file:
+            json.dump(report, out_file, indent=2)
+
+    def write_csv(self, path):
+        '''Write every histogram as CSV, one row per metric and bin.'''
+        with open(path, "w", newline="") as out_file:
+            writer = csv.writer(out_file)
+            writer.writerow(("metric", "low_ms", "high_ms", "count"))
+            for metric in self.METRICS:
+                for low, high, count in self.histogram(metric):
+                    writer.writerow((metric, "" if low is None else low, "" if high is None else high, count))
+
+    def write(self, path):
+        '''Write to path as JSON if it ends in .json, otherwise as CSV.'''
+        if path.endswith(".json"):
+            self.write_json(path)
+        else:
+            self.write_csv(path)
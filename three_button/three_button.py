@@ -1,23 +1,80 @@
+import os
+import sys
+
 import pyglet
 import math
 import random
+from pyglet.gl import GL_TRIANGLES
 from pyglet.window import key
 
-window = pyglet.window.Window(caption="Three-Button Game")
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
 
 class GameObject:
     '''Keeps all game info together, so I won't have to make all kinds of
-    variables global, like in first version, which turned crazy on me.'''
-    def __init__(self):
-        #possible mode values: resting, playing, splash, instructions, gameover
-        self.mode = "splash"
+    variables global, like in first version, which turned crazy on me.
+
+    The game is a state machine. Each mode has its own table of handlers, one
+    for drawing a frame and one for key presses, and changing the mode just
+    swaps which table is in use, so the window's event handlers don't have to
+    work out what mode the game is in every time they're called.
+
+    The game doesn't need a window of its own, just the size of one; call
+    layout when the window is resized.
+
+    Given a LatencyRecorder (see latency.py), the game tells it when each
+    round is scheduled, drawn, answered and over.
+
+    The game's timers run on clock, which is pyglet's clock unless another
+    with the same schedule_once and unschedule is given, such as the
+    VirtualClock in bot.py. With headless, no labels or rects are made at
+    all, so the game can be played with no window or OpenGL, as fast as a
+    bot can play it. rng picks the rectangles, and can be given a seeded
+    random.Random to play the same game again.'''
+
+    #The three rects, as the keys that answer them and the order they're built in.
+    LEFT = 0
+    MIDDLE = 1
+    RIGHT = 2
+    ANSWERS = {key.Z: LEFT, key.X: MIDDLE, key.C: RIGHT}
+
+    def __init__(self, width=640, height=480, latency=None,
+                 clock=pyglet.clock, headless=False, rng=random):
+        self.latency = latency
+        self.clock = clock
+        self.headless = headless
+        self.random = rng
         self.score = 0
         self.lives = 3
         self.round_time = 1.00  # the time, in seconds, the player has to respond to one round
         self.rest_time = 0.50   # the time, in seconds, between one round and the next
-        self.rect = ()          # holds the rectangle currently being displayed
+        self.rect = None        # which of the rectangles is currently being displayed
         self.num_rounds = 0     # i don't think this ever got used
 
+        draws = {}
+        if not headless:
+            self.build_graphics(width, height)
+            draws = {"splash": self.splash_batch.draw,
+                     "instructions": self.instructions_batch.draw,
+                     "playing": self.draw_rect,
+                     "gameover": self.game_over_batch.draw}
+
+        #One handler table for each mode: what to draw, and what to do with a key.
+        #possible mode values: resting, playing, splash, instructions, gameover
+        self.states = {"splash":       {"key": self.splash_key},
+                       "instructions": {"key": self.instructions_key},
+                       "resting":      {"key": self.ignore_key},
+                       "playing":      {"key": self.playing_key},
+                       "gameover":     {"key": self.game_over_key},
+                       }
+        for mode, handlers in self.states.items():
+            handlers["draw"] = draws.get(mode, self.draw_nothing)
+        self.mode = "splash"
+
+    def build_graphics(self, width, height):
+        """build_graphics makes all the labels and rects. A headless game skips it."""
         #I create several text labels for use later in the game.
         #Graphics batches will hold all the labels for each screen.
 
@@ -29,8 +86,8 @@ class GameObject:
                                         font_size=36,
                                         anchor_x='center',
                                         anchor_y='bottom',
-                                        x=window.width/2,
-                                        y=window.height/2,
+                                        x=width/2,
+                                        y=height/2,
                                         color=(255, 255, 0, 255),
                                         batch=self.splash_batch)
 
@@ -39,8 +96,8 @@ class GameObject:
                                             font_size=18,
                                             anchor_x='center',
                                             anchor_y='top',
-                                            x=window.width/2,
-                                            y=window.height/2 - 20,
+                                            x=width/2,
+                                            y=height/2 - 20,
                                             color=(255, 0, 0, 255),
                                             batch=self.splash_batch
                                             )
@@ -56,6 +113,7 @@ class GameObject:
 
         inc = -2
         self.instructions_batch = pyglet.graphics.Batch()
+        self.instructions_labels = []
 
         for line in self.instructions_text:
             label = pyglet.text.Label(text=line,
@@ -63,10 +121,11 @@ class GameObject:
                                       font_size=18,
                                       anchor_x="center",
                                       anchor_y="center",
-                                      x=window.width/2,
-                                      y=window.height/2-(inc*25),
+                                      x=width/2,
+                                      y=height/2-(inc*25),
                                       color=(255, 0, 0, 255),
                                       batch=self.instructions_batch)
+            self.instructions_labels.append(label)
             inc += 1
 
 
@@ -78,8 +137,8 @@ class GameObject:
                           font_size=36,
                           anchor_x='center',
                           anchor_y='bottom',
-                          x=window.width/2,
-                          y=window.height/2,
+                          x=width/2,
+                          y=height/2,
                           color=(255, 0, 0, 255),
                           batch=self.game_over_batch
                           )
@@ -88,8 +147,8 @@ class GameObject:
                           font_size=18,
                           anchor_x='center',
                           anchor_y='top',
-                          x=window.width/2,
-                          y=window.height/2,
+                          x=width/2,
+                          y=height/2,
                           color=(255, 0, 0, 255),
                           batch=self.game_over_batch
                           )
@@ -103,7 +162,7 @@ class GameObject:
                                         anchor_x='left',
                                         anchor_y='top',
                                         x=0,
-                                        y=window.height,
+                                        y=height,
                                         color=(0, 255, 0, 255),
                                         batch=self.stats_batch
                                         )
@@ -113,48 +172,128 @@ class GameObject:
                                         font_size=18,
                                         anchor_x='right',
                                         anchor_y='top',
-                                        x=window.width,
-                                        y=window.height,
+                                        x=width,
+                                        y=height,
                                         color=(255, 0, 0, 255),
                                         batch=self.stats_batch
                                         )
 
+        #The three rects are built once, each as a vertex list in its own group
+        #of one batch. Lighting one up just makes its group visible, so nothing
+        #is sent to the graphics card while the game is being played.
+        self.rect_batch = pyglet.graphics.Batch()
+        self.rect_groups = [pyglet.graphics.Group() for i in range(3)]
+        self.RECTANGLES = []
+        for group in self.rect_groups:
+            group.visible = False
+            self.RECTANGLES.append(self.rect_batch.add_indexed(4, GL_TRIANGLES, group,
+                                                               [0, 1, 2, 1, 2, 3],
+                                                               ('v2i/static', (0,) * 8)))
+        self.layout(width, height)
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode):
+        """Changing the mode swaps in that mode's handlers."""
+        self._mode = mode
+        self.handlers = self.states[mode]
+
+    def layout(self, width, height):
+        """layout moves everything to fit a window of the given size. It's called
+        whenever the window is resized, and only moves things: the labels keep
+        their text and the rects keep their vertex lists."""
+        if self.headless:
+            return
+        self.title_label.position = (width/2, height/2)
+        self.sub_title_label.position = (width/2, height/2 - 20)
+        inc = -2
+        for label in self.instructions_labels:
+            label.position = (width/2, height/2-(inc*25))
+            inc += 1
+        self.game_over_label.position = (width/2, height/2)
+        self.sub_game_over_label.position = (width/2, height/2)
+        self.score_label.position = (0, height)
+        self.lives_label.position = (width, height)
+
         #These lines define coords for eight points that will be used to draw the three rects on screen.
         #They will adapt to the size of the screen.
-        self.TOP = window.height
+        self.TOP = height
         self.BOTTOM = 0
         self.FIRST = 0
-        self.SECOND = int(window.width / 3)
+        self.SECOND = int(width / 3)
         self.THIRD = self.SECOND * 2
-        self.FOURTH = window.width
-
-        #Here the three rects are defined
-        self.LEFT =  ('v2i',
-                (self.FIRST, self.TOP,
-                 self.SECOND, self.TOP,
-                 self.FIRST, self.BOTTOM,
-                 self.SECOND, self.BOTTOM
-                ))
-        self.MIDDLE =    ('v2i',
-                    (self.SECOND, self.TOP,
-                     self.THIRD, self.TOP,
-                     self.SECOND, self.BOTTOM,
-                     self.THIRD, self.BOTTOM
-                    ))
-        self.RIGHT = ('v2i',
-                (self.THIRD, self.TOP,
-                 self.FOURTH, self.TOP,
-                 self.THIRD, self.BOTTOM,
-                 self.FOURTH, self.BOTTOM
-                ))
-        #RECTANGLES holds the three rects, ready to be selected at random.
-        self.RECTANGLES = (self.LEFT, self.MIDDLE, self.RIGHT)
+        self.FOURTH = width
+
+        edges = (self.FIRST, self.SECOND, self.THIRD, self.FOURTH)
+        for i, vertex_list in enumerate(self.RECTANGLES):
+            left, right = edges[i], edges[i + 1]
+            vertex_list.vertices[:] = (left, self.TOP,
+                                       right, self.TOP,
+                                       left, self.BOTTOM,
+                                       right, self.BOTTOM)
+
+    def light(self, rect):
+        """light shows one of the three rects (or none, for None) and hides the others."""
+        if self.headless:
+            self.rect = rect
+            return
+        if self.rect is not None:
+            self.rect_groups[self.rect].visible = False
+        self.rect = rect
+        if rect is not None:
+            self.rect_groups[rect].visible = True
+
+    def draw(self):
+        """draw draws the current mode's screen, and the score and lives on top."""
+        self.handlers["draw"]()
+        self.stats_batch.draw()
+
+    def on_key_press(self, symbol, modifiers):
+        """on_key_press hands the key to the current mode's handler."""
+        self.handlers["key"](symbol)
+
+    def draw_nothing(self):
+        pass
+
+    def draw_rect(self):
+        self.rect_batch.draw()
+        if self.latency is not None:
+            self.latency.drawn()
+
+    def ignore_key(self, symbol):
+        pass
+
+    def splash_key(self, symbol):
+        if symbol == key.I:
+            self.mode = "instructions"
+        else:
+            self.take_rest()
+
+    def instructions_key(self, symbol):
+        self.take_rest()
+
+    def game_over_key(self, symbol):
+        if symbol == key.ENTER:
+            self.start_game()
+
+    def playing_key(self, symbol):
+        if self.latency is not None:
+            self.latency.key()
+        if self.ANSWERS.get(symbol) == self.rect:
+            self.score_point()
+        else:
+            self.wrong_button()
 
     def score_point(self):
         """score_points is called when the player gets a point."""
-        pyglet.clock.unschedule(self.too_long)
+        self.clock.unschedule(self.too_long)
+        if self.latency is not None:
+            self.latency.round_ended("score")
         self.score = self.score + 1
-        self.score_label.text = 'Score: {}'.format(self.score)
+        self.show_stats()
         self.take_rest()
 
     def penalty(self, dt):
@@ -164,7 +303,7 @@ class GameObject:
         self.lives = self.lives - 1
         self.round_time *= 1.1
         self.rest_time *= 1.1
-        self.lives_label.text = 'Lives: {}'.format(self.lives)
+        self.show_stats()
         if self.lives < 1:
             self.end_game()
 
@@ -176,27 +315,37 @@ class GameObject:
         self.lives = 3
         self.round_time = 1.00
         self.rest_time = 0.50
-        self.rect = ()
+        self.light(None)
         self.num_rounds = 0
+        self.show_stats()
+
+    def show_stats(self):
+        """show_stats puts the score and lives in their labels."""
+        if self.headless:
+            return
         self.score_label.text = 'Score: {}'.format(self.score)
         self.lives_label.text = 'Lives: {}'.format(self.lives)
 
     def end_game(self):
         """end_game is called when the player has no more lives left."""
-        pyglet.clock.unschedule(self.too_long)
-        pyglet.clock.unschedule(self.new_round)
+        self.clock.unschedule(self.too_long)
+        self.clock.unschedule(self.new_round)
         self.mode = "gameover"
 
     def too_long(self, dt):
         """too_long is called when the player is too slow in responding to the game.
         It calls penalty to finish the task of punishing the player."""
+        if self.latency is not None:
+            self.latency.round_ended("too_long")
         self.take_rest()
         self.penalty(0)
 
     def wrong_button(self):
         """wrong_button is called when the player presses the wrong key while playing.
         It calls penalty to finish the task of punishing the player."""
-        pyglet.clock.unschedule(self.too_long)
+        self.clock.unschedule(self.too_long)
+        if self.latency is not None:
+            self.latency.round_ended("wrong")
         self.take_rest()
         self.penalty(0)
 
@@ -204,67 +353,68 @@ class GameObject:
         """take_rest is called between each round, regardless of wether the player wins or
         loses the round."""
         self.mode = "resting"
-        pyglet.clock.schedule_once(self.new_round, self.rest_time)
+        self.light(None)
+        if self.latency is not None:
+            self.latency.rest(self.rest_time)
+        self.clock.schedule_once(self.new_round, self.rest_time)
 
     def new_round(self, dt):
         """new_round is called when take_rest is done to pick a new rectangle to display,
         and set the timer for the player to respond. It also  shrinks the round length and
         rest length to make the game go progressively faster over time."""
         self.mode = "playing"
-        r = math.floor(random.random() * 3)
-        self.rect = self.RECTANGLES[r]
-        pyglet.clock.schedule_once(self.too_long, self.round_time)
+        r = math.floor(self.random.random() * 3)
+        self.light(r)
+        if self.latency is not None:
+            self.latency.round_started(r, self.round_time)
+        self.clock.schedule_once(self.too_long, self.round_time)
         self.round_time *= 0.99
         self.rest_time *= 0.99
         #print("round_time: {} -- rest_time: {}".format(self.round_time, self.rest_time))
 
 
-@window.event
-def on_draw():
-    """on_draw clears the screen and draws the new frame based on what mode the game is in."""
-    window.clear()
-    if the_game.mode == "splash":
-        the_game.splash_batch.draw()
-    elif the_game.mode == "instructions":
-        #the_game.instructions_label.draw()
-        the_game.instructions_batch.draw()
-    elif the_game.mode == "gameover":
-        the_game.game_over_batch.draw()
-    elif the_game.mode == "resting":
-        pass
-    elif the_game.mode == "playing":
-        pyglet.graphics.draw_indexed(4, pyglet.gl.GL_TRIANGLES, [0, 1, 2, 1, 2, 3], the_game.rect)
-
-    the_game.stats_batch.draw()
-
-
-
-@window.event
-def on_key_press(symbol, modifiers):
-    """on_key_press responds to user input based on what mode the game is currently in."""
-    global the_game
-    if the_game.mode == "splash":
-        if symbol == key.I:
-            the_game.mode = "instructions"
-        else:
-            the_game.take_rest()
-    elif the_game.mode == "instructions":
-        the_game.take_rest()
-    elif the_game.mode == "gameover":
-        if symbol == key.ENTER:
-            the_game.start_game()
-    elif the_game.mode == "resting":
-        pass
-    elif the_game.mode == "playing":
-        if symbol == key.Z and the_game.rect == the_game.LEFT:
-            the_game.score_point()
-        elif symbol == key.X and the_game.rect == the_game.MIDDLE:
-            the_game.score_point()
-        elif symbol == key.C and the_game.rect == the_game.RIGHT:
-            the_game.score_point()
-        else:
-            the_game.wrong_button()
-
-#Initialize the game object and start the program!
-the_game = GameObject()
-pyglet.app.run()
+if __name__ == "__main__":
+    import argparse
+    from common.profiler import FrameProfiler
+
+    parser = argparse.ArgumentParser(description="The three-button reaction game.")
+    parser.add_argument("--latency", metavar="PATH",
+                        help="time every round, and write latency histograms here when the "
+                             "game is closed: JSON (with every round) if PATH ends in .json, "
+                             "otherwise CSV")
+    FrameProfiler.add_arguments(parser)
+    args = parser.parse_args()
+    profiler = FrameProfiler.from_args(args)
+
+    latency = None
+    if args.latency:
+        from latency import LatencyRecorder
+        latency = LatencyRecorder()
+
+    class GameWindow(pyglet.window.Window):
+        def flip(self):
+            super(GameWindow, self).flip()
+            if latency is not None:
+                latency.presented()
+
+    window = GameWindow(caption="Three-Button Game", resizable=True)
+
+    @profiler.event(window)
+    def on_draw():
+        """on_draw clears the screen and lets the game draw the new frame."""
+        window.clear()
+        the_game.draw()
+
+    @profiler.event(window)
+    def on_resize(width, height):
+        the_game.layout(width, height)
+
+    #Initialize the game object and start the program!
+    the_game = GameObject(window.width, window.height, latency)
+    profiler.wrap_method(the_game, "new_round")
+    profiler.wrap_method(the_game, "too_long")
+    profiler.event(window)(the_game.on_key_press)
+    pyglet.app.run()
+    profiler.close()
+    if latency is not None:
+        latency.write(args.latency)